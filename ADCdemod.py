@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Lock-in demodulation of the ADC data recorded by the LASSITOS microcontroller.
+
+The decoded frames written by readSD_ADC_LASSITOS.py (output='npy') are memory
+mapped and processed block by block, so recordings larger than memory can be
+demodulated. For every block the complex amplitude (I/Q) at each transmitted
+frequency is computed as a single DFT bin (vectorized Goertzel).
+"""
+
+import numpy as np
+import re
+from readSD_ADC_LASSITOS import load_ADC
+
+
+class ADCdemod:
+
+    channels=['ch1','ch2','ch3']
+
+    def __init__(self,file,fs,freqs=[],logfile='',block=0,start=0,length=0,
+                 channels=[],window='hann',chunk=256):
+        """
+            Demodulate ADC data at the frequencies of the signal generator.
+
+            Inputs:
+            ---------------------------------------------------
+            file:       .npy file with decoded ADC frames (see readSD_ADC_LASSITOS.save_frames_npy)
+            fs:         sampling rate of the ADC in Hz
+            freqs:      frequencies to demodulate in Hz. If empty they are read from the header of logfile.
+            logfile:    INS/Laser log file of the ESP32 with the signal generation settings.
+            block:      number of samples per demodulated value. Default: fs/10 (100 ms).
+            start:      first frame to process.
+            length:     number of frames to process. 0 processes until the end.
+            channels:   ADC channels to demodulate. Default: all.
+            window:     'hann' or 'none'. Window applied to each block.
+            chunk:      number of blocks processed at once.
+
+            Results:
+            ---------------------------------------------------
+            t:          time of block center (s from start of recording)
+            counter:    frame counter at start of block
+            amp[ch]:    amplitude, array (blocks x freqs)
+            phase[ch]:  phase (rad), referenced to the start of the recording, array (blocks x freqs)
+        """
+        self.file=file
+        self.fs=fs
+        if len(freqs)==0:
+            freqs=read_frequencies(logfile)
+        if len(freqs)==0:
+            print('No frequencies given or found in log file!')
+            raise ValueError('No frequencies to demodulate')
+        self.freqs=np.array(freqs,dtype=float)
+        if channels!=[]:
+            self.channels=list(channels)
+        if block==0:
+            block=int(fs/10)
+        self.block=int(block)
+
+        frames,self.header=load_ADC(file)
+        length=len(frames)-start if length==0 else min(length,len(frames)-start)
+        self.demodulate(frames[start:start+length],start=start,window=window,chunk=chunk)
+
+
+    def demodulate(self,frames,start=0,window='hann',chunk=256):
+        """
+        Stream over frames and compute amplitude and phase per block and frequency.
+        """
+        N=self.block
+        nblocks=len(frames)//N
+
+        n=np.arange(N)
+        if window=='hann':
+            w=np.hanning(N)
+        else:
+            w=np.ones(N)
+        # reference oscillators, one column per frequency
+        E=w[:,None]*np.exp(-2j*np.pi*self.freqs[None,:]*n[:,None]/self.fs)
+
+        self.t=(start+np.arange(nblocks)*N+N/2)/self.fs
+        self.counter=np.array(frames['counter'][:nblocks*N:N])
+        self.amp={}
+        self.phase={}
+        for ch in self.channels:
+            self.amp[ch]=np.zeros((nblocks,len(self.freqs)),dtype=np.float32)
+            self.phase[ch]=np.zeros((nblocks,len(self.freqs)),dtype=np.float32)
+
+        for a in range(0,nblocks,chunk):
+            b=min(a+chunk,nblocks)
+            # phase of the reference at the first sample of each block
+            n0=(start+np.arange(a,b)*N)[:,None]
+            ref=np.exp(-2j*np.pi*self.freqs[None,:]*n0/self.fs)
+            for ch in self.channels:
+                X=np.asarray(frames[ch][a*N:b*N],dtype=float).reshape(b-a,N)
+                X-=X.mean(axis=1,keepdims=True)
+                Z=(X@E)*ref
+                self.amp[ch][a:b]=2*np.abs(Z)/w.sum()
+                self.phase[ch][a:b]=np.angle(Z)
+
+
+    def IQ(self,ch='ch1'):
+        """
+        return  in-phase and quadrature components of channel ch
+        """
+        Z=self.amp[ch]*np.exp(1j*self.phase[ch])
+        return Z.real,-Z.imag
+
+
+# %% #########function definitions #############
+
+def read_frequencies(path):
+    """
+    Read the signal generation frequencies from the header of a log file written by LASSITOS_ESP32.
+
+    path: file path
+
+    return  list of frequencies (Hz)
+    """
+    if path=='':
+        return []
+    freqs=[]
+    with open(path,mode='rt',errors='ignore') as file:
+        for l in file:
+            if l[0]!='#':
+                break
+            if l.find('# Frequency:')==-1:
+                continue
+            if l.find('multifrequency')!=-1:
+                # firmware labels them kHz, values are in Hz
+                freqs=[float(f) for f in re.findall(r'F\d+:\s*(\d+)',l)]
+            else:
+                freqs=[float(f) for f in re.findall(r'# Frequency:\s*(\d+)',l)]
+            break
+    return freqs
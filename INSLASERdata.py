@@ -11,16 +11,22 @@ import numpy as np
 import re
 import math
 from datetime import datetime
-import matplotlib.pyplot as pl
 import os,sys
-from cmcrameri import cm
-from geopy import distance
-import cartopy.crs as ccrs
-import cartopy.io.img_tiles as cimgt
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
 import io
+import copy
 from urllib.request import urlopen, Request
-from PIL import Image
+import plotlibs
+from msgstats import MSG_stats
+from gpstime import gps_ns, align_tow, time_limits
+from sessions import merge_msg, merge_stats, subset_msg
+from timealign import fit_strobe_time
+from msggaps import MSG_gaps
+from laserfilter import filter_laser
+from msgschema import promote
+from profiler import Profiler
+import diagnostics
+import export
+import boresight
 
 # %%  data class
 
@@ -30,7 +36,14 @@ class MSG_type:
         self.len=0
         self.MSG=MSG
         
-    def addData(self,keys,values):
+    def addData(self,keys,values,dtypes=None,diag=None):
+        """
+        keys:   column names
+        values: 2D array with one row per message
+        dtypes: column dtypes. Default: dtype of values.
+                Integer columns with NaN (e.g. truncated fields) are kept as float64.
+        diag:   Diagnostics counting such columns (see diagnostics.py)
+        """
         self.len=(len(values))
         if len(keys)!=len(values[0]):
             print("Keys and values don't have same length!!")
@@ -39,14 +52,34 @@ class MSG_type:
             
             return
         self.keys=keys.copy()
+        values=np.asarray(values)
         for i,k in enumerate(keys):
-            setattr(self,k,np.array([l[i] for l in values]))
+            if dtypes is None:
+                setattr(self,k,np.array(values[:,i]))
+            elif np.dtype(dtypes[i]).kind in 'iu' and not np.all(np.isfinite(values[:,i])):
+                if diag is None:
+                    diag=diagnostics.default
+                diag.warn('nmea','%s.%s: %d values not finite, column kept as float64',
+                          self.MSG,k,int(np.sum(~np.isfinite(values[:,i]))))
+                setattr(self,k,values[:,i].astype(np.float64))
+            else:
+                setattr(self,k,values[:,i].astype(dtypes[i]))
+    
+    def promote(self,attrs=None):
+        """
+        Convert columns to int64/float64 for computations.
+        """
+        promote(self,attrs)
 
 _MSG_list_=['Laser','PINS1','PSTRB','PINS2']    # NMEA message list to parse
 _keyList_=[['h','signQ','T','TOW'],        
           ['TOW','GPSWeek','insStatus','hdwStatus','roll','pitch','heading','velX', 'velY', 'velZ','lat', 'lon', 'height','OffsetLLA_N','OffsetLLA_E','OffsetLLA_D'],
           ['GPSWeek','TOW','pin','count'],
           ['TOW','GPSWeek','insStatus','hdwStatus','QuatW','QuatX','QuatY','QuatZ','velX', 'velY', 'velZ','lat', 'lon', 'height']]  # order matters!!
+_dtypeList_=[['f4','f4','f4','f8'],        # column dtypes, same order as _keyList_
+          ['f8','u2','u4','u4','f4','f4','f4','f4','f4','f4','f8','f8','f8','f4','f4','f4'],
+          ['u2','f8','u1','u4'],
+          ['f8','u2','u4','u4','f4','f4','f4','f4','f4','f4','f4','f8','f8','f8']]
 
 
 class INSLASERdata:
@@ -55,14 +88,28 @@ class INSLASERdata:
     # extr_list=['PINS1','Laser']
     
     def __init__(self,filepath,name='',load=True, droplaserTow0=True,
-                 correct_Laser=True,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=1,c_roll=1):
+                 correct_Laser=True,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=1,c_roll=1,
+                 compact=True,keep_other=False,laser_strobe=False,strobe_pin=None,filter_Laser=False,profiler=None):
         """
             Read GNSS and Laser data from .ubx data file. Additional methods are available for plotting and handling data.    
         
             Inputs:
             ---------------------------------------------------    
             filepath:           file path
-           
+            compact:            Store columns with compact dtypes (_dtypeList_: status as uint32,
+                                GPSWeek as uint16, attitude/velocity as float32). Integer columns
+                                with NaN stay float64. If False, all columns are float64.
+            keep_other:         Keep all unparsed and corrupt lines in self.other.items and self.corrupt.items.
+                                Otherwise only counts, bytes and a sample per message type are kept.
+            laser_strobe:       Time laser samples with the strobe events (PSTRB) instead of the
+                                TOW of the last PINS1 message (see strobe_time). Needs a strobe input
+                                wired to the laser trigger; the timer strobes of Log_IMX5_LDS70A
+                                (pin 2, every 5 s) are not related to the laser samples. Default: False
+            strobe_pin:         strobe input pin of the laser. Default: all pins.
+            filter_Laser:       Filter dropouts and spikes of the laser data with default settings
+                                (see filter_laser). h_corr is computed from the filtered height. Default: False
+            profiler:           Profiler (see profiler.py) recording time, bytes, messages and memory of each
+                                loading stage. The records are stored in self.load_report.
            
         """
         
@@ -79,21 +126,31 @@ class INSLASERdata:
         self.roll0=roll0
         self.c_pitch=c_pitch
         self.c_roll=c_roll
+        self.compact=compact
+        self.keep_other=keep_other
+        self.diag=diagnostics.Diagnostics()
+        self.laser_strobe=laser_strobe
+        self.strobe_pin=strobe_pin
         
         self.keyList=_keyList_.copy()
+        self.dtypeList=_dtypeList_.copy()
         self.MSG_list=_MSG_list_.copy()
         
         if load:
-            self.loadData(correct_Laser=correct_Laser,droplaserTow0=droplaserTow0)
+            self.loadData(correct_Laser=correct_Laser,droplaserTow0=droplaserTow0,filter_Laser=filter_Laser,
+                          profiler=profiler)
 
     
-    def loadData(self,correct_Laser=0,droplaserTow0=True):
+    def loadData(self,correct_Laser=0,droplaserTow0=True,filter_Laser=False,profiler=None):
         if not os.path.isfile(self.filepath) :
             print("File not found!!!")
             raise FileNotFoundError()
         
+        p=profiler if profiler is not None else Profiler()
+        p.begin(file=self.filepath,name=self.name)
+        self.diag=diagnostics.Diagnostics()
         
-        
+        p.start('parse')
         print('Reading file: ',self.filepath)
         print('----------------------------')
         file = open(self.filepath, 'rt')
@@ -103,9 +160,10 @@ class INSLASERdata:
         
         i=0
 
-        self.corrupt=[]
-        self.other=[]
+        self.corrupt=MSG_stats(keep=self.keep_other)
+        self.other=MSG_stats(keep=self.keep_other)
         self.dropped=[]
+        strobeIdx=[]    # number of laser samples read before each PSTRB message
         
         for l in file:
             # print(l)
@@ -114,13 +172,13 @@ class INSLASERdata:
             if l[0]=='#':
                 continue
             elif l.find('$')!=-1:
-                Msg_key,data=parseNMEAfloat(l)
+                Msg_key,data=parseNMEAfloat(l,self.diag)
                 
                 if Msg_key=='PINS1':
                     self.ToW=data[0]
 
                 if Msg_key=='Error':
-                    self.corrupt.append(l)
+                    self.corrupt.add(Msg_key,l,len(l))
                     # print("Message {:s} not in NMEA message list".format(Msg_key))
                     try: 
                         self.dropped.index(Msg_key)
@@ -131,72 +189,216 @@ class INSLASERdata:
                 try:
                   j=self.MSG_list.index(Msg_key)
                   if len(data)!=len(self.keyList[j]):
-                      self.corrupt.append(l)
+                      self.corrupt.add(Msg_key,l,len(l))
                       continue
                 except ValueError:
-                    print("Message {:s} not in NMEA message list. Dropping it.".format(Msg_key))
+                    self.diag.warn('unknown','message %s not in NMEA message list. Dropping it.',Msg_key)
                     continue
                 
                 
                 getattr(self,Msg_key+'List').append(data)
+                if Msg_key=='PSTRB':
+                    strobeIdx.append(len(self.LaserList))
                 
                 
                 
             elif l.find('D ')!=-1:
-                self.LaserList.append(parseLaser(l)+(self.ToW,) )
+                self.LaserList.append(parseLaser(l,self.diag)+(self.ToW,) )
                 
             else:
-                self.other.append(l)
+                self.other.add(l.split()[0][:12] if l.strip() else '',l,len(l))
+        file.close()
+        p.stop(nbytes=os.path.getsize(self.filepath),msgs=i)
         
+        p.start('arrays')
         # drop  laser points with ToW=0        
+        nLaser=len(self.LaserList)
         if droplaserTow0:
             for j,l in enumerate(self.LaserList):
                 if l[-1]!=0:
                     break
             self.LaserList=self.LaserList[j:]
+        nDrop=nLaser-len(self.LaserList)
         
         for msg in (self.MSG_list):
             setattr(self,msg,MSG_type(msg) )
             if len(getattr(self,msg+'List'))>0:
                 values=np.array(getattr(self,msg+'List'))
                 keys=self.keyList[self.MSG_list.index(msg)]
-                print(keys)
-                getattr(self,msg).addData(keys,values)
+                dtypes=self.dtypeList[self.MSG_list.index(msg)] if self.compact else None
+                getattr(self,msg).addData(keys,values,dtypes,self.diag)
             
             # delattr(self,msg+'List')
+        
+        if self.PSTRB.len>0:
+            self.PSTRB.laserIdx=np.array(strobeIdx,dtype=np.int64)-nDrop
+            self.PSTRB.keys.append('laserIdx')
             
+        p.stop(msgs=sum([getattr(self,msg).len for msg in self.MSG_list]))
         print("Total lines read: ", i)   
         
+        # absolute GPS time of all messages
+        p.start('time')
+        self.set_time()
+        p.stop()
+        
+        # gap and rate index of all messages
+        p.start('gaps')
+        self.index_gaps()
+        p.stop()
+
+        if filter_Laser and self.Laser.len>0:
+            p.start('filter')
+            self.filter_laser()
+            p.stop(msgs=self.Laser.len)
 
         # correct h with angles from INS
         if correct_Laser:
+                p.start('correct')
                 self.corr_h_laser()
+                p.stop(msgs=self.Laser.len)
+        self.load_report=p.end()
+        self.diag.log_summary(self.name)
+        
+    
+    def set_time(self):
+        """
+        Set absolute GPS time t (int64 ns since GPS epoch, see gpstime.py) of all messages.
+        PINS1, PINS2 and PSTRB carry the GPS week. Laser data get the week of the first of them.
+        """
+        t_ref=np.zeros(0,dtype=np.int64)
+        TOW_ref=np.zeros(0)
+        for msg in ['PINS1','PINS2','PSTRB']:
+            d=getattr(self,msg)
+            if d.len>0:
+                d.t=gps_ns(d.GPSWeek,d.TOW,'s')
+                d.keys.append('t')
+                if len(t_ref)==0:
+                    t_ref=d.t[:1]
+                    TOW_ref=d.TOW[:1]
+        if self.Laser.len>0:
+            self.Laser.t=align_tow(self.Laser.TOW,t_ref,TOW_ref,'s')
+            self.Laser.keys.append('t')
+            if self.laser_strobe:
+                self.strobe_time(pin=self.strobe_pin)
+    
+    def index_gaps(self):
+        """
+        Gap and rate index (MSG_gaps, see msggaps.py) of all messages with time t, stored as gaps.
+        """
+        for msg in self.MSG_list:
+            d=getattr(self,msg,None)
+            if isinstance(getattr(d,'t',None),np.ndarray):
+                d.gaps=MSG_gaps(d.t)
+    
+    def filter_laser(self,q_min=None,q_max=None,h_min=0,h_max=np.inf,window=11,nsigma=5,
+                     min_mad=0.01,scale_window=600,niter=2,T_coef=0,T_ref=20):
+        """
+        Filter laser data with signal quality, temperature compensation and despiking
+        (see laserfilter.filter_laser). Sets Laser.h_filt (NaN if not valid) and Laser.valid.
+        Run corr_h_laser afterwards to update h_corr.
+        """
+        try:
+            self.Laser.h_filt,self.Laser.valid=filter_laser(self.Laser.h,self.Laser.signQ,self.Laser.T,
+                    q_min=q_min,q_max=q_max,h_min=h_min,h_max=h_max,window=window,nsigma=nsigma,
+                    min_mad=min_mad,scale_window=scale_window,niter=niter,T_coef=T_coef,T_ref=T_ref)
+            for k in ['h_filt','valid']:
+                if k not in self.Laser.keys:
+                    self.Laser.keys.append(k)
+            print('Laser filter: {:d} of {:d} samples valid'.format(int(self.Laser.valid.sum()),self.Laser.len))
+        except AttributeError:
+            print('Laser data not found.')
+    
+    def strobe_time(self,pin=None,segment=60,tol=0.1):
+        """
+        Time of the laser samples from the strobe events (PSTRB) of the IMX5.
+        
+        Only valid if the strobe input is triggered by the laser samples. The logger
+        (IMX5/Log_IMX5_LDS70A) pulses pin 2 every 5 s independent of the laser; such
+        strobes do not mark a laser sample and are detected by the check below.
+        
+        Each strobe is matched to the last laser sample read before its PSTRB message.
+        Strobes with repeated or decreasing count are dropped. The time of all laser
+        samples is fitted piecewise linear in the sample number (knots every segment s,
+        see timealign.fit_strobe_time). Laser.t is replaced only if the strobe period
+        (time per strobe count) matches the laser period (time per matched sample) within tol,
+        i.e. every laser sample gives one strobe. The time from the last PINS1 message
+        (step-wise) is kept in Laser.t_step.
+        
+        pin:        strobe input pin of the laser. Default: all pins.
+        tol:        relative tolerance of the strobe period
+        """
+        if self.PSTRB.len<2 or self.Laser.len==0:
+            return
+        d=self.PSTRB
+        k=d.laserIdx>0
+        if pin is not None:
+            k&=d.pin==pin
+        count=d.count.astype(np.int64)
+        k&=np.diff(count,prepend=count[0]-1)>0
+        out=fit_strobe_time(d.laserIdx[k]-1,d.t[k],self.Laser.len,segment=segment)
+        if out is None:
+            print('No strobe events matched to laser samples. Laser time from PINS1.')
+            return
+        n,c,ts=d.laserIdx[k][out[2]],count[k][out[2]],d.t[k][out[2]]
+        p_laser=(ts[-1]-ts[0])*1e-9/(n[-1]-n[0]) if n[-1]!=n[0] else np.inf
+        p_strobe=(ts[-1]-ts[0])*1e-9/(c[-1]-c[0]) if c[-1]!=c[0] else np.inf
+        if not abs(p_strobe/p_laser-1)<=tol:
+            print('Strobe period {:.3f} s does not match the laser period {:.3f} s, strobes are not '
+                  'triggered by the laser. Laser time from PINS1.'.format(p_strobe,p_laser))
+            return
+        if not hasattr(self.Laser,'t_step'):
+            self.Laser.t_step=self.Laser.t
+            self.Laser.keys.append('t_step')
+        self.Laser.t,self.Laser.strobe_rms,used=out
+        print('Laser time from {:d} strobe events, rms {:.3f} ms'.format(used.sum(),self.Laser.strobe_rms*1000))
+        
+    
+    def attitude_laser(self):
+        """
+        Interpolate pitch and roll of PINS1 (uncorrected, rad) to the laser times.
+        Stored as Laser.pitch_ins and Laser.roll_ins, e.g. for h_laser. NaN outside of the
+        time range of PINS1 (no extrapolation).
+        """
+        i=np.clip(self.PINS1.t.searchsorted( self.Laser.t),1,self.PINS1.len-1)
+        j=np.array(i)-1
         
+        self.Laser.pitch_ins=self.PINS1.pitch[j]+(self.PINS1.pitch[i]-self.PINS1.pitch[j])/(self.PINS1.t[i]-self.PINS1.t[j])*(self.Laser.t-self.PINS1.t[j])
+        self.Laser.roll_ins=self.PINS1.roll[j]+(self.PINS1.roll[i]-self.PINS1.roll[j])/(self.PINS1.t[i]-self.PINS1.t[j])*(self.Laser.t-self.PINS1.t[j])
+        out=(self.Laser.t<self.PINS1.t[0])|(self.Laser.t>self.PINS1.t[-1])
+        self.Laser.pitch_ins=np.where(out,np.nan,self.Laser.pitch_ins)
+        self.Laser.roll_ins=np.where(out,np.nan,self.Laser.roll_ins)
+        self.Laser.keys.extend([k for k in ['pitch_ins','roll_ins'] if k not in self.Laser.keys])
+    
+    def h_laser(self,pitch0=None,roll0=None,distCenter=None):
+        """
+        Corrected laser height for calibration parameters, without changing the data. Parameters
+        not given are the current ones (self.pitch0, ...). Parameters can be arrays of the same
+        (or broadcastable) shape, e.g. a grid from boresight.param_grid: the result then has the shape
+        of the parameters + (number of laser samples,).
+        Uses the attitude at the laser times of the last corr_h_laser (see attitude_laser).
+        """
+        if len(getattr(self.Laser,'pitch_ins',[]))!=self.Laser.len:
+            self.attitude_laser()
+        p=boresight.param_axes(self,pitch0=pitch0,roll0=roll0,distCenter=distCenter)
+        h=getattr(self.Laser,'h_filt',self.Laser.h)
+        return boresight.correct_height(h,self.Laser.pitch_ins,self.Laser.roll_ins,unit=1.,**p)
     
     def corr_h_laser(self):
         """
         correct height with angles from INS
         """   
         try:
-            i=self.PINS1.TOW.searchsorted( self.Laser.TOW)
-            j=np.array(i)-1
+            self.attitude_laser()
             
-            pitch=self.PINS1.pitch[j]+(self.PINS1.pitch[i]-self.PINS1.pitch[j])/(self.PINS1.TOW[i]-self.PINS1.TOW[j])*(self.Laser.TOW-self.PINS1.TOW[j])
-            roll=self.PINS1.roll[j]+(self.PINS1.roll[i]-self.PINS1.roll[j])/(self.PINS1.TOW[i]-self.PINS1.TOW[j])*(self.Laser.TOW-self.PINS1.TOW[j])
-            
-            roll-=self.roll0
-            pitch-=self.pitch0
-            # roll*=self.c_roll
-            # pitch*=self.c_pitch
-            
-            self.Laser.pitch=pitch
-            self.Laser.roll=roll
-            self.Laser.h_corr=self.Laser.h*(np.cos(pitch)*np.cos(roll))-self.distCenter*np.sin(pitch)
-            self.Laser.keys.extend(['h_corr','roll','pitch'])
+            self.Laser.pitch=self.Laser.pitch_ins-self.pitch0
+            self.Laser.roll=self.Laser.roll_ins-self.roll0
+            # c_pitch and c_roll are not applied
+            self.Laser.h_corr=self.h_laser()
+            self.Laser.keys.extend([k for k in ['h_corr','roll','pitch'] if k not in self.Laser.keys])
            
         except Exception as e: 
-            print(e)
-            print('Failed to correct Laser height')
+            self.diag.warn('laser','failed to correct Laser height: %s',e)
             try:
                 self.Laser.h_corr=np.zeros_like(self.Laser.h)
             except AttributeError:
@@ -211,17 +413,57 @@ class INSLASERdata:
     def plot_elevation_time(self,ax=[],title=[]):
         plot_elevation_time(self,ax=ax,title=title)
 
-    def plot_longlat(self,z='height',ax=[],cmap= cm.batlow):
+    def plot_longlat(self,z='height',ax=[],cmap=None):
         plot_longlat(self,z=z,ax=ax,cmap=cmap)
         
-    def plot_map(self,z='height',ax=[],cmap= cm.batlow):
+    def plot_map(self,z='height',ax=[],cmap=None):
         plot_map(self,z=z,ax=ax,cmap=cmap)
 
-    def plot_mapOSM(self,z='TOW',ax=[],cmap= cm.batlow,title=[],extent=[]):
+    def plot_mapOSM(self,z='TOW',ax=[],cmap=None,title=[],extent=[]):
         plot_mapOSM(self,z=z,ax=ax,cmap= cmap,title=title,extent=extent)
 
 
 
+    def set_calibration(self,**kwargs):
+        """
+        Set calibration parameters (pitch0, roll0, distCenter, c_pitch, c_roll) and correct h
+        again without reading the file.
+        """
+        for k,v in kwargs.items():
+            if k not in boresight.PARAMS:
+                raise ValueError('unknown calibration parameter: '+k)
+            setattr(self,k,v)
+        self.corr_h_laser()
+    
+    def calibrate(self,fit=None,mode='flat',apply=False,**kwargs):
+        """
+        Solve the calibration with the laser data of maneuvers (see boresight.calibrate).
+        
+        apply:  apply the result with set_calibration if the solution converged with finite std.
+                Otherwise check the result (std, corr, rms) and call set_calibration(**res['params']).
+        
+        return  result of boresight.calibrate
+        """
+        res=boresight.calibrate([self],fit=fit,mode=mode,**kwargs)
+        if apply:
+            if res['converged'] and np.all(np.isfinite(list(res['std'].values()))):
+                self.set_calibration(**res['params'])
+            else:
+                print('Calibration not applied: solution not converged or parameters not determined.')
+        return res
+    
+    def to_parquet(self,folder,msgs=None,row_group=600,compression='zstd'):
+        """
+        Write all messages to folder/<message>/<session>.parquet (see export.write_parquet).
+        """
+        return export.write_parquet(self,folder,msgs=msgs,row_group=row_group,compression=compression)
+    
+    def to_las(self,file,**kwargs):
+        """
+        Write the georeferenced laser shots to a LAS file (see export.write_las).
+        """
+        return export.write_las(self,file,**kwargs)
+    
     def subset(self, timelim=[],timeformat='s'):
         """
         Parameters
@@ -229,7 +471,8 @@ class INSLASERdata:
         timelim : List, optional
             limits in time. The default is [].
         timeformat : string, optional
-            units of time limits. Either 'TOW' or 's' (relative to start of data).
+            units of time limits. Either 'TOW' or 's' (relative to start of data),
+            'gps' (GPS ns) or 'utc' (datetime64), see gpstime.time_limits.
 
         Returns
         -------
@@ -238,56 +481,104 @@ class INSLASERdata:
 
         """
         d=self.PINS1
-        if timeformat=='TOW':
-              lim=d.TOW.searchsorted(timelim)
-              TOW_lim=timelim
-        elif timeformat=='s':
-              lim=((d.TOW -d.TOW[0]) ).searchsorted(timelim)
-              TOW_lim=d.TOW[lim]
-        else:
+        try:
+            t_lim=time_limits(d.t,d.TOW,timelim,timeformat,unit='s')
+        except ValueError:
             print('timeformat not valid')
             return 0
   
-        data2=INSLASERdata(self.filepath,name=self.name,load=False)
+        data2=INSLASERdata(self.filepath,name=self.name,load=False,
+                           distCenter=self.distCenter,pitch0=self.pitch0,roll0=self.roll0,
+                           c_pitch=self.c_pitch,c_roll=self.c_roll,compact=self.compact)
 
+        laser0=0
         for attr in (self.MSG_list):
             # print(attr)
             try:   
                 msg_data=getattr(self,attr)
-                lim2=msg_data.TOW.searchsorted(TOW_lim)
+                lim2=msg_data.t.searchsorted(t_lim)
             except Exception as e: 
-                    print(e)
-                    print(attr)
-                    # continue
-            d2=MSG_type(attr)
-            
-            for a in msg_data.__dict__.keys():
-                # print('\t',a)
-                try:
-                    setattr(d2,a,np.array(getattr(msg_data, a)[lim2[0]:lim2[1]] ))
-                except:
-                    setattr(d2,a,getattr(msg_data, a))
-            setattr(d2,'len',lim2[1]-lim2[0])
+                self.diag.warn('subset','message %s: %s',attr,e)
+                continue
+            d2=subset_msg(msg_data,lim2,MSG_type(attr))
+            if attr=='Laser':
+                laser0=lim2[0]
             setattr(data2,attr,d2)
+        if hasattr(getattr(data2,'PSTRB',None),'laserIdx'):
+            # laserIdx counts the laser samples read before the strobe
+            n=data2.PSTRB.laserIdx-laser0
+            data2.PSTRB.laserIdx=np.where((n>0)&(n<=getattr(getattr(data2,'Laser',None),'len',0)),n,0)
+        data2.index_gaps()
         return data2
         
 # %% #########function definitions #############
 
-def parseNMEA(l):
+def concat(datalist,name=''):
+    """
+    Merge several sessions (e.g. the files of one flight day) into one INSLASERdata
+    object ordered by absolute GPS time t. Overlapping records are dropped
+    (see sessions.merge_msg).
+    
+    datalist:   list of INSLASERdata objects
+    name:       name of merged data. Default: name of first session.
+    
+    return  INSLASERdata object
+    """
+    d0=datalist[0]
+    data=INSLASERdata(d0.filepath,name=name if name!='' else d0.name,load=False,
+                      distCenter=d0.distCenter,pitch0=d0.pitch0,roll0=d0.roll0,
+                      c_pitch=d0.c_pitch,c_roll=d0.c_roll,compact=d0.compact)
+    data.files=[d.filepath for d in datalist]
+    
+    lasers=[getattr(d,'Laser',None) for d in datalist]
+    nlaser=[len(getattr(l,'t',[])) for l in lasers]
+    data.Laser=merge_msg([l for l in lasers if l is not None],MSG_type('Laser'),rows=True)
+    for msg in data.MSG_list:
+        if msg!='Laser':
+            setattr(data,msg,merge_msg([getattr(d,msg) for d in datalist if hasattr(d,msg)],MSG_type(msg)))
+    
+    # laserIdx refers to the laser samples of its session: map to the merged samples
+    if hasattr(data.PSTRB,'laserIdx'):
+        pos=np.full(sum(nlaser)+1,-1,dtype=np.int64)
+        pos[data.Laser.rows]=np.arange(data.Laser.len)
+        start=np.cumsum([0]+nlaser)
+        strobes=[]
+        for d,s,nl in zip(datalist,start,nlaser):
+            if not hasattr(d,'PSTRB'):
+                continue
+            st=copy.copy(d.PSTRB)
+            if hasattr(st,'laserIdx'):
+                n=st.laserIdx
+                k=(n>0)&(n<=nl)
+                st.laserIdx=np.where(k,pos[np.where(k,s+n-1,-1)]+1,0)
+            strobes.append(st)
+        data.PSTRB=merge_msg(strobes,MSG_type('PSTRB'))
+    del data.Laser.rows
+    
+    data.other=merge_stats([d.other for d in datalist if hasattr(d,'other')],MSG_stats(keep=d0.keep_other))
+    data.corrupt=merge_stats([d.corrupt for d in datalist if hasattr(d,'corrupt')],MSG_stats(keep=d0.keep_other))
+    data.index_gaps()
+    return data
+    
+
+def parseNMEA(l,diag=None):
     """
     l: string with data
+    diag: Diagnostics counting lines that could not be parsed (see diagnostics.py)
     TOW: time of Week to append to message data
     
     return height, signal quality, temperature 
     
     """
     
+    if diag is None:
+        diag=diagnostics.default
     Msg_key=l[l.find('$')+1:l.find(',') ]
     start=l.find('$'+Msg_key)
     end=l.find('*')
 
     # Check if message is valid
-    if (start!=-1 and end!=-1 and start<end and chksum_nmea(l[start:end+3])): 
+    if (start!=-1 and end!=-1 and start<end and chksum_nmea(l[start:end+3],diag)): 
 
       try:
           a=np.array(l[start+len(Msg_key)+2:end].split(','),dtype=float)
@@ -296,46 +587,50 @@ def parseNMEA(l):
           try:
               a=np.array(l[start+len(Msg_key)+2:end].split(','))
           except:
-              print('Coud not parse valid NMEA string:', l)  
+              diag.warn('nmea','could not parse valid NMEA line: %r',l)
               return 'Error',l 
     else:
-        print('Coud not parse string:', l)    
+        diag.warn('nmea','could not parse line: %r',l)
         return 'Error',l             
 
     return Msg_key,a
 
 
-def parseNMEAfloat(l):
+def parseNMEAfloat(l,diag=None):
     """
     l: string with data
+    diag: Diagnostics counting lines that could not be parsed (see diagnostics.py)
     TOW: time of Week to append to message data
     
     return height, signal quality, temperature 
     
     """
     
+    if diag is None:
+        diag=diagnostics.default
     Msg_key=l[l.find('$')+1:l.find(',') ]
     start=l.find('$'+Msg_key)
     end=l.find('*')
 
     # Check if message is valid
-    if (start!=-1 and end!=-1 and start<end and chksum_nmea(l[start:end+3])): 
+    if (start!=-1 and end!=-1 and start<end and chksum_nmea(l[start:end+3],diag)): 
 
       try:
           a=np.array(l[start+len(Msg_key)+2:end].split(','),dtype=float)
 
       except:
-              print('Coud not parse valid NMEA string:', l)  
+              diag.warn('nmea','could not parse valid NMEA line: %r',l)
               return 'Error',l 
     else:
-        print('Coud not parse string:', l)    
+        diag.warn('nmea','could not parse line: %r',l)
         return 'Error',l             
 
     return Msg_key,a
 
-def parseLaser(l):
+def parseLaser(l,diag=None):
     """
     l: string with data
+    diag: Diagnostics counting lines that could not be parsed (see diagnostics.py)
     TOW: time of Week to append to message data
     
     return height, signal quality, temperature 
@@ -351,6 +646,8 @@ def parseLaser(l):
     j=0
     t=0
     length=len(l)
+    if diag is None:
+        diag=diagnostics.default
     
     if l[0]=='D': 
     
@@ -362,7 +659,7 @@ def parseLaser(l):
                 h= float(a[1])
             except:
                 h= np.nan
-                print('coud not parse string:', l)
+                diag.warn('laser','could not parse line: %r',l)
         else:
             error=0
             try:
@@ -381,17 +678,17 @@ def parseLaser(l):
                 T= np.nan 
                 error=1
             if error:
-                print('coud not parse string:', l)
+                diag.warn('laser','could not parse line: %r',l)
     else:
         h= np.nan
         signQ= np.nan
         T= np.nan 
-        print('coud not parse string:', l)                 
+        diag.warn('laser','could not parse line: %r',l)
 
 
     return h,signQ,T
     
-def chksum_nmea(sentence):
+def chksum_nmea(sentence,diag=None):
     # From: http://doschman.blogspot.com/2013/01/calculating-nmea-sentence-checksums.html
    
     # This is a string, will need to convert it to hex for 
@@ -422,7 +719,9 @@ def chksum_nmea(sentence):
         if hex(csum) == hex(int(cksum, 16)):
            return True
     except  ValueError:
-        print('Invalid checksum: ',cksum)
+        if diag is None:
+            diag=diagnostics.default
+        diag.warn('checksum','invalid checksum: %r',cksum)
     return False
 
 
@@ -436,6 +735,7 @@ def check_data(data):
     data        Member of class UBXdata
     
     """
+    plotlibs.load(globals())
     
     print('\n\n###############################\n-----------------------------\n',
           data.name,
@@ -449,14 +749,15 @@ def check_data(data):
             print(d.len)
             print('Time intervall (s):')
             print((d.TOW[:5]-d.TOW[0]) )
+            if hasattr(d,'gaps'):
+                print(d.gaps.summary())
         except Exception as e: 
                 print(e)
             
             
     print('\nOthers: \n----------------------------')   
-    print('Length:')
     try:
-        print(len(data.other))
+        print(data.other.summary())
     except:
         print('no data')
     # for c in data.other[:10]: 
@@ -464,7 +765,7 @@ def check_data(data):
     
     print('\nCorrupted: \n----------------------------')   
     try:
-        print(len(data.corrupt))
+        print(data.corrupt.summary())
     except:
         print('no data')
     # for c in data.corrupt[:10]: 
@@ -504,6 +805,7 @@ def check_data(data):
 
 
 def plot_att(data,ax=[],title='',heading=True):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -541,6 +843,7 @@ def plot_att(data,ax=[],title='',heading=True):
     
     
 def plot_att_laser(data,ax=[],title='',heading=True):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -598,6 +901,7 @@ def plot_att_laser(data,ax=[],title='',heading=True):
         pl.title(title)
     
 def plot_elevation_time(data,ax=[],title=[]):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -616,7 +920,10 @@ def plot_elevation_time(data,ax=[],title=[]):
     pl.tight_layout()
     
     
-def plot_longlat(data,z='height',ax=[],cmap= cm.batlow):
+def plot_longlat(data,z='height',ax=[],cmap=None):
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -650,8 +957,11 @@ def plot_longlat(data,z='height',ax=[],cmap= cm.batlow):
 
         
 
-def plot_summary(data,extent,cmap=cm.batlow,heading=True):
+def plot_summary(data,extent,cmap=None,heading=True):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     fig=pl.figure(figsize=(8,10))
     spec = fig.add_gridspec(ncols=1, nrows=9)
     cimgt.OSM.get_image = image_spoof # reformat web request for street map spoofing
@@ -687,6 +997,7 @@ def plot_summary(data,extent,cmap=cm.batlow,heading=True):
 
 def laser_correction(data,show_corr_angles=0,GPS_h=False,heading=False):
     
+    plotlibs.load(globals())
     fig, [ax2,ax3] = pl.subplots(2, 1, figsize=(8, 8), sharex=True, sharey=False)
 
     ax2.plot((data.Laser.TOW-data.PINS1.TOW[0]) ,data.Laser.h, 'x:',label='original')
@@ -706,6 +1017,7 @@ def laser_correction(data,show_corr_angles=0,GPS_h=False,heading=False):
 
 def laser_correction_superimposed(data,GPS_h=False):
     
+    plotlibs.load(globals())
     fig, ax2 = pl.subplots(1, 1, figsize=(8, 8))
 
     ax2.plot((data.Laser.TOW-data.PINS1.TOW[0]) ,data.Laser.h, 'x:',label='original')
@@ -724,8 +1036,11 @@ def laser_correction_superimposed(data,GPS_h=False):
     return fig
 
 # %% plot on map
-def plot_map(data,z='height',ax=[],cmap= cm.batlow,title=[],timelim=[],timeformat='ms'):
+def plot_map(data,z='height',ax=[],cmap=None,title=[],timelim=[],timeformat='ms'):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax = pl.axes(projection=ccrs.PlateCarree())
@@ -771,6 +1086,7 @@ def plot_map(data,z='height',ax=[],cmap= cm.batlow,title=[],timelim=[],timeforma
 
 
 def image_spoof(self, tile): # this function pretends not to be a Python script
+        plotlibs.load(globals())
         url = self._image_url(tile) # get the url of the street map API
         req = Request(url) # start request
         req.add_header('User-agent','Anaconda 3') # add user agent to request
@@ -782,7 +1098,7 @@ def image_spoof(self, tile): # this function pretends not to be a Python script
         return img, self.tileextent(tile), 'lower' # reformat for cartopy
     
     
-def plot_mapOSM(data,z='height',ax=[],cmap= cm.batlow,title=[], extent=[]):
+def plot_mapOSM(data,z='height',ax=[],cmap=None,title=[], extent=[]):
     """
     Plot data (z) on Open Street Map layer.
     
@@ -806,6 +1122,9 @@ def plot_mapOSM(data,z='height',ax=[],cmap= cm.batlow,title=[], extent=[]):
     None.
 
     """
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     cimgt.OSM.get_image = image_spoof # reformat web request for street map spoofing
     osm_img = cimgt.OSM() # spoofed, downloaded street map
     
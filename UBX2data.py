@@ -9,32 +9,48 @@ Class and function used for handling data files with mixed UBX data from ublox G
 
 import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as pl
 import os,sys
 from pyubx2 import UBXReader
-from cmcrameri import cm
-from geopy import distance
-import cartopy.crs as ccrs
-import cartopy.io.img_tiles as cimgt
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
 import io
 from urllib.request import urlopen, Request
-from PIL import Image
+import plotlibs
+from msgstats import MSG_stats
+from itertools import islice
+from gpstime import gps_ns, align_tow, week_from_utc_fields, time_limits
+from sessions import merge_msg, merge_stats
+from timealign import estimate_offset, apply_offset
+from msggaps import MSG_gaps
+from laserfilter import filter_laser
+from profiler import Profiler
+import diagnostics
+import export
+import boresight
+from msgschema import UBX_schema, column_dtype, fill_value, promote
 
 # %%  data class
 
 class MSG_type:
-    def __init__(self):
+    def __init__(self,schema={}):
         self.parsed=[]
+        self.schema=schema
         
-    def extract(self):
+    def extract(self,promote=False,diag=None):
+        """
+        Convert parsed messages to one array per field. Column dtypes follow
+        self.schema (see msgschema.py). If promote, columns are int64/float64.
+        diag: Diagnostics counting failed fields (see diagnostics.py). Default: a new one,
+              whose counts are logged at the end.
+        """
+        own=diag is None
+        if own:
+            diag=diagnostics.Diagnostics()
         self.len=len(self.parsed)
         # print(l)
         if self.len>0:
             for attr in self.parsed[0].__dict__.keys():
                 
                 if attr!='_':
-                    setattr(self,attr,np.zeros(self.len,dtype=type(getattr(self.parsed[0],attr))))
+                    setattr(self,attr,np.zeros(self.len,dtype=column_dtype(self.schema,attr,getattr(self.parsed[0],attr))))
         
             for i,p in enumerate(self.parsed):
                 for attr in p.__dict__.keys():
@@ -44,26 +60,95 @@ class MSG_type:
                             getattr(self,attr)[i]=getattr(p, attr)
                         
                         except Exception as e: 
-                            getattr(self,attr)[i]=-999
-                            print(i)
-                            print(e)
-                            print('Failed to parse')
-                            print(attr)
-                            try:
-                                print(getattr(p, attr))
-                            
-                            except Exception as e: 
-                                print(e)
+                            getattr(self,attr)[i]=fill_value(getattr(self,attr).dtype)
+                            diag.warn('extract','message %d, field %s: %s',i,attr,e)
+            if promote:
+                self.promote()
+        if own:
+            diag.log_summary()
+    
+    def promote(self,attrs=None):
+        """
+        Convert columns to int64/float64 for computations.
+        """
+        promote(self,attrs)
+
+                
+class ESF_MEAS(MSG_type):
+    """
+    ESF-MEAS messages. Only the raw payloads are kept while reading. extract()
+    decodes them all at once into one MSG_type per sensor (e.g. self.gyroX) with
+    arrays iTOW (ms), timeTag (ms, unwrapped sensor time) and value (scaled).
+    """
+    
+    def __init__(self,schema={}):
+        MSG_type.__init__(self,schema)
+        self.raw=[]
+        self.iTOW_ref=[]
+        self.sensors=[]
+        
+    def add(self,raw_data,iTOW_ref):
+        """
+        raw_data: complete UBX message. iTOW_ref: iTOW of the last navigation message read before it.
+        """
+        self.raw.append(raw_data[6:-2])
+        self.iTOW_ref.append(iTOW_ref)
+    
+    def extract(self,promote=False,offset=None,diag=None):
+        """
+        offset: sensor time tag to iTOW offset (ms). Default: estimated from the
+                navigation messages around each ESF-MEAS message.
+        """
+        self.len=len(self.raw)
+        if self.len==0:
+            return
+        out=decode_ESF_MEAS(self.raw,np.array(self.iTOW_ref,dtype=np.int64),offset=offset)
+        self.timeTag,self.iTOW,self.offset=out[0],out[1],out[2]
+        self.sensors=[]
+        for name,d in out[3].items():
+            m=MSG_type()
+            m.timeTag,m.iTOW,m.value=d
+            m.len=len(m.value)
+            setattr(self,name,m)
+            self.sensors.append(name)
+            if promote:
+                m.promote()
+    
+    def subset(self,t_lim):
+        """
+        ESF-MEAS messages and sensor data with time t within t_lim (GPS ns). The raw payloads
+        stay a list of bytes, the sensors are cut by their own time.
+        """
+        d2=ESF_MEAS(self.schema)
+        lim=self.t.searchsorted(t_lim)
+        for a,v in self.__dict__.items():
+            if a in ['raw','iTOW_ref','parsed']:
+                setattr(d2,a,v[lim[0]:lim[1]])
+            elif a in self.sensors:
+                m=MSG_type()
+                l=v.t.searchsorted(t_lim)
+                for b,w in v.__dict__.items():
+                    setattr(m,b,w[l[0]:l[1]].copy() if isinstance(w,np.ndarray) and len(w)==v.len else w)
+                m.len=l[1]-l[0]
+                setattr(d2,a,m)
+            elif isinstance(v,np.ndarray) and len(v)==self.len:
+                setattr(d2,a,v[lim[0]:lim[1]].copy())
+            elif a!='gaps':
+                setattr(d2,a,v)
+        d2.sensors=list(self.sensors)
+        d2.len=lim[1]-lim[0]
+        return d2
 
                 
 class Laser:
-    def __init__(self,path,rate=5,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=0,c_roll=0):
+    def __init__(self,path,rate=5,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=0,c_roll=0,diag=None):
         self.distCenter=distCenter
         self.pitch0=pitch0
         self.roll0=roll0
         self.c_pitch=c_pitch
         self.c_roll=c_roll
-        self.iTOW,self.h,self.signQ,self.T,self.iTOW2=read_Laser(path,rate=rate)
+        self.laser_time_offset=laser_time_offset
+        self.iTOW,self.h,self.signQ,self.T,self.iTOW2=read_Laser(path,rate=rate,diag=diag)
                
     
 
@@ -72,10 +157,11 @@ class UBX2data:
     
     MSG_list=['PVT','ATT','MEAS','INS','ALG', 'STATUS','PVAT']
     MSG_id_list=['NAV-PVT','NAV-ATT','ESF-MEAS','ESF-INS','ESF-ALG','ESF-STATUS','NAV-PVAT']
-    extr_list=['ATT','PVT','INS','PVAT']
+    extr_list=['ATT','PVT','INS','PVAT','MEAS']
     
     def __init__(self,filepath,name='',Laserrate=5,clean=True,load=True, 
-                 correct_Laser=True,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=0,c_roll=0):
+                 correct_Laser=True,distCenter=0, pitch0=0, roll0=0,laser_time_offset=0,c_pitch=0,c_roll=0,
+                 compact=True,keep_other=False,align_laser=True,filter_Laser=False,profiler=None):
         """
             Read GNSS and Laser data from .ubx data file. Additional methods are available for plotting and handling data.    
         
@@ -86,6 +172,17 @@ class UBX2data:
             clean:          Separate GNSS and Laser data to different files. Default: clean=True
                             Used to restore GNSS data wich might be brocken by Laser data.
                             If 'force', force recleanig of data even if clean files are present.
+            compact:        Store message fields with their native UBX width (see msgschema.py).
+                            If False, all columns are int64/float64. Default: compact=True
+            keep_other:     Keep all unknown and corrupt messages in self.other.items and self.corrupt.items.
+                            Otherwise only counts, bytes and a sample per message type are kept (see msgstats.py).
+            laser_time_offset:  delay of the laser time stamps (ms), removed from Laser.t.
+            align_laser:    Estimate offset and drift of the laser time stamps by correlation of
+                            laser range and INS height and remove them (see align_laser). Default: True
+            filter_Laser:   Filter dropouts and spikes of the laser data with default settings
+                            (see filter_laser). h_corr is computed from the filtered height. Default: False
+            profiler:       Profiler (see profiler.py) recording time, bytes, messages and memory of each
+                            loading stage. The records are stored in self.load_report.
         """
         if name!='': 
             self.name=name
@@ -93,6 +190,8 @@ class UBX2data:
              self.name=filepath.split('\\')[-1]   
         
         self.Laserrate=Laserrate
+        self.compact=compact
+        self.diag=diagnostics.Diagnostics()
         
         
         
@@ -101,32 +200,41 @@ class UBX2data:
                 print("File not found!!!")
                 raise FileNotFoundError()
             self.file_original=filepath    
+            p=profiler if profiler is not None else Profiler()
+            p.begin(file=filepath,name=self.name)
             
+            p.start('clean')
+            cleaned=False
             if (clean=='force' or (clean==True and (not os.path.isfile(filepath[:-4]+'_GNSS.ubx') or not os.path.isfile(filepath[:-4]+'_Laser.dat') ))):
                 cleanFromLaser(filepath)
+                cleaned=True
                 filepath=self.file_original[:-4]+'_GNSS.ubx'
                 filelaser=self.file_original[:-4]+'_Laser.dat'
             elif clean:
                 if (not os.path.isfile(filepath[:-4]+'_GNSS.ubx') or not os.path.isfile(filepath[:-4]+'_Laser.dat') ):
                     cleanFromLaser(filepath)
+                    cleaned=True
                     print('Cleaned .ubs file!')
                 filepath=self.file_original[:-4]+'_GNSS.ubx'
                 filelaser=self.file_original[:-4]+'_Laser.dat'
             else:
                 filelaser=filepath
+            p.stop(nbytes=os.path.getsize(self.file_original) if cleaned else 0)
             
-            
+            p.start('decode')
             print('Reading file: ',filepath)
             print('----------------------------')
             stream = open(filepath, 'rb')
             ubr = UBXReader(stream, ubxonly=False, validate=0)
             
             for msg in self.MSG_list:
-                setattr(self,msg,MSG_type() )
+                setattr(self,msg,MSG_type(UBX_schema.get(msg,{})) )
+            self.MEAS=ESF_MEAS()
             
             i=0
-            self.corrupt=[]
-            self.other=[]
+            iTOW=-1  # iTOW of last navigation message, reference for ESF-MEAS time tags
+            self.corrupt=MSG_stats(keep=keep_other)
+            self.other=MSG_stats(keep=keep_other)
             
             for (raw_data, parsed_data) in ubr: 
                 # print(raw_data)
@@ -137,52 +245,202 @@ class UBX2data:
                     if parsed_data.identity in self.MSG_id_list:
                         j=self.MSG_id_list.index(parsed_data.identity)
                         
-                        getattr(self,self.MSG_list[j]).parsed.append(parsed_data)
+                        if self.MSG_list[j]=='MEAS':
+                            self.MEAS.add(raw_data,iTOW)
+                        else:
+                            getattr(self,self.MSG_list[j]).parsed.append(parsed_data)
+                            iTOW=getattr(parsed_data,'iTOW',iTOW)
                     else:
-                        self.other.append(parsed_data)
+                        self.other.add(parsed_data.identity,parsed_data,len(raw_data))
                             
                         
                 except Exception as e: 
-                    print(e)
-                    print('Failed to parse')
-                    print(i)
-                    self.corrupt.append(i)
+                    self.diag.warn('decode','message %d: %s',i,e)
+                    self.corrupt.add('corrupt',i,len(raw_data) if raw_data else 0)
+            stream.close()
+            p.stop(nbytes=os.path.getsize(filepath),msgs=i)
             
+            p.start('extract')
             self.extract()
+            p.stop(msgs=sum([getattr(getattr(self,msg),'len',0) for msg in self.MSG_list if msg!='MEAS']))
             
             # load laser data
             if self.Laserrate>0:
+                p.start('laser')
                 self.Laser=Laser(filelaser,rate=self.Laserrate,distCenter=distCenter,
                                  pitch0=pitch0, roll0=roll0,laser_time_offset=laser_time_offset,
-                                 c_pitch=c_pitch,c_roll=c_roll)
+                                 c_pitch=c_pitch,c_roll=c_roll,diag=self.diag)
+                p.stop(nbytes=os.path.getsize(filelaser),msgs=len(self.Laser.h))
+            
+            # absolute GPS time of all messages
+            p.start('time')
+            self.set_time()
+            p.stop()
+            
+            if self.Laserrate>0 and filter_Laser:
+                p.start('filter')
+                self.filter_laser()
+                p.stop(msgs=len(self.Laser.h))
+            
+            if self.Laserrate>0 and align_laser:
+                p.start('align')
+                self.align_laser()
+                p.stop(msgs=len(self.Laser.h))
             
-                # correct h with angles from INS
-                if correct_Laser:
-                    self.corr_h_laser()
+            # gap and rate index of all messages
+            p.start('gaps')
+            self.index_gaps()
+            p.stop()
+            
+            # correct h with angles from INS
+            if self.Laserrate>0 and correct_Laser:
+                p.start('correct')
+                self.corr_h_laser()
+                p.stop(msgs=len(self.Laser.h))
+            self.load_report=p.end()
+            self.diag.log_summary(self.name)
+    
+    def set_time(self):
+        """
+        Set absolute GPS time t (int64 ns since GPS epoch, see gpstime.py) of all
+        extracted messages and of the laser data. The GPS week is taken from the
+        first message of NAV-PVAT or NAV-PVT with valid date.
+        """
+        t_ref=np.zeros(0,dtype=np.int64)
+        iTOW_ref=np.zeros(0)
+        for msg in ['PVAT','PVT']:
+            d=getattr(self,msg,None)
+            if getattr(d,'len',0)>0 and hasattr(d,'year'):
+                valid=np.flatnonzero(d.validDate==1) if hasattr(d,'validDate') else np.arange(d.len)
+                if len(valid)>0:
+                    k=valid[0]
+                    sec=getattr(d,'second',getattr(d,'sec',np.zeros(d.len)))    # NAV-PVAT: sec
+                    week=week_from_utc_fields(d.iTOW[k],d.year[k],d.month[k],d.day[k],
+                                              d.hour[k],d.min[k],sec[k])
+                    t_ref=gps_ns(week,d.iTOW[k:k+1],'ms')
+                    iTOW_ref=d.iTOW[k:k+1]
+                    break
+        if len(t_ref)==0:
+            print('No valid date found. GPS week set to 0.')
+        
+        msgs=[getattr(self,m) for m in self.extr_list if hasattr(self,m)]
+        msgs+=[getattr(self.MEAS,s) for s in getattr(self.MEAS,'sensors',[])]
+        if hasattr(self,'Laser'):
+            msgs.append(self.Laser)
+        for d in msgs:
+            if hasattr(d,'iTOW'):
+                d.t=align_tow(np.asarray(d.iTOW),t_ref,iTOW_ref,'ms')
+        if hasattr(self,'Laser') and getattr(self.Laser,'laser_time_offset',0)!=0:
+            self.Laser.t=self.Laser.t-np.int64(round(self.Laser.laser_time_offset*10**6))
+    
+    def index_gaps(self):
+        """
+        Gap and rate index (MSG_gaps, see msggaps.py) of all messages with time t, stored as gaps.
+        """
+        msgs=[getattr(self,m) for m in self.MSG_list if hasattr(self,m)]
+        msgs+=[getattr(self.MEAS,s) for s in getattr(getattr(self,'MEAS',None),'sensors',[])]
+        for d in msgs:
+            if isinstance(getattr(d,'t',None),np.ndarray):
+                d.gaps=MSG_gaps(d.t)
+        if isinstance(getattr(getattr(self,'Laser',None),'t',None),np.ndarray):
+            self.Laser.gaps=MSG_gaps(self.Laser.t,period=1/self.Laserrate if self.Laserrate>0 else 0)
+    
+    def filter_laser(self,q_min=None,q_max=None,h_min=0,h_max=np.inf,window=11,nsigma=5,
+                     min_mad=0.01,scale_window=600,niter=2,T_coef=0,T_ref=20):
+        """
+        Filter laser data with signal quality, temperature compensation and despiking
+        (see laserfilter.filter_laser). Sets Laser.h_filt (NaN if not valid) and Laser.valid.
+        Run corr_h_laser afterwards to update h_corr.
+        """
+        try:
+            self.Laser.h_filt,self.Laser.valid=filter_laser(self.Laser.h,self.Laser.signQ,self.Laser.T,
+                    q_min=q_min,q_max=q_max,h_min=h_min,h_max=h_max,window=window,nsigma=nsigma,
+                    min_mad=min_mad,scale_window=scale_window,niter=niter,T_coef=T_coef,T_ref=T_ref)
+            print('Laser filter: {:d} of {:d} samples valid'.format(int(self.Laser.valid.sum()),len(self.Laser.h)))
+        except AttributeError:
+            print('Laser data not found.')
+    
+    def align_laser(self,MSG='PVAT',window=60,step=30,maxlag=2,min_corr=0.5,**kwargs):
+        """
+        Estimate offset and drift of the laser time stamps (Laser.t, from the # iTOW blocks)
+        by FFT cross correlation of the laser range with the height of MSG in sliding windows,
+        and remove them from Laser.t (see timealign.py). The uncorrected time is kept in Laser.t_raw,
+        the estimate in Laser.time_align.
+        
+        window, step:   length and step of correlation windows (s)
+        maxlag:         maximum offset searched (s)
+        min_corr:       minimum correlation of a window to be used
+        kwargs:         quality gate (min_windows, min_fraction, min_peak, max_spread, see
+                        timealign.estimate_offset). Laser.t is only changed if the estimate passes.
+        
+        The laser range is despiked for the correlation (see filter_laser) if Laser.h_filt is not set.
+        """
+        d=getattr(self,MSG,None)
+        if getattr(d,'len',0)==0 or not hasattr(self,'Laser') or not hasattr(self.Laser,'t'):
+            print('Laser time alignment: no data')
+            return
+        try:
+            h=getattr(self.Laser,'h_filt',None)
+            if h is None:
+                # spikes spoil the correlation, despike for the alignment only
+                h=filter_laser(self.Laser.h,self.Laser.signQ,self.Laser.T)[0]
+            est=estimate_offset(self.Laser.t,h,d.t,np.asarray(d.height)/1000,
+                                window=window,step=step,maxlag=maxlag,min_corr=min_corr,**kwargs)
+        except Exception as e:
+            self.diag.warn('laser','failed to align Laser time: %s',e)
+            est=None
+        self.Laser.time_align=est
+        if est is not None and not est['accepted']:
+            self.diag.warn('laser','Laser time alignment failed the quality gate, Laser time not changed')
+        if est is None or not est['accepted']:
+            return
+        if not hasattr(self.Laser,'t_raw'):
+            self.Laser.t_raw=self.Laser.t
+        self.Laser.t=apply_offset(self.Laser.t_raw,est['offset'],est['drift'],est['t0'])
+    
+    def attitude_laser(self):
+        """
+        Interpolate pitch and roll of PVAT (uncorrected, degree) to the laser times.
+        Stored as Laser.pitch_ins and Laser.roll_ins, e.g. for h_laser. NaN outside of the
+        time range of PVAT (no extrapolation).
+        """
+        i=np.clip(self.PVAT.t.searchsorted( self.Laser.t),1,self.PVAT.len-1)
+        j=np.array(i)-1
+        
+        self.Laser.pitch_ins=self.PVAT.vehPitch[j]+(self.PVAT.vehPitch[i]-self.PVAT.vehPitch[j])/(self.PVAT.t[i]-self.PVAT.t[j])*(self.Laser.t-self.PVAT.t[j])
+        self.Laser.roll_ins=self.PVAT.vehRoll[j]+(self.PVAT.vehRoll[i]-self.PVAT.vehRoll[j])/(self.PVAT.t[i]-self.PVAT.t[j])*(self.Laser.t-self.PVAT.t[j])
+        out=(self.Laser.t<self.PVAT.t[0])|(self.Laser.t>self.PVAT.t[-1])
+        self.Laser.pitch_ins=np.where(out,np.nan,self.Laser.pitch_ins)
+        self.Laser.roll_ins=np.where(out,np.nan,self.Laser.roll_ins)
+    
+    def h_laser(self,pitch0=None,roll0=None,distCenter=None,c_pitch=None,c_roll=None):
+        """
+        Corrected laser height for calibration parameters, without changing the data. Parameters
+        not given are the current ones (Laser.pitch0, ...). Parameters can be arrays of the same
+        (or broadcastable) shape, e.g. a grid from boresight.param_grid: the result then has the shape
+        of the parameters + (number of laser samples,).
+        Uses the attitude at the laser times of the last corr_h_laser (see attitude_laser).
+        """
+        if len(getattr(self.Laser,'pitch_ins',[]))!=len(self.Laser.t):
+            self.attitude_laser()
+        p=boresight.param_axes(self.Laser,pitch0=pitch0,roll0=roll0,distCenter=distCenter,
+                               c_pitch=c_pitch,c_roll=c_roll)
+        h=getattr(self.Laser,'h_filt',self.Laser.h)
+        return boresight.correct_height(h,self.Laser.pitch_ins,self.Laser.roll_ins,unit=np.pi/180,**p)
     
     def corr_h_laser(self):
         """
         correct height with angles from INS
         """   
         try:
-            i=self.PVAT.iTOW.searchsorted( self.Laser.iTOW)
-            j=np.array(i)-1
-            
-            pitch=self.PVAT.vehPitch[j]+(self.PVAT.vehPitch[i]-self.PVAT.vehPitch[j])/(self.PVAT.iTOW[i]-self.PVAT.iTOW[j])*(self.Laser.iTOW-self.PVAT.iTOW[j])
-            roll=self.PVAT.vehRoll[j]+(self.PVAT.vehRoll[i]-self.PVAT.vehRoll[j])/(self.PVAT.iTOW[i]-self.PVAT.iTOW[j])*(self.Laser.iTOW-self.PVAT.iTOW[j])
-            
-            roll-=self.Laser.roll0
-            pitch-=self.Laser.pitch0
-            roll*=self.Laser.c_roll
-            pitch*=self.Laser.c_pitch
+            self.attitude_laser()
             
-            self.Laser.pitch=pitch
-            self.Laser.roll=roll
-            self.Laser.h_corr=self.Laser.h*(np.cos(pitch/180*np.pi)*np.cos(roll/180*np.pi))-self.Laser.distCenter*np.sin(pitch/180*np.pi)
+            self.Laser.pitch=self.Laser.c_pitch*(self.Laser.pitch_ins-self.Laser.pitch0)
+            self.Laser.roll=self.Laser.c_roll*(self.Laser.roll_ins-self.Laser.roll0)
+            self.Laser.h_corr=self.h_laser()
         
         except Exception as e: 
-            print(e)
-            print('Failed to correct Laser height')
+            self.diag.warn('laser','failed to correct Laser height: %s',e)
             try:
                 self.Laser.h_corr=np.zeros_like(self.Laser.h)
             except AttributeError:
@@ -192,10 +450,10 @@ class UBX2data:
     def extract(self):
         for msg in self.extr_list:
             try:
-                getattr(self, msg).extract()
+                getattr(self, msg).extract(promote=not self.compact,diag=self.diag)
                 
             except AttributeError:
-                print(msg)
+                self.diag.warn('extract','message %s not extracted',msg)
 
 
     def plot_att(self, MSG='ATT',ax=[]):
@@ -204,17 +462,57 @@ class UBX2data:
     def plot_elevation_time(self, MSG='PVAT',ax=[],title=[]):
         plot_elevation_time(self,MSG=MSG,ax=ax,title=title)
 
-    def plot_longlat(self,MSG='PVAT',z='height',ax=[],cmap= cm.batlow):
+    def plot_longlat(self,MSG='PVAT',z='height',ax=[],cmap=None):
         plot_longlat(self,MSG=MSG,z=z,ax=ax,cmap=cmap)
         
-    def plot_map(self,MSG='PVAT',z='height',ax=[],cmap= cm.batlow):
+    def plot_map(self,MSG='PVAT',z='height',ax=[],cmap=None):
         plot_map(self,MSG=MSG,z=z,ax=ax,cmap=cmap)
 
-    def plot_mapOSM(self,MSG='PVAT',z='iTOW',ax=[],cmap= cm.batlow,title=[],extent=[]):
+    def plot_mapOSM(self,MSG='PVAT',z='iTOW',ax=[],cmap=None,title=[],extent=[]):
         plot_mapOSM(self,MSG=MSG,z=z,ax=ax,cmap= cmap,title=title,extent=extent)
 
 
 
+    def set_calibration(self,**kwargs):
+        """
+        Set calibration parameters (pitch0, roll0, distCenter, c_pitch, c_roll) and correct h
+        again without reading the file.
+        """
+        for k,v in kwargs.items():
+            if k not in boresight.PARAMS:
+                raise ValueError('unknown calibration parameter: '+k)
+            setattr(self.Laser,k,v)
+        self.corr_h_laser()
+    
+    def calibrate(self,fit=None,mode='flat',apply=False,**kwargs):
+        """
+        Solve the calibration with the laser data of maneuvers (see boresight.calibrate).
+        
+        apply:  apply the result with set_calibration if the solution converged with finite std.
+                Otherwise check the result (std, corr, rms) and call set_calibration(**res['params']).
+        
+        return  result of boresight.calibrate
+        """
+        res=boresight.calibrate([self],fit=fit,mode=mode,**kwargs)
+        if apply:
+            if res['converged'] and np.all(np.isfinite(list(res['std'].values()))):
+                self.set_calibration(**res['params'])
+            else:
+                print('Calibration not applied: solution not converged or parameters not determined.')
+        return res
+    
+    def to_parquet(self,folder,msgs=None,row_group=600,compression='zstd'):
+        """
+        Write all messages to folder/<message>/<session>.parquet (see export.write_parquet).
+        """
+        return export.write_parquet(self,folder,msgs=msgs,row_group=row_group,compression=compression)
+    
+    def to_las(self,file,**kwargs):
+        """
+        Write the georeferenced laser shots to a LAS file (see export.write_las).
+        """
+        return export.write_las(self,file,**kwargs)
+    
     def subset(self, timelim=[],timeformat='ms'):
         """
         Parameters
@@ -223,6 +521,7 @@ class UBX2data:
             limits in time. The default is [].
         timeformat : string, optional
             units of time limits. The default is 'ms'.
+            'ms': iTOW, 's': seconds from start of data, 'gps': GPS ns, 'utc': datetime64 (see gpstime.time_limits)
 
         Returns
         -------
@@ -233,29 +532,29 @@ class UBX2data:
         for MSG in ['PVAT','PVT']: 
             if  getattr(self,  MSG).len>0:
                  d=getattr(self, MSG)
-                 if timeformat=='ms':
-                        lim=d.iTOW.searchsorted(timelim)
-                        iTOW_lim=timelim
-                 if timeformat=='s':
-                        lim=((d.iTOW -d.iTOW[0])/1000).searchsorted(timelim)
-                        iTOW_lim=d.iTOW[lim]
+                 t_lim=time_limits(d.t,d.iTOW,timelim,timeformat,unit='ms')
                  break
         
         data2=UBX2data(self.file_original,name=self.name,Laserrate=self.Laserrate,load=False)
+        data2.file_original=self.file_original
+        data2.files=list(getattr(self,'files',[self.file_original]))
 
         for attr in (self.MSG_list+['Laser']):
             # print(attr)
             try:   
                 msg_data=getattr(self,attr)
-                lim2=msg_data.iTOW.searchsorted(iTOW_lim)
+                lim2=msg_data.t.searchsorted(t_lim)
             except   AttributeError:
                 try:
                     msg_data=getattr(self,attr)
                     msg_data.extract()
-                    lim2=msg_data.iTOW[iTOW_lim]
+                    lim2=msg_data.t.searchsorted(t_lim)
                 except Exception as e: 
                     print(e)
                     continue
+            if attr=='MEAS':
+                data2.MEAS=msg_data.subset(t_lim)
+                continue
             d2=MSG_type()
             
             for a in msg_data.__dict__.keys():
@@ -266,10 +565,54 @@ class UBX2data:
                     setattr(d2,a,getattr(msg_data, a))
             setattr(d2,'len',lim2[1]-lim2[0])
             setattr(data2,attr,d2)
+        data2.index_gaps()
         return data2
         
 # %% #########function definitions #############
 
+def concat(datalist,name=''):
+    """
+    Merge several sessions (e.g. the files of one flight day) into one UBX2data
+    object ordered by absolute GPS time t. Overlapping records are dropped
+    (see sessions.merge_msg).
+    
+    datalist:   list of UBX2data objects
+    name:       name of merged data. Default: name of first session.
+    
+    return  UBX2data object
+    """
+    d0=datalist[0]
+    data=UBX2data(d0.file_original,name=name if name!='' else d0.name,Laserrate=d0.Laserrate,
+                  load=False,compact=d0.compact)
+    data.file_original=d0.file_original
+    data.files=[f for d in datalist for f in getattr(d,'files',[d.file_original])]
+    
+    for msg in data.MSG_list:
+        if msg=='MEAS':
+            continue
+        setattr(data,msg,merge_msg([getattr(d,msg) for d in datalist if hasattr(d,msg)],
+                                   MSG_type(UBX_schema.get(msg,{}))))
+    
+    meas=[d.MEAS for d in datalist if hasattr(d,'MEAS')]
+    data.MEAS=merge_msg(meas,ESF_MEAS())
+    data.MEAS.sensors=[]
+    for m in meas:
+        for s in m.sensors:
+            if s not in data.MEAS.sensors:
+                data.MEAS.sensors.append(s)
+    for s in data.MEAS.sensors:
+        setattr(data.MEAS,s,merge_msg([getattr(m,s) for m in meas if hasattr(m,s)],MSG_type()))
+    
+    if any(hasattr(d,'Laser') for d in datalist):
+        data.Laser=merge_msg([d.Laser for d in datalist if hasattr(d,'Laser')],MSG_type())
+    
+    keep=any(d.other.keep for d in datalist if hasattr(d,'other'))
+    data.other=merge_stats([d.other for d in datalist if hasattr(d,'other')],MSG_stats(keep=keep))
+    data.corrupt=merge_stats([d.corrupt for d in datalist if hasattr(d,'corrupt')],MSG_stats(keep=keep))
+    data.index_gaps()
+    return data
+    
+
 def cleanFromLaser(path):
     """
     Delete laser data from file restoring ubx data.
@@ -310,15 +653,87 @@ def cleanFromLaser(path):
     
 
 
-def read_Laser(path,rate=5):
+# ESF-MEAS data types: name, scale, signed
+ESF_MEAS_types={5:('gyroZ',2**-12,True),         # deg/s
+                6:('wtFL',1,False),              # wheel ticks, bit 23 is the direction
+                7:('wtFR',1,False),
+                8:('wtRL',1,False),
+                9:('wtRR',1,False),
+                10:('singleTick',1,False),
+                11:('speed',1e-3,True),          # m/s
+                12:('gyroTemp',1e-2,True),       # deg C
+                13:('gyroY',2**-12,True),        # deg/s
+                14:('gyroX',2**-12,True),        # deg/s
+                16:('accX',2**-10,True),         # m/s^2
+                17:('accY',2**-10,True),
+                18:('accZ',2**-10,True)}
+
+
+def decode_ESF_MEAS(payloads,iTOW_ref=None,offset=None):
+    """
+    Decode ESF-MEAS payloads with vectorized operations.
+    
+    payloads:   list of message payloads (bytes, without header and checksum)
+    iTOW_ref:   iTOW (ms) of the navigation message read before each ESF-MEAS message, -1 if none.
+    offset:     iTOW - timeTag (ms). Default: median of iTOW_ref - timeTag.
+    
+    return  timeTag (unwrapped, ms), iTOW (ms), offset, dict with name: (timeTag, iTOW, value) per sensor type
+    """
+    lens=np.array([len(p) for p in payloads],dtype=np.int64)
+    buf=np.frombuffer(b''.join(payloads),dtype=np.uint8)
+    starts=np.concatenate(([0],np.cumsum(lens)[:-1]))
+    
+    def u32(off):
+        return (buf[off].astype(np.uint32) | buf[off+1].astype(np.uint32)<<8 |
+                buf[off+2].astype(np.uint32)<<16 | buf[off+3].astype(np.uint32)<<24)
+    
+    tag=u32(starts).astype(np.int64)
+    flags=buf[starts+4].astype(np.uint16) | buf[starts+5].astype(np.uint16)<<8
+    numMeas=((flags>>11)&0x1F).astype(np.int64)
+    numMeas=np.clip(np.minimum(numMeas,(lens-8)//4),0,None)   # guard against truncated payloads
+    
+    # unwrap 32 bit sensor time tag
+    tag+=np.cumsum(np.diff(tag,prepend=tag[0])<-2**31)*2**32
+    if offset is None:
+        if iTOW_ref is not None and np.any(iTOW_ref>=0):
+            offset=float(np.median(iTOW_ref[iTOW_ref>=0]-tag[iTOW_ref>=0]))
+        else:
+            offset=0.
+            print('No reference for ESF-MEAS time tags found. iTOW=timeTag.')
+    iTOW=tag+offset
+    
+    # one entry per measurement word
+    msg=np.repeat(np.arange(len(payloads)),numMeas)
+    j=np.arange(numMeas.sum())-np.repeat(np.cumsum(numMeas)-numMeas,numMeas)
+    words=u32(starts[msg]+8+4*j)
+    field=(words&0xFFFFFF).astype(np.int32)
+    dataType=(words>>24)&0x3F
+    
+    sensors={}
+    for t in np.unique(dataType):
+        k=dataType==t
+        name,scale,signed=ESF_MEAS_types.get(int(t),('type{:d}'.format(int(t)),1,False))
+        v=field[k]
+        if signed:
+            v=np.where(v>=2**23,v-2**24,v)
+        sensors[name]=(tag[msg[k]],iTOW[msg[k]],v*scale if scale!=1 else v)
+    return tag,iTOW,offset,sensors
+
+
+def read_Laser(path,rate=5,diag=None):
     """
     path: file path
     rate: data reate of Laser in Hz
+    diag: Diagnostics counting lines that could not be parsed (see diagnostics.py). Default: a new
+          one, whose counts are logged at the end.
     
     return  time of week (ms), height, signal quality, temperature 
     
     """
     
+    own=diag is None
+    if own:
+        diag=diagnostics.Diagnostics()
     file=open(path,mode='rt',errors='ignore')
     
     h=[]
@@ -352,7 +767,7 @@ def read_Laser(path,rate=5):
                     h.append(-999)
                     iTOW.append(0) 
                     iTOW2.append(i*1000/rate)
-                    print('coud not parse string:', l)
+                    diag.warn('laser','could not parse line: %r',l)
             else:      
                 try:
                     a=l.split()
@@ -367,7 +782,7 @@ def read_Laser(path,rate=5):
                     T.append(-999  )
                     iTOW.append(0) 
                     iTOW2.append(i*1000/rate)
-                    print('coud not parse string:', l)
+                    diag.warn('laser','could not parse line: %r',l)
             i+=1
             j+=1
         
@@ -400,6 +815,8 @@ def read_Laser(path,rate=5):
         T[T==-999]=np.nan
         signQ=np.array(signQ)
         signQ[signQ==-999]=np.nan
+    if own:
+        diag.log_summary(path)
     return np.array(iTOW),h,signQ,T,t2
     
     
@@ -412,6 +829,7 @@ def check_data(data):
     data        Member of class UBXdata
     
     """
+    plotlibs.load(globals())
     
     print('\n\n###############################\n-----------------------------\n',
           data.name,
@@ -422,19 +840,23 @@ def check_data(data):
             d=getattr(data,attr)
             print('\n',attr,'\n----------------------------')
             print('Length:')
-            print(len(d.parsed))
+            print(getattr(d,'len',len(d.parsed)))
             print('Time intervall (s):')
             print((d.iTOW[:5]-d.iTOW[0])/1000)
+            if hasattr(d,'gaps'):
+                print(d.gaps.summary())
         except Exception as e: 
                 print(e)
             
             
     print('\nOthers: \n----------------------------')   
-    for c in data.other[:10]: 
+    print(data.other.summary())
+    for c in islice(data.other,10): 
         print(c.identity,', bit length:',c.length) 
     
     print('\nCorrupted: \n----------------------------')   
-    for c in data.corrupt[:10]: 
+    print(data.corrupt.summary())
+    for c in islice(data.corrupt,10): 
         print(c)      
         
     try:
@@ -474,6 +896,7 @@ def check_data(data):
 
 
 def plot_att(data,MSG='ATT',ax=[],title='',heading=True):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -515,6 +938,7 @@ def plot_att(data,MSG='ATT',ax=[],title='',heading=True):
     
     
 def plot_att_laser(data,MSG='PVAT',ax=[]):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -567,6 +991,7 @@ def plot_att_laser(data,MSG='PVAT',ax=[]):
     pl.title(data.name)    
     
 def plot_elevation_time(data,MSG='PVT',ax=[],title=[]):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -585,7 +1010,10 @@ def plot_elevation_time(data,MSG='PVT',ax=[],title=[]):
     pl.tight_layout()
     
     
-def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
+def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap=None):
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -619,8 +1047,11 @@ def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
 
         
 
-def plot_summary(data,extent,cmap=cm.batlow,heading=True):
+def plot_summary(data,extent,cmap=None,heading=True):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     fig=pl.figure(figsize=(8,10))
     spec = fig.add_gridspec(ncols=1, nrows=9)
     cimgt.OSM.get_image = image_spoof # reformat web request for street map spoofing
@@ -656,6 +1087,7 @@ def plot_summary(data,extent,cmap=cm.batlow,heading=True):
 
 def laser_correction(data,show_corr_angles=0,GPS_h=False,heading=False):
     
+    plotlibs.load(globals())
     fig, [ax2,ax3] = pl.subplots(2, 1, figsize=(8, 8), sharex=True, sharey=False)
 
     ax2.plot((data.Laser.iTOW-data.PVAT.iTOW[0])/1000,data.Laser.h, 'x:',label='original')
@@ -675,6 +1107,7 @@ def laser_correction(data,show_corr_angles=0,GPS_h=False,heading=False):
 
 def laser_correction_superimposed(data,GPS_h=False):
     
+    plotlibs.load(globals())
     fig, ax2 = pl.subplots(1, 1, figsize=(8, 8))
 
     ax2.plot((data.Laser.iTOW-data.PVAT.iTOW[0])/1000,data.Laser.h, 'x:',label='original')
@@ -693,8 +1126,11 @@ def laser_correction_superimposed(data,GPS_h=False):
     return fig
 
 # %% plot on map
-def plot_map(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow,title=[],timelim=[],timeformat='ms'):
+def plot_map(data,MSG='PVT',z='height',ax=[],cmap=None,title=[],timelim=[],timeformat='ms'):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax = pl.axes(projection=ccrs.PlateCarree())
@@ -740,6 +1176,7 @@ def plot_map(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow,title=[],timelim=[]
 
 
 def image_spoof(self, tile): # this function pretends not to be a Python script
+        plotlibs.load(globals())
         url = self._image_url(tile) # get the url of the street map API
         req = Request(url) # start request
         req.add_header('User-agent','Anaconda 3') # add user agent to request
@@ -751,7 +1188,7 @@ def image_spoof(self, tile): # this function pretends not to be a Python script
         return img, self.tileextent(tile), 'lower' # reformat for cartopy
     
     
-def plot_mapOSM(data,MSG='PVAT',z='height',ax=[],cmap= cm.batlow,title=[], extent=[]):
+def plot_mapOSM(data,MSG='PVAT',z='height',ax=[],cmap=None,title=[], extent=[]):
     """
     Plot data (z) on Open Street Map layer.
     
@@ -776,6 +1213,9 @@ def plot_mapOSM(data,MSG='PVAT',z='height',ax=[],cmap= cm.batlow,title=[], exten
     None.
 
     """
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     cimgt.OSM.get_image = image_spoof # reformat web request for street map spoofing
     osm_img = cimgt.OSM() # spoofed, downloaded street map
     
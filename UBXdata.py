@@ -9,32 +9,40 @@ Class and function used for handling UBX data from ublox GNSS modules.
 
 import numpy as np
 from datetime import datetime
-import matplotlib.pyplot as pl
 import os,sys
 from pyubx2 import UBXReader
-from cmcrameri import cm
-from geopy import distance
-import cartopy.crs as ccrs
-import cartopy.io.img_tiles as cimgt
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
 import io
 from urllib.request import urlopen, Request
-from PIL import Image
+import plotlibs
+from msgstats import MSG_stats
+from itertools import islice
+from msgschema import UBX_schema, column_dtype, promote
+import diagnostics
 
 # %%  data class
 
 class MSG_type:
-    def __init__(self):
+    def __init__(self,schema={}):
         self.parsed=[]
+        self.schema=schema
         
-    def extract(self):
+    def extract(self,promote=False,diag=None):
+        """
+        Convert parsed messages to one array per field. Column dtypes follow
+        self.schema (see msgschema.py). If promote, columns are int64/float64.
+        diag: Diagnostics counting failed fields (see diagnostics.py). Default: a new one,
+              whose counts are logged at the end.
+        """
+        own=diag is None
+        if own:
+            diag=diagnostics.Diagnostics()
         l=len(self.parsed)
         # print(l)
         if l>0:
             for attr in self.parsed[0].__dict__.keys():
                 
                 if attr!='_':
-                    setattr(self,attr,np.zeros(l,dtype=type(getattr(self.parsed[0],attr))))
+                    setattr(self,attr,np.zeros(l,dtype=column_dtype(self.schema,attr,getattr(self.parsed[0],attr))))
         
             for i,p in enumerate(self.parsed):
                 for attr in p.__dict__.keys():
@@ -44,9 +52,17 @@ class MSG_type:
                             getattr(self,attr)[i]=getattr(p, attr)
                         
                         except Exception as e: 
-                            print(e)
-                            print('Failed to parse')
-                            print(attr)
+                            diag.warn('extract','message %d, field %s: %s',i,attr,e)
+            if promote:
+                self.promote()
+        if own:
+            diag.log_summary()
+    
+    def promote(self,attrs=None):
+        """
+        Convert columns to int64/float64 for computations.
+        """
+        promote(self,attrs)
                 
 
 class UBXdata:
@@ -55,24 +71,29 @@ class UBXdata:
     MSG_id_list=['NAV-PVT','NAV-ATT','ESF-MEAS','ESF-INS','ESF-ALG','ESF-STATUS','NAV-PVAT']
     extr_list=['ATT','PVT','INS','PVAT']
     
-    def __init__(self,filepath,name=''):
+    def __init__(self,filepath,name='',compact=True,keep_other=False):
         """
-        
+        compact:    Store message fields with their native UBX width (see msgschema.py).
+                    If False, all columns are int64/float64.
+        keep_other: Keep all unknown and corrupt messages in self.other.items and self.corrupt.items.
+                    Otherwise only counts, bytes and a sample per message type are kept.
         """
         if name!='': 
             self.name=name
         else:
              self.name=filepath.split('\\')[-1]   
+        self.compact=compact
+        self.diag=diagnostics.Diagnostics()
         
         stream = open(filepath, 'rb')
         ubr = UBXReader(stream, ubxonly=False, validate=0)
         
         for msg in self.MSG_list:
-            setattr(self,msg,MSG_type() )
+            setattr(self,msg,MSG_type(UBX_schema.get(msg,{})) )
         
         i=0
-        self.corrupt=[]
-        self.other=[]
+        self.corrupt=MSG_stats(keep=keep_other)
+        self.other=MSG_stats(keep=keep_other)
         
         for (raw_data, parsed_data) in ubr: 
             # print(raw_data)
@@ -85,24 +106,24 @@ class UBXdata:
                     
                     getattr(self,self.MSG_list[j]).parsed.append(parsed_data)
                 else:
-                    self.other.append(parsed_data)
+                    self.other.add(parsed_data.identity,parsed_data,len(raw_data))
                         
                     
             except Exception as e: 
-                print(e)
-                print('Failed to parse')
-                self.corrupt.append(i)
+                self.diag.warn('decode','message %d: %s',i,e)
+                self.corrupt.add('corrupt',i,len(raw_data) if raw_data else 0)
         
         self.extract()
+        self.diag.log_summary(self.name)
         
                 
     def extract(self):
         for msg in self.extr_list:
             try:
-                getattr(self, msg).extract()
+                getattr(self, msg).extract(promote=not self.compact,diag=self.diag)
                 
             except AttributeError:
-                print(msg)
+                self.diag.warn('extract','message %s not extracted',msg)
 
 
     def plot_att(self, MSG='ATT',ax=[]):
@@ -111,13 +132,13 @@ class UBXdata:
     def plot_elevation_time(self, MSG='PVT',ax=[],title=[]):
         plot_elevation_time(self,MSG=MSG,ax=ax,title=title)
 
-    def plot_longlat(self,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
+    def plot_longlat(self,MSG='PVT',z='height',ax=[],cmap=None):
         plot_longlat(self,MSG=MSG,z=z,ax=ax,cmap=cmap)
         
-    def plot_map(self,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
+    def plot_map(self,MSG='PVT',z='height',ax=[],cmap=None):
         plot_map(self,MSG=MSG,z=z,ax=ax,cmap=cmap)
 
-    def plot_mapOSM(self,MSG='PVT',z='iTOW',ax=[],cmap= cm.batlow,title=[]):
+    def plot_mapOSM(self,MSG='PVT',z='iTOW',ax=[],cmap=None,title=[]):
         plot_mapOSM(self,MSG=MSG,z=z,ax=ax,cmap= cmap,title=title)
 
 # %% #########function definitions #############
@@ -151,11 +172,13 @@ def check_data(data):
             
             
     print('\nOthers: \n----------------------------')   
-    for c in data.other[:10]: 
+    print(data.other.summary())
+    for c in islice(data.other,10): 
         print(c.identity,', bit length:',c.length) 
     
     print('\nCorrupted: \n----------------------------')   
-    for c in data.corrupt[:10]: 
+    print(data.corrupt.summary())
+    for c in islice(data.corrupt,10): 
         print(c)      
         
     try:
@@ -175,6 +198,7 @@ def check_data(data):
 
 
 def plot_att(data,MSG='ATT',ax=[]):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -209,6 +233,7 @@ def plot_att(data,MSG='ATT',ax=[]):
     
     
 def plot_elevation_time(data,MSG='PVT',ax=[],title=[]):
+    plotlibs.load(globals())
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -227,7 +252,10 @@ def plot_elevation_time(data,MSG='PVT',ax=[],title=[]):
     pl.tight_layout()
     
     
-def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
+def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap=None):
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax=pl.subplot(111)
@@ -266,8 +294,11 @@ def plot_longlat(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow):
 
 
 # %% plot on map
-def plot_map(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow,title=[]):
+def plot_map(data,MSG='PVT',z='height',ax=[],cmap=None,title=[]):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     if ax==[]:
         fig=pl.figure()
         ax = pl.axes(projection=ccrs.PlateCarree())
@@ -302,6 +333,7 @@ def plot_map(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow,title=[]):
 
 
 def image_spoof(self, tile): # this function pretends not to be a Python script
+        plotlibs.load(globals())
         url = self._image_url(tile) # get the url of the street map API
         req = Request(url) # start request
         req.add_header('User-agent','Anaconda 3') # add user agent to request
@@ -313,8 +345,11 @@ def image_spoof(self, tile): # this function pretends not to be a Python script
         return img, self.tileextent(tile), 'lower' # reformat for cartopy
     
     
-def plot_mapOSM(data,MSG='PVT',z='height',ax=[],cmap= cm.batlow,title=[]):
+def plot_mapOSM(data,MSG='PVT',z='height',ax=[],cmap=None,title=[]):
     
+    plotlibs.load(globals())
+    if cmap is None:
+        cmap=cm.batlow
     cimgt.OSM.get_image = image_spoof # reformat web request for street map spoofing
     osm_img = cimgt.OSM() # spoofed, downloaded street map
     
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of loading and correcting data with UBX2data and INSLASERdata.
+
+Synthetic files (see synthetic.py) are written to a temporary folder for each
+laser rate. Every stage is timed (best of repeat) and run once more with
+tracemalloc for the peak memory. Results are printed with throughput and
+appended as JSON lines to the results file, together with the ratio to the
+last stored result of the same case.
+
+Usage:  python benchmarks/bench_load.py [duration=60] [rates=5,10,20] [repeat=3] [results=benchmarks/results.jsonl]
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+import UBX2data
+import INSLASERdata
+
+
+def run(fun,repeat=3):
+    """
+    Time fun() (best of repeat) and its peak memory. Output of fun is suppressed.
+
+    return  time (s), peak memory (bytes), result of last call
+    """
+    best=float('inf')
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t=time.perf_counter()
+            fun()
+            t=time.perf_counter()-t
+        best=min(best,t)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        r=fun()
+    peak=tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best,peak,r
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git','rev-parse','--short','HEAD'],cwd=ROOT,capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def cases(folder,duration,rate,repeat):
+    """
+    Generate the files for one laser rate and run all cases.
+
+    return  list of results (dict)
+    """
+    ubx=os.path.join(folder,'bench_{:d}Hz.ubx'.format(rate))
+    dat=os.path.join(folder,'INS_bench_{:d}Hz.dat'.format(rate))
+    n_ubx,n_laser=synthetic.write_ubx_laser(ubx,duration=duration,laser_rate=rate)
+    n_nmea,n_laser2=synthetic.write_nmea_laser(dat,duration=duration,laser_rate=rate)
+    size_ubx=os.path.getsize(ubx)
+    size_dat=os.path.getsize(dat)
+    out=[]
+
+    def add(case,t,peak,nbytes,nmsg):
+        out.append({'case':case,'laser_rate':rate,'duration':duration,'time':t,'peak_MB':peak/2**20,
+                    'MB_s':nbytes/2**20/t if t>0 else 0,'msgs_s':nmsg/t if t>0 else 0})
+
+    t,peak,r=run(lambda:UBX2data.cleanFromLaser(ubx),repeat)
+    add('cleanFromLaser',t,peak,size_ubx,n_ubx+n_laser)
+
+    laserfile=ubx[:-4]+'_Laser.dat'
+    t,peak,r=run(lambda:UBX2data.read_Laser(laserfile,rate=rate),repeat)
+    add('read_Laser',t,peak,os.path.getsize(laserfile),n_laser)
+
+    t,peak,data=run(lambda:UBX2data.UBX2data(ubx,Laserrate=rate),repeat)
+    add('UBX2data.__init__',t,peak,size_ubx,n_ubx+n_laser)
+
+    t,peak,r=run(lambda:data.PVAT.extract(),repeat)
+    add('MSG_type.extract',t,peak,0,data.PVAT.len)
+
+    t,peak,r=run(lambda:data.corr_h_laser(),repeat)
+    add('UBX2data.corr_h_laser',t,peak,0,data.Laser.len if hasattr(data.Laser,'len') else len(data.Laser.h))
+
+    t,peak,r=run(lambda:data.subset(timelim=[duration/4,duration*3/4],timeformat='s'),repeat)
+    add('UBX2data.subset',t,peak,0,n_ubx+n_laser)
+
+    ins=INSLASERdata.INSLASERdata(dat,load=False)
+    t,peak,r=run(lambda:ins.loadData(correct_Laser=False),repeat)
+    add('INSLASERdata.loadData',t,peak,size_dat,n_nmea+n_laser2)
+
+    t,peak,r=run(lambda:ins.corr_h_laser(),repeat)
+    add('INSLASERdata.corr_h_laser',t,peak,0,ins.Laser.len)
+
+    t,peak,r=run(lambda:ins.subset(timelim=[duration/4,duration*3/4],timeformat='s'),repeat)
+    add('INSLASERdata.subset',t,peak,0,n_nmea+n_laser2)
+    return out
+
+
+def last_results(path):
+    """
+    return  dict (case, laser_rate, duration): last stored result
+    """
+    last={}
+    if path and os.path.isfile(path):
+        with open(path) as f:
+            for l in f:
+                try:
+                    r=json.loads(l)
+                except ValueError:
+                    continue
+                last[(r['case'],r['laser_rate'],r['duration'])]=r
+    return last
+
+
+def main(duration=60,rates='5,10,20',repeat=3,results=os.path.join(ROOT,'benchmarks','results.jsonl')):
+    duration=float(duration)
+    repeat=int(repeat)
+    rates=[int(r) for r in str(rates).split(',')]
+    last=last_results(results)
+    stamp=time.strftime('%Y-%m-%dT%H:%M:%S')
+    commit=git_commit()
+
+    folder=tempfile.mkdtemp(prefix='bench_load_')
+    res=[]
+    try:
+        for rate in rates:
+            res+=cases(folder,duration,rate,repeat)
+    finally:
+        shutil.rmtree(folder,ignore_errors=True)
+
+    print('{:28s} {:>5s} {:>9s} {:>9s} {:>11s} {:>9s} {:>8s}'.format(
+        'case','Hz','time (s)','MB/s','msgs/s','peak MB','vs last'))
+    for r in res:
+        prev=last.get((r['case'],r['laser_rate'],r['duration']))
+        ratio='{:.2f}'.format(r['time']/prev['time']) if prev and prev['time']>0 else '-'
+        print('{case:28s} {laser_rate:5d} {time:9.4f} {MB_s:9.2f} {msgs_s:11.0f} {peak_MB:9.2f}'.format(**r),
+              '{:>8s}'.format(ratio))
+
+    if results:
+        with open(results,'a') as f:
+            for r in res:
+                r.update(date=stamp,commit=commit,python=sys.version.split()[0])
+                f.write(json.dumps(r)+'\n')
+        print('Results appended to',results)
+
+
+if __name__ == "__main__":
+    kwargs = dict(arg.split('=') for arg in sys.argv[1:] if '=' in arg)
+    main(**kwargs)
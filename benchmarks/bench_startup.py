@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Startup time of the data modules.
+
+Every import is timed in a fresh interpreter: once for the parsing core only
+(import of the module) and once with the plotting libraries loaded as on the
+first call of a plot_* function or check_data.
+
+Usage:  python benchmarks/bench_startup.py [repeat=5]
+"""
+
+import os
+import sys
+import subprocess
+import time
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES=['UBX2data','UBXdata','INSLASERdata']
+
+
+def time_import(code,repeat=5):
+    """
+    Run code in a new python process repeat times.
+    
+    return  best wall time (s), or nan if the code failed
+    """
+    best=float('nan')
+    for i in range(repeat):
+        t=time.perf_counter()
+        r=subprocess.run([sys.executable,'-c',code],cwd=ROOT,capture_output=True)
+        t=time.perf_counter()-t
+        if r.returncode!=0:
+            print(r.stderr.decode(errors='ignore').strip().split('\n')[-1])
+            return float('nan')
+        best=min(best,t) if i>0 else t
+    return best
+
+
+def main(repeat=5):
+    repeat=int(repeat)
+    base=time_import('pass',repeat)
+    print('python startup: {:.3f} s'.format(base))
+    print('{:15s} {:>12s} {:>16s}'.format('module','core (s)','with plots (s)'))
+    for m in MODULES:
+        core=time_import('import {:s}'.format(m),repeat)
+        full=time_import('import {0:s}, plotlibs; plotlibs.load({0:s}.__dict__)'.format(m),repeat)
+        print('{:15s} {:12.3f} {:16.3f}'.format(m,core-base,full-base))
+
+
+if __name__ == "__main__":
+    kwargs = dict(arg.split('=') for arg in sys.argv[1:] if '=' in arg)
+    main(**kwargs)
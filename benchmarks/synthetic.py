@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic flight data in the formats written by the loggers, for benchmarks and
+scale tests.
+
+write_ubx_laser:    UBX (NAV-PVAT, NAV-PVT, ESF-INS) with interleaved laser blocks
+                    (# iTOW ... D ... # end), as written by Log_GNSS_LDS70A
+write_nmea_laser:   IMX5 NMEA ($PINS1, $PINS2, $PSTRB) with laser D lines, as written
+                    by Log_IMX5_LDS70A
+
+The trajectory, attitude and terrain are known (trajectory, ground), so the
+height correction can be checked against the truth: the vertical distance to
+the ground is trajectory(t)['height']-trajectory(t)['ground']. The laser
+footprint is taken below the aircraft (no displacement by the tilt).
+
+Data are generated in chunks of time with vectorized frame packing (numpy
+structured arrays, checksums from byte sums), so files of many GB can be written
+with bounded memory.
+
+Usage:  python benchmarks/synthetic.py file=test.ubx duration=3600 laser_rate=5
+        python benchmarks/synthetic.py file=INS_test.dat size=10e9 laser_rate=20
+"""
+
+import re
+import sys
+import inspect
+import numpy as np
+
+GPS_EPOCH=np.datetime64('1980-01-06T00:00:00','ns')
+LEAP=18                                         # GPS-UTC (s)
+START=np.datetime64('2024-03-01T12:00:00','ns')  # GPS time of first epoch
+LAT0,LON0=78.2,15.6
+H_GROUND=30.                # mean ellipsoid height of the ground (m)
+H0=50.                      # mean flight height above ground (m)
+SPEED=20.                   # m/s
+R_EARTH=6371000.
+# vertical motion of the aircraft: amplitude (m), period (s), phase
+_vertical_=[(5,60,0),(0.6,9.7,2),(0.8,4.3,0),(0.5,2.1,1)]
+
+
+def ground(north,east):
+    """
+    Ellipsoid height of the ground (m) at north, east (m from start)
+    """
+    return (H_GROUND+2*np.sin(2*np.pi*north/800)+0.5*np.sin(2*np.pi*north/97)
+            +1.5*np.sin(2*np.pi*east/600))
+
+
+def trajectory(t):
+    """
+    Aircraft state at time t (s from start, array). Lines of 10 km flown back and forth.
+
+    return  dict with north, east (m), lat, lon (deg), height (m), roll, pitch, heading (deg),
+            rollRate, pitchRate (deg/s), velN, velE, velD (m/s), ground (m), range (laser, m)
+    """
+    t=np.asarray(t,dtype=np.float64)
+    T_line=10000/SPEED
+    line=np.floor(t/T_line)
+    s=(t-line*T_line)*SPEED
+    back=line%2==1
+    north=np.where(back,10000-s,s)
+    east=line*50.
+    heading=np.where(back,180.,0.)
+    velN=np.where(back,-SPEED,SPEED)
+    velE=np.zeros_like(t)
+
+    w_r,w_p=2*np.pi/7,2*np.pi/5
+    # slow climb and descent plus vertical motion by turbulence
+    height=np.full_like(t,H_GROUND+H0)
+    velD=np.zeros_like(t)
+    for a,T,ph in _vertical_:
+        height+=a*np.sin(2*np.pi*t/T+ph)
+        velD-=a*2*np.pi/T*np.cos(2*np.pi*t/T+ph)
+    roll=3*np.sin(w_r*t)
+    pitch=2*np.sin(w_p*t)
+    g=ground(north,east)
+    return {'north':north,'east':east,
+            'lat':LAT0+north/R_EARTH*180/np.pi,
+            'lon':LON0+east/(R_EARTH*np.cos(np.radians(LAT0)))*180/np.pi,
+            'height':height,'roll':roll,'pitch':pitch,'heading':heading,
+            'rollRate':3*w_r*np.cos(w_r*t),'pitchRate':2*w_p*np.cos(w_p*t),
+            'velN':velN,'velE':velE,'velD':velD,'ground':g,
+            'range':(height-g)/(np.cos(np.radians(roll))*np.cos(np.radians(pitch)))}
+
+
+def gps_time(t):
+    """
+    GPS week and time of week (s) at time t (s from start)
+    """
+    s=(START-GPS_EPOCH).astype(np.int64)*1e-9+np.asarray(t,dtype=np.float64)
+    return (s//604800).astype(np.int64),s%604800
+
+
+def utc_fields(t):
+    """
+    UTC year, month, day, hour, minute, second, nano at time t (s from start)
+    """
+    utc=START+(np.round((np.asarray(t)-LEAP)*1e9)).astype('timedelta64[ns]')
+    Y=utc.astype('datetime64[Y]')
+    M=utc.astype('datetime64[M]')
+    D=utc.astype('datetime64[D]')
+    s=(utc-D).astype(np.int64)
+    return (Y.astype(np.int64)+1970,(M-Y).astype(np.int64)+1,(D-M).astype(np.int64)+1,
+            s//(3600*10**9),s//(60*10**9)%60,s//10**9%60,s%10**9)
+
+
+# %% UBX frames
+
+def _frame_dtype(payload):
+    return np.dtype([('sync','u1',2),('cls','u1'),('id','u1'),('len','<u2'),('payload',payload),('ck','u1',2)])
+
+PVAT_dtype=np.dtype([('iTOW','<u4'),('version','u1'),('valid','u1'),('year','<u2'),('month','u1'),
+                     ('day','u1'),('hour','u1'),('min','u1'),('sec','u1'),('res0','V3'),('tAcc','<u4'),
+                     ('nano','<i4'),('fixType','u1'),('flags','u1'),('flags2','u1'),('numSV','u1'),
+                     ('lon','<i4'),('lat','<i4'),('height','<i4'),('hMSL','<i4'),('hAcc','<u4'),('vAcc','<u4'),
+                     ('velN','<i4'),('velE','<i4'),('velD','<i4'),('gSpeed','<i4'),('sAcc','<u4'),
+                     ('vehRoll','<i4'),('vehPitch','<i4'),('vehHeading','<i4'),('motHeading','<i4'),
+                     ('accRoll','<u2'),('accPitch','<u2'),('accHeading','<u2'),('magDec','<i2'),('magAcc','<u2'),
+                     ('errEllipseOrient','<u2'),('errEllipseMajor','<u4'),('errEllipseMinor','<u4'),('res2','V8')])
+PVT_dtype=np.dtype([('iTOW','<u4'),('year','<u2'),('month','u1'),('day','u1'),('hour','u1'),('min','u1'),
+                    ('sec','u1'),('valid','u1'),('tAcc','<u4'),('nano','<i4'),('fixType','u1'),('flags','u1'),
+                    ('flags2','u1'),('numSV','u1'),('lon','<i4'),('lat','<i4'),('height','<i4'),('hMSL','<i4'),
+                    ('hAcc','<u4'),('vAcc','<u4'),('velN','<i4'),('velE','<i4'),('velD','<i4'),('gSpeed','<i4'),
+                    ('headMot','<i4'),('sAcc','<u4'),('headAcc','<u4'),('pDOP','<u2'),('flags3','V6'),
+                    ('headVeh','<i4'),('magDec','<i2'),('magAcc','<u2')])
+INS_dtype=np.dtype([('bitfield0','<u4'),('res0','V4'),('iTOW','<u4'),('xAngRate','<i4'),('yAngRate','<i4'),
+                    ('zAngRate','<i4'),('xAccel','<i4'),('yAccel','<i4'),('zAccel','<i4')])
+
+# one navigation epoch: NAV-PVAT, NAV-PVT, ESF-INS
+_msgs_=[('PVAT',0x01,0x17,PVAT_dtype),('PVT',0x01,0x07,PVT_dtype),('INS',0x10,0x15,INS_dtype)]
+epoch_dtype=np.dtype([(name,_frame_dtype(p)) for name,c,i,p in _msgs_])
+
+
+def ubx_checksum(frames):
+    """
+    Set the checksums of UBX frames (structured array of a _frame_dtype), vectorized:
+    CK_A is the byte sum, CK_B the sum weighted with the distance to the end.
+    """
+    b=frames.view(np.uint8).reshape(len(frames),frames.dtype.itemsize)[:,2:-2]
+    w=np.arange(b.shape[1],0,-1,dtype=np.int64)
+    frames['ck'][:,0]=b.sum(axis=1,dtype=np.int64)&0xFF
+    frames['ck'][:,1]=(b.astype(np.int64)@w)&0xFF
+
+
+def ubx_epochs(t):
+    """
+    UBX frames of navigation epochs at times t (s from start)
+
+    return  uint8 array (epochs x bytes per epoch)
+    """
+    n=len(t)
+    s=trajectory(t)
+    week,tow=gps_time(t)
+    iTOW=np.round(tow*1000).astype(np.int64)
+    year,month,day,hour,minute,sec,nano=utc_fields(t)
+    e=np.zeros(n,dtype=epoch_dtype)
+    for name,c,i,p in _msgs_:
+        f=e[name]
+        f['sync']=(0xB5,0x62)
+        f['cls']=c
+        f['id']=i
+        f['len']=p.itemsize
+    for name in ['PVAT','PVT']:
+        p=e[name]['payload']
+        p['iTOW']=iTOW
+        p['year'],p['month'],p['day'],p['hour'],p['min'],p['sec'],p['nano']=year,month,day,hour,minute,sec,nano
+        p['valid']=0x07
+        p['tAcc']=20
+        p['fixType']=3
+        p['flags']=0x01
+        p['numSV']=20
+        p['lon']=np.round(s['lon']*1e7)
+        p['lat']=np.round(s['lat']*1e7)
+        p['height']=np.round(s['height']*1000)
+        p['hMSL']=np.round(s['height']*1000)
+        p['hAcc']=20
+        p['vAcc']=30
+        p['velN']=np.round(s['velN']*1000)
+        p['velE']=np.round(s['velE']*1000)
+        p['velD']=np.round(s['velD']*1000)
+        p['gSpeed']=SPEED*1000
+        p['sAcc']=100
+    p=e['PVAT']['payload']
+    p['vehRoll']=np.round(s['roll']*1e5)
+    p['vehPitch']=np.round(s['pitch']*1e5)
+    p['vehHeading']=np.round(s['heading']*1e5)
+    p['motHeading']=np.round(s['heading']*1e5)
+    p['accRoll']=p['accPitch']=50
+    p['accHeading']=100
+    p=e['PVT']['payload']
+    p['headMot']=p['headVeh']=np.round(s['heading']*1e5)
+    p['headAcc']=100000
+    p['pDOP']=120
+    p=e['INS']['payload']
+    p['bitfield0']=0x01|0x3F<<8
+    p['iTOW']=iTOW
+    p['xAngRate']=np.round(s['rollRate']*1e3)
+    p['yAngRate']=np.round(s['pitchRate']*1e3)
+    p['zAccel']=981
+    for name,c,i,pd in _msgs_:
+        f=np.ascontiguousarray(e[name])
+        ubx_checksum(f)
+        e[name]=f
+    return e.view(np.uint8).reshape(n,epoch_dtype.itemsize)
+
+
+# %% text lines
+
+def _digits(v,n):
+    """
+    n decimal digits of the non negative integers v as ASCII (array len(v) x n)
+    """
+    p=10**np.arange(n-1,-1,-1,dtype=np.int64)
+    return (v[:,None]//p[None,:]%10+48).astype(np.uint8)
+
+
+def laser_lines(h,signQ,T):
+    """
+    Laser data lines 'D hhhh.hhh qq.q  sTT.T' with CRLF, formatted vectorized.
+
+    return  uint8 array (samples x 24)
+    """
+    n=len(h)
+    out=np.full((n,24),ord(' '),dtype=np.uint8)
+    out[:,0]=ord('D')
+    out[:,2:6]=_digits(np.clip(np.round(h*1000),0,9999999).astype(np.int64)//1000,4)
+    out[:,6]=ord('.')
+    out[:,7:10]=_digits(np.clip(np.round(h*1000),0,9999999).astype(np.int64)%1000,3)
+    q=np.clip(np.round(signQ*10),0,999).astype(np.int64)
+    out[:,11:13]=_digits(q//10,2)
+    out[:,13]=ord('.')
+    out[:,14]=_digits(q%10,1)[:,0]
+    out[:,17]=np.where(T<0,ord('-'),ord(' '))
+    a=np.clip(np.round(np.abs(T)*10),0,999).astype(np.int64)
+    out[:,18:20]=_digits(a//10,2)
+    out[:,20]=ord('.')
+    out[:,21]=_digits(a%10,1)[:,0]
+    out[:,22:24]=(13,10)
+    return out
+
+
+def laser_signal(t,rng,spikes=0.):
+    """
+    Laser range, signal quality and temperature at true times t. A fraction spikes of the
+    samples is replaced by random ranges.
+    """
+    h=trajectory(t)['range']+rng.normal(0,0.005,len(t))
+    if spikes>0:
+        k=rng.random(len(t))<spikes
+        h[k]=rng.uniform(0,200,k.sum())
+    signQ=17+rng.normal(0,0.5,len(t))
+    T=20-15*np.minimum(t/3600,1)+rng.normal(0,0.2,len(t))
+    return h,signQ,T
+
+
+def nmea_lines(bodies):
+    """
+    NMEA sentences from bodies (text between $ and *), checksums computed vectorized.
+    """
+    if len(bodies)==0:
+        return []
+    b=np.frombuffer(''.join(bodies).encode('ascii'),dtype=np.uint8)
+    lens=np.fromiter(map(len,bodies),dtype=np.int64,count=len(bodies))
+    starts=np.concatenate(([0],np.cumsum(lens)[:-1]))
+    c=np.bitwise_xor.reduceat(b,starts)
+    return np.char.add(np.char.add('$',np.asarray(bodies)),np.char.mod('*%02X\r\n',c)).tolist()
+
+
+_conversion_=re.compile(r'%[-+ 0#]*\d*(?:\.\d+)?[diouxXeEfFgG]')
+
+
+def _fmt(fmt,*cols):
+    """
+    Lines fmt % row for the rows of the columns cols, formatted column by column (np.char).
+    """
+    text=_conversion_.split(fmt)
+    out=np.full(len(cols[0]),text[0])
+    for spec,c,t in zip(_conversion_.findall(fmt),cols,text[1:]):
+        out=np.char.add(out,np.char.add(np.char.mod(spec,np.asarray(c)),t))
+    return out.tolist()
+
+
+# %% files
+
+def write_ubx_laser(file,duration=60,laser_rate=5,nav_rate=10,laser_delay=0.,laser_drift=0.,
+                    spikes=0.,split_frames=True,chunk=3600,size=0,seed=0):
+    """
+    UBX file with NAV-PVAT, NAV-PVT and ESF-INS at nav_rate and a laser block every second.
+
+    laser_delay:    delay of the laser time stamps (s), recovered by UBX2data.align_laser
+    laser_drift:    relative deviation of the laser rate from laser_rate
+    spikes:         fraction of laser samples with random range
+    split_frames:   laser blocks are written in the middle of UBX frames (as the logger does)
+    chunk:          seconds generated at once
+    size:           stop after size bytes instead of duration
+
+    return  number of UBX messages, number of laser samples
+    """
+    rng=np.random.default_rng(seed)
+    n_ubx=n_laser=0
+    written=0
+    if size>0:
+        duration=np.inf
+    dl=1/(laser_rate*(1+laser_drift))
+    with open(file,'wb') as f:
+        c=0
+        while c<duration and (size==0 or written<size):
+            c1=min(c+chunk,duration)
+            sec=np.arange(c,np.ceil(c1))
+            t=np.arange(int(round(c*nav_rate)),int(round(c1*nav_rate)))/nav_rate
+            E=ubx_epochs(t)
+            n_ubx+=3*len(t)
+
+            # true laser times in this chunk, one block per second
+            k=np.arange(int(np.ceil(c/dl-1e-9)),int(np.ceil(c1/dl-1e-9)))
+            tl=k*dl
+            h,signQ,T=laser_signal(tl,rng,spikes)
+            L=laser_lines(h,signQ,T)
+            blk=np.floor(tl).astype(np.int64)
+            first=np.searchsorted(blk,sec.astype(np.int64))
+            last=np.searchsorted(blk,sec.astype(np.int64),side='right')
+            n_laser+=len(tl)
+
+            # position of the laser blocks in the GNSS bytes: end of each second
+            ebytes=E.shape[1]
+            G=E.reshape(-1)
+            pos=np.searchsorted(t,sec+1-1e-9)*ebytes
+            if split_frames:
+                pos=np.maximum(pos-rng.integers(0,ebytes,len(pos)),0)
+            week,tow=gps_time(tl)
+            parts=[]
+            p0=0
+            for s,a,b,p in zip(sec,first.tolist(),last.tolist(),pos.tolist()):
+                parts.append(G[p0:p].tobytes())
+                p0=p
+                if b>a:
+                    # read_Laser assigns iTOW-(J-2-j)/rate to sample j of J
+                    iTOW=int(round((tow[a]+laser_delay)*1000+(b-a-2)*1000/laser_rate))
+                    parts.append(b' \r\n# iTOW %d\r\n'%iTOW+L[a:b].tobytes()+b'# end %d\r\n'%iTOW)
+            parts.append(G[p0:].tobytes())
+            data=b''.join(parts)
+            f.write(data)
+            written+=len(data)
+            c=c1
+    return n_ubx,n_laser
+
+
+def write_nmea_laser(file,duration=60,laser_rate=5,pins1_rate=100,pins2_rate=10,strobe='timer',
+                     strobe_interval=5.,laser_phase=0.0037,laser_drift=0.,latency=0.002,spikes=0.,
+                     chunk=600,size=0,seed=0):
+    """
+    IMX5 log file with $PINS1 at pins1_rate, $PINS2 at pins2_rate, laser D lines at laser_rate
+    and strobe events $PSTRB.
+
+    strobe:         'timer': strobe on pin 2 every strobe_interval (s), independent of the laser,
+                    as sent by the logger (IMX5/Log_IMX5_LDS70A, STROBE_intervall).
+                    'laser': strobe on pin 8 at the true time of every laser sample, the $PSTRB
+                    follows its D line (strobe input wired to the laser trigger).
+                    None: no strobes.
+    strobe_interval: period of the timer strobes (s)
+    laser_phase:    time of the first laser sample (s)
+    laser_drift:    relative deviation of the laser rate from laser_rate
+    latency:        delay of the D line in the file after the laser sample (s)
+    spikes:         fraction of laser samples with random range
+    chunk:          seconds generated at once
+    size:           stop after size bytes instead of duration
+
+    return  number of NMEA messages, number of laser samples
+    """
+    rng=np.random.default_rng(seed)
+    n_nmea=n_laser=0
+    written=0
+    if size>0:
+        duration=np.inf
+    dl=1/(laser_rate*(1+laser_drift))
+    with open(file,'wb') as f:
+        head='#LASSITOS INS and Laser altimeter log file\r\n# Date: {:s}\r\n#\r\n'.format(str(START)[:10])
+        f.write(head.encode())
+        written+=len(head)
+        c=0
+        while c<duration and (size==0 or written<size):
+            c1=min(c+chunk,duration)
+            t1=np.arange(int(np.ceil(c*pins1_rate-1e-9)),int(np.ceil(c1*pins1_rate-1e-9)))/pins1_rate
+            t2=np.arange(int(np.ceil(c*pins2_rate-1e-9)),int(np.ceil(c1*pins2_rate-1e-9)))/pins2_rate
+            k=np.arange(max(int(np.ceil((c-laser_phase)/dl-1e-9)),0),max(int(np.ceil((c1-laser_phase)/dl-1e-9)),0))
+            tl=laser_phase+k*dl
+
+            s=trajectory(t1)
+            week,tow=gps_time(t1)
+            lines=nmea_lines(_fmt('PINS1,%.3f,%d,%d,%d,%.4f,%.4f,%.4f,%.3f,%.3f,%.3f,%.8f,%.8f,%.3f,0.000,0.000,0.000',
+                                  tow,week,np.full(len(t1),0x00030077),np.zeros(len(t1),dtype=np.int64),
+                                  np.radians(s['roll']),np.radians(s['pitch']),np.radians(s['heading']),
+                                  s['velN'],s['velE'],s['velD'],s['lat'],s['lon'],s['height']))
+            s=trajectory(t2)
+            week,tow=gps_time(t2)
+            q=np.radians(s['heading'])/2
+            lines+=nmea_lines(_fmt('PINS2,%.3f,%d,%d,%d,%.4f,%.4f,%.4f,%.4f,%.3f,%.3f,%.3f,%.8f,%.8f,%.3f',
+                                   tow,week,np.full(len(t2),0x00030077),np.zeros(len(t2),dtype=np.int64),
+                                   np.cos(q),np.zeros(len(t2)),np.zeros(len(t2)),np.sin(q),
+                                   s['velN'],s['velE'],s['velD'],s['lat'],s['lon'],s['height']))
+            h,signQ,T=laser_signal(tl,rng,spikes)
+            D=laser_lines(h,signQ,T).tobytes().decode('ascii')
+            D=[D[i:i+24] for i in range(0,len(D),24)]
+            if strobe=='laser':
+                week,tow=gps_time(tl)
+                S=nmea_lines(_fmt('PSTRB,%d,%.3f,8,%d',week,tow,k))
+                D=[a+b for a,b in zip(D,S)]
+                n_nmea+=len(tl)
+            lines+=D
+            ts=np.zeros(0)
+            if strobe=='timer':
+                # logger clock (millis) with 50 ppm deviation from GPS time, first strobe at 0.5 s
+                ds=strobe_interval*1.00005
+                ks=np.arange(max(int(np.ceil((c-0.5)/ds-1e-9)),0),max(int(np.ceil((c1-0.5)/ds-1e-9)),0))
+                ts=0.5+ks*ds
+                week,tow=gps_time(ts)
+                lines+=nmea_lines(_fmt('PSTRB,%d,%.3f,2,%d',week,tow,ks))
+                n_nmea+=len(ts)
+            n_nmea+=len(t1)+len(t2)
+            n_laser+=len(tl)
+
+            # file order: time of arrival, PINS before laser and strobes at equal time
+            ta=np.concatenate((t1,t2,tl+latency,ts+latency))
+            kind=np.concatenate((np.zeros(len(t1)),np.ones(len(t2)),np.full(len(tl),2),np.full(len(ts),3)))
+            order=np.lexsort((kind,ta))
+            data=''.join(np.array(lines,dtype=object)[order]).encode('ascii')
+            f.write(data)
+            written+=len(data)
+            c=c1
+    return n_nmea,n_laser
+
+
+def _parse_args(func,kwargs):
+    """
+    Convert command line values to the type of the default of each argument of func.
+    """
+    out={}
+    for k,v in kwargs.items():
+        d=inspect.signature(func).parameters[k].default
+        if isinstance(d,bool):
+            out[k]=v.lower() in ('1','true','yes')
+        elif isinstance(d,int):
+            out[k]=int(float(v))
+        elif isinstance(d,float):
+            out[k]=float(v)
+        else:
+            out[k]=None if v=='None' else v
+    return out
+
+
+if __name__ == "__main__":
+    kwargs = dict(arg.split('=') for arg in sys.argv[1:] if '=' in arg)
+    file=kwargs.pop('file')
+    func=write_ubx_laser if file.endswith('.ubx') else write_nmea_laser
+    print(func(file,**_parse_args(func,kwargs)))
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Boresight calibration of the laser: mounting angles pitch0, roll0, the lever arm
+distCenter and the attitude scale factors c_pitch, c_roll.
+
+The corrected range of corr_h_laser (UBX2data, INSLASERdata)
+
+    h_corr = h*cos(P)*cos(R) - distCenter*sin(P),   P=c_pitch*(pitch-pitch0), R=c_roll*(roll-roll0)
+
+gives the surface elevation height-h_corr. The parameters are solved by
+Gauss-Newton least squares over all laser shots, with analytic derivatives and
+robust rejection of outliers:
+    'flat':         shots over flat ground (e.g. roll and pitch maneuvers over sea ice
+                    or a runway) lie on a plane per session
+    'crossover':    the elevation of both passes at track crossings is equal (see crossover.py)
+Over flat ground pitch0 and distCenter are only separated by changes of the
+flight altitude, so distCenter is not fitted by default in flat mode. Solutions
+with strongly correlated parameters (|corr|>max_corr) or a large std are
+reported as not converged.
+
+Angles are in the units of the loader: degree for UBX2data (PVAT), radian for
+INSLASERdata (PINS1). The result params can be passed to the loaders or to
+set_calibration, which re-evaluates h_corr without reading the file again.
+
+    res=calibrate(data.subset(timelim=[t0,t1]),fit=('pitch0','roll0'))
+    if res['converged']:
+        data.set_calibration(**res['params'])
+"""
+
+import numpy as np
+
+import georef
+
+PARAMS=['pitch0','roll0','distCenter','c_pitch','c_roll']
+
+# parameters fitted by default per mode
+FIT={'flat':('pitch0','roll0'),'crossover':('pitch0','roll0','distCenter')}
+
+# largest std of a determined parameter: angles in degree, distCenter in m
+MAX_STD={'pitch0':1.,'roll0':1.,'distCenter':1.,'c_pitch':0.1,'c_roll':0.1}
+
+# navigation message: pitch, roll, angle unit (rad)
+_att_={'PVAT':('vehPitch','vehRoll',np.pi/180),'PINS1':('pitch','roll',1.)}
+
+
+def correct_height(h,pitch,roll,pitch0=0,roll0=0,distCenter=0,c_pitch=1,c_roll=1,unit=np.pi/180):
+    """
+    Corrected laser range (see corr_h_laser). All inputs broadcast, e.g. parameters of shape (k,1)
+    and shots of shape (n,) give (k,n).
+
+    unit:   angle unit in rad (pi/180: degree)
+    """
+    P=c_pitch*(pitch-pitch0)*unit
+    R=c_roll*(roll-roll0)*unit
+    return h*np.cos(P)*np.cos(R)-distCenter*np.sin(P)
+
+
+def param_axes(obj,**kwargs):
+    """
+    Calibration parameters for correct_height: the values of kwargs that are not None, the others
+    from obj (e.g. data.Laser). Arrays get a trailing axis for the laser samples.
+    """
+    p={}
+    for k,v in kwargs.items():
+        v=np.asarray(getattr(obj,k) if v is None else v,dtype=np.float64)
+        p[k]=v[...,np.newaxis] if v.ndim>0 else v
+    return p
+
+
+def param_grid(**values):
+    """
+    Grid of all combinations of parameter values, e.g.
+        g=param_grid(pitch0=np.linspace(-2,2,41),roll0=np.linspace(-2,2,41))
+        h=data.h_laser(**g)     # shape (41,41,number of laser samples)
+
+    return  dict name: array with one axis per parameter
+    """
+    return dict(zip(values.keys(),np.meshgrid(*[np.asarray(v,dtype=np.float64) for v in values.values()],
+                                              indexing='ij')))
+
+
+def _jacobian(h,pitch,roll,p,unit):
+    """
+    Derivatives of correct_height to the parameters, dict name: array
+    """
+    P=p['c_pitch']*(pitch-p['pitch0'])*unit
+    R=p['c_roll']*(roll-p['roll0'])*unit
+    dP=(-h*np.sin(P)*np.cos(R)-p['distCenter']*np.cos(P))*unit
+    dR=-h*np.cos(P)*np.sin(R)*unit
+    return {'pitch0':-p['c_pitch']*dP,'roll0':-p['c_roll']*dR,'distCenter':-np.sin(P),
+            'c_pitch':(pitch-p['pitch0'])*dP,'c_roll':(roll-p['roll0'])*dR}
+
+
+def params(data):
+    """
+    Current calibration of data (UBX2data: stored in Laser, INSLASERdata: in data)
+    """
+    return {k:float(getattr(data.Laser,k,getattr(data,k,1 if k[:2]=='c_' else 0))) for k in PARAMS}
+
+
+def shots(data,MSG=None):
+    """
+    Laser shots with range and uncorrected attitude for calibration. Run corr_h_laser first.
+
+    return  dict of arrays: t (ns), x, y, height (m), h (laser range, m), pitch, roll; and unit, MSG
+    """
+    MSG,nav=georef.nav_message(data,MSG)
+    if MSG not in _att_:
+        raise ValueError('no attitude in message '+MSG)
+    p=georef.laser_points(data,MSG)
+    name_p,name_r,unit=_att_[MSG]
+    tn=(nav.t-nav.t[0]).astype(np.float64)
+    tl=(p['t']-nav.t[0]).astype(np.float64)
+    return {'t':p['t'],'x':p['x'],'y':p['y'],'height':p['height'],
+            'h':getattr(data.Laser,'h_filt',data.Laser.h)[p['index']],
+            'pitch':np.interp(tl,tn,getattr(nav,name_p)),'roll':np.interp(tl,tn,getattr(nav,name_r)),
+            'unit':unit,'MSG':MSG}
+
+
+def _nearest(t,tq):
+    k=np.clip(np.searchsorted(t,tq),1,max(len(t)-1,1))
+    return np.where(np.abs(t[k-1]-tq)<np.abs(t[np.minimum(k,len(t)-1)]-tq),k-1,np.minimum(k,len(t)-1))
+
+
+def calibrate(datalist,fit=None,mode='flat',plane=True,MSG=None,init=None,
+              min_angle=30,max_dt=0.2,niter=20,nsigma=4,tol=1e-9,max_corr=0.99,max_std=None,verbose=True):
+    """
+    Solve calibration parameters by least squares.
+
+    datalist:   UBX2data or INSLASERdata (list), e.g. subsets with calibration maneuvers
+    fit:        parameters to solve (see PARAMS), the others are kept. Default: FIT[mode]
+    mode:       'flat' or 'crossover' (see above)
+    plane:      flat: fit a plane per session, otherwise a constant elevation
+    MSG:        navigation message with attitude (see georef.nav_message)
+    init:       start values (dict). Default: current calibration of the first session.
+                c_pitch, c_roll of 0 (no attitude correction, default of UBX2data) are set to 1
+                if pitch0, roll0 are fitted.
+    min_angle:  crossover: minimum crossing angle (degree)
+    max_dt:     crossover: maximum time from the crossing to the nearest laser shot (s)
+    niter:      maximum Gauss-Newton iterations
+    nsigma:     residuals larger than nsigma*MAD are rejected
+    max_corr:   the solution is not converged if two parameters correlate stronger
+    max_std:    largest std per parameter (dict, angles in degree), else not converged.
+                Default: MAX_STD
+
+    return  dict: params (calibration for the loaders), std and corr (correlation matrix) of the
+            fitted parameters, rms (m, residuals of the used shots), n (used), n_total, residuals,
+            iterations, converged (also False if the parameters are not separable, see max_corr
+            and max_std)
+    
+    Raises ValueError if there are fewer observations than unknowns.
+    """
+    if not isinstance(datalist,(list,tuple)):
+        datalist=[datalist]
+    fit=list(FIT.get(mode,()) if fit is None else fit)
+    if any(k not in PARAMS for k in fit):
+        raise ValueError('parameters to fit must be in '+str(PARAMS))
+    p=params(datalist[0])
+    p.update(init or {})
+    for k in ['pitch','roll']:
+        if k+'0' in fit and p['c_'+k]==0:
+            p['c_'+k]=1.
+
+    S=[shots(d,MSG) for d in datalist]
+    unit=S[0]['unit']
+    if unit==1. and any(k in fit for k in ['c_pitch','c_roll']):
+        raise ValueError('INSLASERdata does not apply c_pitch and c_roll')
+    cat={k:np.concatenate([s[k] for s in S]) for k in ['x','y','height','h','pitch','roll','t']}
+    sess=np.concatenate([np.full(len(s['t']),i) for i,s in enumerate(S)])
+
+    if mode=='flat':
+        # design of the surface: constant (and slopes) per session
+        cols=[]
+        for i,s in enumerate(S):
+            if len(s['t'])==0:
+                continue
+            m=(sess==i).astype(np.float64)
+            cols.append(m)
+            if plane:
+                cols.append(m*(cat['x']-s['x'].mean()))
+                cols.append(m*(cat['y']-s['y'].mean()))
+        A_surf=np.column_stack(cols) if cols else np.zeros((len(sess),0))
+        idx1=idx2=None
+    elif mode=='crossover':
+        import crossover
+        c=crossover.crossovers(datalist,MSG,max_dt=max_dt)
+        ok=np.isfinite(c['dz'])&(c['angle']>=min_angle)
+        off=np.cumsum([0]+[len(s['t']) for s in S])
+        idx=[]
+        for k in [1,2]:
+            s_k,t_k=c['session%d'%k][ok],c['t%d'%k][ok]
+            i=np.zeros(len(t_k),dtype=np.int64)
+            for j,s in enumerate(S):
+                m=s_k==j
+                i[m]=off[j]+_nearest(s['t'],t_k[m])
+            idx.append(i)
+        idx1,idx2=idx
+        near=(np.abs(cat['t'][idx1]-c['t1'][ok])<=max_dt*1e9)&(np.abs(cat['t'][idx2]-c['t2'][ok])<=max_dt*1e9)
+        idx1,idx2=idx1[near],idx2[near]
+        A_surf=np.zeros((len(idx1),0))
+    else:
+        raise ValueError('mode must be flat or crossover')
+
+    n=len(A_surf)
+    nunk=len(fit)+A_surf.shape[1]
+    if n<nunk:
+        raise ValueError('{:d} observations for {:d} unknowns'.format(n,nunk))
+    use=np.ones(n,dtype=bool)
+    x=np.zeros(A_surf.shape[1])
+    converged=False
+    for it in range(niter):
+        hc=correct_height(cat['h'],cat['pitch'],cat['roll'],unit=unit,**p)
+        J=_jacobian(cat['h'],cat['pitch'],cat['roll'],p,unit)
+        z=cat['height']-hc
+        if mode=='flat':
+            r=z-A_surf@x
+            A=np.column_stack([-J[k] for k in fit]+[-A_surf])
+        else:
+            r=z[idx1]-z[idx2]
+            A=np.column_stack([-(J[k][idx1]-J[k][idx2]) for k in fit])
+        # robust rejection
+        med=np.median(r[use])
+        mad=1.4826*np.median(np.abs(r[use]-med))
+        use=np.abs(r-med)<=nsigma*max(mad,1e-3)
+        if use.sum()<nunk:
+            raise ValueError('{:d} observations left after rejection for {:d} unknowns'.format(int(use.sum()),nunk))
+        dx=np.linalg.lstsq(A[use],-r[use],rcond=None)[0]
+        for k,d in zip(fit,dx):
+            p[k]+=d
+        x+=dx[len(fit):]
+        if np.all(np.abs(dx[:len(fit)])<tol*np.maximum(1,np.abs([p[k] for k in fit]))):
+            converged=True
+            break
+
+    hc=correct_height(cat['h'],cat['pitch'],cat['roll'],unit=unit,**p)
+    z=cat['height']-hc
+    r=z-A_surf@x if mode=='flat' else z[idx1]-z[idx2]
+    rms=float(np.sqrt(np.mean(r[use]**2))) if use.any() else np.nan
+    dof=max(int(use.sum())-A.shape[1],1)
+    try:
+        cov=np.linalg.inv(A[use].T@A[use])*np.sum(r[use]**2)/dof
+        sd=np.sqrt(np.diag(cov)[:len(fit)])
+        corr=cov[:len(fit),:len(fit)]/np.outer(sd,sd)
+    except np.linalg.LinAlgError:
+        sd=np.full(len(fit),np.nan)
+        corr=np.full((len(fit),len(fit)),np.nan)
+    # degenerate: correlated or undetermined parameters
+    lim=dict(MAX_STD,**(max_std or {}))
+    lim=np.array([lim[k]*np.pi/180/unit if k in ['pitch0','roll0'] else lim[k] for k in fit])
+    off=np.abs(corr[~np.eye(len(fit),dtype=bool)])
+    if np.any(~np.isfinite(sd)) or np.any(sd>lim) or np.any(~(off<=max_corr)):
+        converged=False
+    out={'params':{k:float(p[k]) for k in (PARAMS if unit!=1. else PARAMS[:3])},
+         'std':{k:float(v) for k,v in zip(fit,sd)},'corr':corr,'rms':rms,
+         'n':int(use.sum()),'n_total':n,'residuals':r,'iterations':it+1,'converged':converged}
+    if verbose:
+        print('Boresight calibration ({:s}): {:d} of {:d} used, rms {:.3f} m{:s}'.format(
+            mode,out['n'],n,rms,'' if converged else ', not converged'))
+        for k in fit:
+            print('  {:10s} {:12.6f} +- {:.6f}'.format(k,p[k],out['std'][k]))
+    return out
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Crossover analysis of the laser surface elevation between flight lines.
+
+The tracks of the navigation solution (PVAT or PINS1, projected to UTM, see
+georef.py) of one or more sessions are resampled by distance and cut into
+segments. The segments are indexed in a uniform grid of cells; only segments
+sharing a cell are tested for intersection, so finding all crossings takes
+O(n log n) (sorting by cell) instead of O(n^2). At each crossing the surface
+elevation of both passes is interpolated from the laser shots. The differences
+are a quality measure of the laser/INS calibration (pitch0, roll0, distCenter).
+
+    c=crossovers([data1,data2])
+    print(summary(c))
+"""
+
+import numpy as np
+
+import georef
+
+
+def tracks(datalist,MSG=None,max_gap=1.,min_length=1.):
+    """
+    Track segments of the navigation data of all sessions, projected to the UTM zone of the first.
+
+    max_gap:    segments longer than max_gap (s) are gaps and dropped
+    min_length: the track is resampled by distance: only the first and last epoch of every
+                min_length (m) of the flown distance are kept. A stationary aircraft gives one
+                segment instead of one per epoch.
+
+    return  dict of arrays per segment: session, t0, t1 (ns), x0, y0, x1, y1 (m); and zone, north
+    """
+    seg={k:[] for k in ['session','t0','t1','x0','y0','x1','y1']}
+    zone=north=None
+    for s,d in enumerate(datalist):
+        nav=georef.nav_message(d,MSG)[1]
+        x,y,zone,north=georef.ll2utm(nav.lat,nav.lon,zone,north)
+        ok=np.isfinite(x)&np.isfinite(y)
+        t,x,y=nav.t[ok],x[ok],y[ok]
+        if len(t)<2:
+            continue
+        gap=(np.diff(t)<=0)|(np.diff(t)>max_gap*1e9)
+        dist=np.concatenate(([0],np.cumsum(np.hypot(np.diff(x),np.diff(y)))))
+        b=np.floor(dist/min_length) if min_length>0 else np.arange(len(t))
+        new=np.concatenate(([True],b[1:]!=b[:-1]))
+        keep=new|np.concatenate((new[1:],[True]))
+        keep|=np.concatenate((gap,[False]))|np.concatenate(([False],gap))
+        i=np.flatnonzero(keep)
+        g=np.concatenate(([0],np.cumsum(gap)))
+        k=(g[i[1:]]==g[i[:-1]])&((x[i[1:]]!=x[i[:-1]])|(y[i[1:]]!=y[i[:-1]]))
+        i0,i1=i[:-1][k],i[1:][k]
+        seg['session'].append(np.full(len(i0),s))
+        seg['t0'].append(t[i0])
+        seg['t1'].append(t[i1])
+        seg['x0'].append(x[i0])
+        seg['y0'].append(y[i0])
+        seg['x1'].append(x[i1])
+        seg['y1'].append(y[i1])
+    seg={k:np.concatenate(v) if v else np.zeros(0) for k,v in seg.items()}
+    seg['session']=seg['session'].astype(np.int64)
+    for k in ['t0','t1']:
+        seg[k]=seg[k].astype(np.int64)
+    seg['zone']=zone
+    seg['north']=north
+    return seg
+
+
+def _cell_pairs(seg,cell,max_pairs=5*10**7):
+    """
+    Pairs of segments (i<j) with overlapping cells of the grid index.
+    Raises ValueError if there are more than max_pairs candidate pairs (memory).
+    """
+    cx0=np.floor(np.minimum(seg['x0'],seg['x1'])/cell).astype(np.int64)
+    cx1=np.floor(np.maximum(seg['x0'],seg['x1'])/cell).astype(np.int64)
+    cy0=np.floor(np.minimum(seg['y0'],seg['y1'])/cell).astype(np.int64)
+    cy1=np.floor(np.maximum(seg['y0'],seg['y1'])/cell).astype(np.int64)
+    nx=cx1-cx0+1
+    n=nx*(cy1-cy0+1)
+
+    # one entry per segment and cell of its bounding box
+    sid=np.repeat(np.arange(len(n)),n)
+    k=np.arange(n.sum())-np.repeat(np.cumsum(n)-n,n)
+    cx=cx0[sid]+k%nx[sid]
+    cy=cy0[sid]+k//nx[sid]
+    key=(cx-cx.min())*(cy.max()-cy.min()+1)+(cy-cy.min())
+    order=np.lexsort((sid,key))
+    key,sid=key[order],sid[order]
+
+    # all pairs within each cell
+    start=np.flatnonzero(np.r_[True,key[1:]!=key[:-1]])
+    size=np.diff(np.r_[start,len(key)])
+    npairs=int(np.sum(size*(size-1)//2))
+    if npairs>max_pairs:
+        raise ValueError('{:d} segment pairs in {:d} cells (max. {:d}), at most {:d} segments in a cell. '
+                         'Use a smaller cell or a larger min_length.'.format(npairs,len(size),max_pairs,size.max()))
+    end=np.repeat(start+size,size)
+    after=end-np.arange(len(key))-1
+    first=np.repeat(np.arange(len(key)),after)
+    second=first+1+np.arange(after.sum())-np.repeat(np.cumsum(after)-after,after)
+    i,j=sid[first],sid[second]
+    pair=np.unique(i*len(n)+j)
+    return pair//len(n),pair%len(n)
+
+
+def _interp_laser(p,t,max_dt):
+    """
+    Surface elevation of laser shots p (see georef.laser_points) at times t.
+    NaN if there is no shot within max_dt (s) on both sides.
+    """
+    if len(p['t'])<2:
+        return np.full(len(t),np.nan)
+    k=np.clip(np.searchsorted(p['t'],t),1,len(p['t'])-1)
+    t0,t1=p['t'][k-1],p['t'][k]
+    w=((t-t0)/(t1-t0)).astype(np.float64)
+    z=p['z'][k-1]+w*(p['z'][k]-p['z'][k-1])
+    ok=(t>=t0)&(t<=t1)&(t-t0<=max_dt*1e9)&(t1-t<=max_dt*1e9)
+    return np.where(ok,z,np.nan)
+
+
+def crossovers(datalist,MSG=None,cell=50.,min_dt=30.,max_gap=1.,max_dt=0.5,min_length=1.,max_pairs=5*10**7):
+    """
+    Crossings of the tracks of one or more sessions and the laser surface elevation of both passes.
+
+    datalist:   UBX2data or INSLASERdata (list). Run corr_h_laser first.
+    MSG:        navigation message of the tracks (see georef.nav_message)
+    cell:       cell size of the grid index (m)
+    min_dt:     minimum time between two passes of the same session (s)
+    max_gap:    maximum time step of a track segment (s)
+    max_dt:     maximum time from the crossing to the nearest laser shots (s)
+    min_length: distance of the resampled track (m, see tracks)
+    max_pairs:  maximum number of candidate segment pairs (see _cell_pairs)
+
+    return  dict of arrays per crossing: x, y (UTM, m), session1, session2, t1, t2 (ns),
+            z1, z2 (surface elevation, m), dz=z1-z2, angle (crossing angle 0-90, degree),
+            roll1, roll2, pitch1, pitch2 (degree); and zone, north
+    """
+    if not isinstance(datalist,(list,tuple)):
+        datalist=[datalist]
+    seg=tracks(datalist,MSG,max_gap,min_length)
+    i,j=_cell_pairs(seg,cell,max_pairs)
+
+    # intersection of segments i and j: p+a*r = q+b*s
+    rx,ry=seg['x1'][i]-seg['x0'][i],seg['y1'][i]-seg['y0'][i]
+    sx,sy=seg['x1'][j]-seg['x0'][j],seg['y1'][j]-seg['y0'][j]
+    qx,qy=seg['x0'][j]-seg['x0'][i],seg['y0'][j]-seg['y0'][i]
+    den=rx*sy-ry*sx
+    with np.errstate(invalid='ignore',divide='ignore'):
+        a=(qx*sy-qy*sx)/den
+        b=(qx*ry-qy*rx)/den
+    hit=(den!=0)&(a>=0)&(a<1)&(b>=0)&(b<1)
+    i,j,a,b=i[hit],j[hit],a[hit],b[hit]
+
+    t1=seg['t0'][i]+np.round(a*(seg['t1'][i]-seg['t0'][i])).astype(np.int64)
+    t2=seg['t0'][j]+np.round(b*(seg['t1'][j]-seg['t0'][j])).astype(np.int64)
+    s1,s2=seg['session'][i],seg['session'][j]
+    keep=(s1!=s2)|(np.abs(t2-t1)>=min_dt*1e9)
+    i,j,a,t1,t2,s1,s2=i[keep],j[keep],a[keep],t1[keep],t2[keep],s1[keep],s2[keep]
+
+    out={'x':seg['x0'][i]+a*(seg['x1'][i]-seg['x0'][i]),
+         'y':seg['y0'][i]+a*(seg['y1'][i]-seg['y0'][i]),
+         'session1':s1,'session2':s2,'t1':t1,'t2':t2}
+    for c in ['z','roll','pitch']:
+        out[c+'1']=np.full(len(i),np.nan)
+        out[c+'2']=np.full(len(i),np.nan)
+    for s,d in enumerate(datalist):
+        p=georef.laser_points(d,MSG,zone=seg['zone'],north=seg['north'])
+        for k,(ss,tt) in enumerate([(s1,t1),(s2,t2)],1):
+            m=ss==s
+            out['z%d'%k][m]=_interp_laser(p,tt[m],max_dt)
+            n=np.clip(np.searchsorted(p['t'],tt[m]),0,max(len(p['t'])-1,0))
+            if len(p['t'])>0:
+                out['roll%d'%k][m]=p['roll'][n]
+                out['pitch%d'%k][m]=p['pitch'][n]
+    out['dz']=out['z1']-out['z2']
+    h1=np.arctan2(seg['y1'][i]-seg['y0'][i],seg['x1'][i]-seg['x0'][i])
+    h2=np.arctan2(seg['y1'][j]-seg['y0'][j],seg['x1'][j]-seg['x0'][j])
+    angle=np.degrees(np.abs(np.angle(np.exp(1j*(h1-h2)))))
+    out['angle']=np.minimum(angle,180-angle)
+    out['zone']=seg['zone']
+    out['north']=seg['north']
+    return out
+
+
+def summary(c,min_angle=0):
+    """
+    Statistics of the crossover differences dz with a crossing angle of at least min_angle (degree).
+
+    return  dict: n, mean, std, rms, median, mad (m)
+    """
+    dz=c['dz'][np.isfinite(c['dz'])&(c['angle']>=min_angle)]
+    if len(dz)==0:
+        return {'n':0,'mean':np.nan,'std':np.nan,'rms':np.nan,'median':np.nan,'mad':np.nan}
+    med=float(np.median(dz))
+    return {'n':len(dz),'mean':float(dz.mean()),'std':float(dz.std()),'rms':float(np.sqrt(np.mean(dz**2))),
+            'median':med,'mad':float(1.4826*np.median(np.abs(dz-med)))}
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Gridded surface (DEM) from georeferenced laser shots.
+
+The points of one or more sessions (see georef.laser_points) are binned into a
+regular grid in UTM coordinates (east, north). Count, mean and standard deviation
+of each cell are accumulated with np.bincount, the median from the points sorted
+by cell. The raster is processed in tiles of tile x tile cells, so the temporary
+memory is bounded by the tile size and not by the number of points. Empty cells
+can be filled by inverse distance weighting (IDW) with a KD-tree (scipy).
+
+    dem=DEM.from_data([data1,data2],res=1)
+    dem.idw(max_dist=5)
+    dem.write_ascii('dem.asc')
+"""
+
+import numpy as np
+
+import georef
+
+
+def points(datalist,MSG=None,zone=None,north=None):
+    """
+    Georeferenced laser shots of all sessions in datalist, projected to the UTM zone
+    of the first session.
+
+    return  x, y, z (m), zone, north
+    """
+    if not isinstance(datalist,(list,tuple)):
+        datalist=[datalist]
+    x,y,z=[],[],[]
+    for d in datalist:
+        p=georef.laser_points(d,MSG,zone=zone,north=north)
+        zone,north=p['zone'],p['north']
+        x.append(p['x'])
+        y.append(p['y'])
+        z.append(p['z'])
+    return np.concatenate(x),np.concatenate(y),np.concatenate(z),zone,north
+
+
+class DEM:
+
+    def __init__(self,x0,y0,res,nx,ny,zone=None,north=True):
+        """
+        x0, y0:     upper left corner of the grid (UTM, m)
+        res:        cell size (m)
+        nx, ny:     number of columns and rows. Row 0 is the northern edge.
+        zone,north: UTM zone and hemisphere
+        """
+        self.x0=x0
+        self.y0=y0
+        self.res=res
+        self.nx=nx
+        self.ny=ny
+        self.zone=zone
+        self.north=north
+        shape=(ny,nx)
+        self.count=np.zeros(shape,dtype=np.int64)
+        self.mean=np.full(shape,np.nan)
+        self.std=np.full(shape,np.nan)
+        self.median=None
+        self.z=self.mean        # surface (mean, median or filled by idw)
+
+    @classmethod
+    def from_points(cls,x,y,z,res=1.,bounds=None,median=False,tile=2048,zone=None,north=True):
+        """
+        Grid points x, y, z.
+
+        res:        cell size (m)
+        bounds:     [xmin, ymin, xmax, ymax] of the grid. Default: extent of the points.
+        median:     also compute the median of each cell (sorts the points of each tile)
+        tile:       tile size (cells)
+        """
+        x=np.asarray(x,dtype=np.float64)
+        y=np.asarray(y,dtype=np.float64)
+        z=np.asarray(z,dtype=np.float64)
+        ok=np.isfinite(x)&np.isfinite(y)&np.isfinite(z)
+        if bounds is None:
+            bounds=[x[ok].min(),y[ok].min(),x[ok].max(),y[ok].max()]
+            bounds=[np.floor(bounds[0]/res)*res,np.floor(bounds[1]/res)*res,
+                    (np.floor(bounds[2]/res)+1)*res,(np.floor(bounds[3]/res)+1)*res]
+        nx=int(np.ceil((bounds[2]-bounds[0])/res))
+        ny=int(np.ceil((bounds[3]-bounds[1])/res))
+        dem=cls(bounds[0],bounds[3],res,nx,ny,zone,north)
+        dem.add(x[ok],y[ok],z[ok],median=median,tile=tile)
+        return dem
+
+    @classmethod
+    def from_data(cls,datalist,res=1.,MSG=None,**kwargs):
+        """
+        Grid the laser shots of one or more sessions (UBX2data, INSLASERdata). Run corr_h_laser first.
+        kwargs: see from_points
+        """
+        x,y,z,zone,north=points(datalist,MSG)
+        return cls.from_points(x,y,z,res=res,zone=zone,north=north,**kwargs)
+
+    def cell(self,x,y):
+        """
+        return  row and column of points x, y (outside of the grid: -1)
+        """
+        col=np.floor((np.asarray(x)-self.x0)/self.res).astype(np.int64)
+        row=np.floor((self.y0-np.asarray(y))/self.res).astype(np.int64)
+        out=(col<0)|(col>=self.nx)|(row<0)|(row>=self.ny)
+        col[out]=-1
+        row[out]=-1
+        return row,col
+
+    def add(self,x,y,z,median=False,tile=2048):
+        """
+        Bin points into the grid, tile by tile. Replaces previous statistics.
+        """
+        row,col=self.cell(x,y)
+        ok=row>=0
+        row,col,z=row[ok],col[ok],z[ok]
+        ntx=-(-self.nx//tile)
+        tid=(row//tile)*ntx+col//tile
+        order=np.argsort(tid,kind='stable')
+        bounds=np.searchsorted(tid[order],np.arange(ntx*-(-self.ny//tile)+1))
+        if median:
+            self.median=np.full((self.ny,self.nx),np.nan)
+
+        for k in range(len(bounds)-1):
+            if bounds[k]==bounds[k+1]:
+                continue
+            i=order[bounds[k]:bounds[k+1]]
+            r0=(k//ntx)*tile
+            c0=(k%ntx)*tile
+            h=min(tile,self.ny-r0)
+            w=min(tile,self.nx-c0)
+            idx=(row[i]-r0)*w+(col[i]-c0)
+            zi=z[i]
+            ref=zi.mean()       # reference for a stable variance
+            n=np.bincount(idx,minlength=h*w)
+            s=np.bincount(idx,zi-ref,minlength=h*w)
+            s2=np.bincount(idx,(zi-ref)**2,minlength=h*w)
+            with np.errstate(invalid='ignore',divide='ignore'):
+                m=s/n
+                var=np.maximum(s2/n-m**2,0)*n/(n-1)
+            win=(slice(r0,r0+h),slice(c0,c0+w))
+            self.count[win]=n.reshape(h,w)
+            self.mean[win]=(m+ref).reshape(h,w)
+            self.std[win]=np.where(n>1,np.sqrt(var),np.nan).reshape(h,w)
+            if median:
+                srt=np.lexsort((zi,idx))
+                zs=zi[srt]
+                start=np.concatenate(([0],np.cumsum(n)[:-1]))
+                c=np.flatnonzero(n)
+                med=np.full(h*w,np.nan)
+                med[c]=(zs[start[c]+(n[c]-1)//2]+zs[start[c]+n[c]//2])/2
+                self.median[win]=med.reshape(h,w)
+        self.z=self.median if median else self.mean
+
+    def idw(self,k=8,power=2,max_dist=None,fill_only=True,tile=2048):
+        """
+        Inverse distance weighting of the cell values (self.z) to the centers of the cells,
+        with a KD-tree of the non-empty cells (needs scipy). Sets self.z to the result.
+
+        k:          number of neighbours
+        power:      power of the inverse distance
+        max_dist:   neighbours further than max_dist (m) are ignored. Default: no limit.
+        fill_only:  only fill empty cells, keep the values of the others
+        """
+        from scipy.spatial import cKDTree
+        z=self.z
+        full=np.isfinite(z)
+        r,c=np.nonzero(full)
+        tree=cKDTree(np.column_stack((c,r))*self.res)
+        vals=z[full]
+        out=z.copy()
+        k=min(k,len(vals))
+        for r0 in range(0,self.ny,tile):
+            for c0 in range(0,self.nx,tile):
+                win=(slice(r0,min(r0+tile,self.ny)),slice(c0,min(c0+tile,self.nx)))
+                rr,cc=np.mgrid[win]
+                q=~full[win] if fill_only else np.ones(rr.shape,dtype=bool)
+                if not q.any():
+                    continue
+                d,i=tree.query(np.column_stack((cc[q],rr[q]))*self.res,k=k,
+                               distance_upper_bound=np.inf if max_dist is None else max_dist)
+                d=d.reshape(len(d),-1)
+                i=i.reshape(len(i),-1)
+                valid=np.isfinite(d)
+                w=np.where(valid,1/np.maximum(d,1e-6*self.res)**power,0)
+                v=np.where(valid,vals[np.minimum(i,len(vals)-1)],0)
+                with np.errstate(invalid='ignore'):
+                    out[win][q]=(w*v).sum(1)/w.sum(1)
+        self.z=out
+        return out
+
+    def xy(self):
+        """
+        return  x and y (UTM, m) of the cell centers (1D)
+        """
+        return self.x0+(np.arange(self.nx)+0.5)*self.res,self.y0-(np.arange(self.ny)+0.5)*self.res
+
+    def transform(self):
+        """
+        return  affine geotransform (GDAL order: x0, res, 0, y0, 0, -res)
+        """
+        return (self.x0,self.res,0.,self.y0,0.,-self.res)
+
+    def extent(self):
+        """
+        return  [xmin, xmax, ymin, ymax], e.g. for imshow
+        """
+        return [self.x0,self.x0+self.nx*self.res,self.y0-self.ny*self.res,self.y0]
+
+    def epsg(self):
+        return georef.epsg_utm(self.zone,self.north) if self.zone is not None else None
+
+    def write_ascii(self,file,z=None,nodata=-9999):
+        """
+        Write z (default: self.z) as ESRI ASCII grid. The CRS is UTM (see epsg).
+        """
+        z=self.z if z is None else z
+        with open(file,'w') as f:
+            f.write('ncols {:d}\nnrows {:d}\nxllcorner {:.3f}\nyllcorner {:.3f}\ncellsize {:g}\nNODATA_value {:g}\n'.format(
+                self.nx,self.ny,self.x0,self.y0-self.ny*self.res,self.res,nodata))
+            np.savetxt(f,np.where(np.isfinite(z),z,nodata),fmt='%.3f')
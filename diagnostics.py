@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostics of the parsers: counters per category and rate-limited messages.
+
+Parse errors in the loops over messages and lines are counted per category
+(e.g. 'decode', 'extract', 'laser', 'nmea'). Only the first messages of each
+category are emitted with logging (logger 'diagnostics', level WARNING), so a
+damaged file loads as fast as a clean one. Every loader instance keeps its own
+Diagnostics as self.diag, reset for each file, and logs a summary of the counts
+at the end of loading. File level functions (read_Laser, MSG_type.extract)
+called without a Diagnostics use a new one per call. Only the line parsers
+(parseNMEA, parseLaser, chksum_nmea) called directly count in the module
+Diagnostics default; call default.reset() between files.
+
+    import logging
+    logging.getLogger('diagnostics').setLevel(logging.ERROR)   # silence parse errors
+"""
+
+import logging
+
+logger=logging.getLogger(__name__)
+
+
+class Diagnostics:
+
+    def __init__(self,limit=5,logger=logger):
+        """
+        limit:      number of messages emitted per category, further ones are only counted
+        logger:     logging.Logger to emit to
+        """
+        self.limit=limit
+        self.logger=logger
+        self.counts={}
+
+    def reset(self):
+        self.counts={}
+
+    def warn(self,category,msg,*args):
+        """
+        Count a problem of category and emit msg % args if the limit is not reached.
+        """
+        n=self.counts.get(category,0)+1
+        self.counts[category]=n
+        if n<=self.limit:
+            self.logger.warning(category+': '+msg,*args)
+            if n==self.limit:
+                self.logger.warning('%s: limit of %d messages reached, further ones are only counted',
+                                    category,self.limit)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """
+        return  text with the count of each category
+        """
+        if not self.counts:
+            return 'no problems'
+        return ', '.join('{:s}: {:d}'.format(c,n) for c,n in sorted(self.counts.items()))
+
+    def log_summary(self,name=''):
+        """
+        Log the counts (WARNING) if there were problems.
+        """
+        if self.counts:
+            self.logger.warning('%s%d problems (%s)',name+': ' if name else '',self.total(),self.summary())
+
+
+# channel of the line parsers called without a Diagnostics
+default=Diagnostics()
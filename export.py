@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Export of parsed data (UBX2data, INSLASERdata) to columnar Parquet files and of the
+georeferenced laser shots to LAS point clouds.
+
+Every message with absolute time t (int64 ns since GPS epoch, see gpstime.py) is
+written as one table, including the ESF-MEAS sensors (MEAS_<sensor>) and the
+laser data with the corrected product (h_filt, valid, h_corr, pitch, roll):
+
+    folder/<message>/<session>.parquet
+
+so the files of a campaign form one dataset per message type. Row groups cover
+row_group seconds each; the min/max statistics of t in every row group allow
+reading time windows without loading whole files (read_parquet).
+
+Numeric columns are handed to Arrow without copying. pyarrow is only imported
+when writing or reading.
+
+write_las writes one point per valid laser shot (UTM coordinates, surface
+elevation, intensity from signQ, GPS time) in LAS 1.2 point format 1. The shots
+are georeferenced (see georef.py) and written in chunks, so the memory does not
+grow with the length of the flight.
+"""
+
+import os
+import re
+import json
+import time
+import struct
+import numpy as np
+
+from gpstime import utc2gps
+import georef
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Parquet export needs pyarrow (pip install pyarrow)')
+    return pa,pq
+
+
+def messages(data):
+    """
+    Messages of data with absolute time t.
+
+    return  dict name: message data
+    """
+    out={}
+    for name,d in data.__dict__.items():
+        if isinstance(getattr(d,'t',None),np.ndarray) and len(d.t)>0:
+            out[name]=d
+        for s in getattr(d,'sensors',[]):
+            m=getattr(d,s,None)
+            if isinstance(getattr(m,'t',None),np.ndarray) and len(m.t)>0:
+                out[name+'_'+s]=m
+    return out
+
+
+def columns(d):
+    """
+    1D array attributes of message data d with one value per time t. Private
+    attributes (names starting with '_', e.g. _payload of pyubx2) are not exported.
+
+    return  dict name: array
+    """
+    n=len(d.t)
+    return {a:v for a,v in d.__dict__.items() if a[:1]!='_'
+            and isinstance(v,np.ndarray) and v.ndim==1 and len(v)==n and v.dtype.kind in 'biufSU'}
+
+
+def attributes(d):
+    """
+    Scalar attributes of message data d (e.g. distCenter, laser_time_offset), stored as metadata.
+    """
+    return {a:v.item() if isinstance(v,np.generic) else v for a,v in d.__dict__.items()
+            if a[:1]!='_' and isinstance(v,(bool,int,float,str,np.generic))}
+
+
+def to_table(d,name='',session=''):
+    """
+    Arrow table of message data d. Numeric columns share the memory of the arrays.
+    """
+    pa,pq=_pyarrow()
+    cols=columns(d)
+    arrays=[pa.array(np.ascontiguousarray(v)) for v in cols.values()]
+    meta={'message':name,'session':session,'time':'t: ns since GPS epoch 1980-01-06',
+          'attributes':json.dumps(attributes(d),default=str)}
+    return pa.Table.from_arrays(arrays,names=list(cols.keys()),metadata=meta)
+
+
+def write_parquet(data,folder,msgs=None,row_group=600,compression='zstd',session=''):
+    """
+    Write all messages of data to folder/<message>/<session>.parquet.
+
+    data:           UBX2data or INSLASERdata
+    folder:         output folder
+    msgs:           names of messages to write. Default: all with time t.
+    row_group:      time span of a row group (s)
+    compression:    Parquet compression codec
+    session:        file name of the session. Default: name of data without extension.
+
+    return  list of written files
+    """
+    pa,pq=_pyarrow()
+    if not session:
+        session=os.path.splitext(os.path.basename(str(getattr(data,'name','data'))))[0]
+        session=re.sub(r'[^\w\-.]','_',session)
+    files=[]
+    for name,d in messages(data).items():
+        if msgs is not None and name not in msgs:
+            continue
+        table=to_table(d,name,session)
+        t=d.t
+        if np.any(np.diff(t)<0):
+            order=np.argsort(t,kind='stable')
+            table=table.take(pa.array(order))
+            t=t[order]
+        edges=t[0]+np.arange(1,int((t[-1]-t[0])//(row_group*10**9))+1,dtype=np.int64)*int(row_group*10**9)
+        bounds=np.concatenate(([0],np.searchsorted(t,edges),[len(t)]))
+        bounds=np.unique(bounds)
+
+        os.makedirs(os.path.join(folder,name),exist_ok=True)
+        file=os.path.join(folder,name,session+'.parquet')
+        with pq.ParquetWriter(file,table.schema,compression=compression) as writer:
+            for a,b in zip(bounds[:-1],bounds[1:]):
+                writer.write_table(table.slice(a,b-a),row_group_size=b-a)
+        files.append(file)
+    return files
+
+
+def read_parquet(folder,msg,timelim=None,timeformat='gps',columns=None):
+    """
+    Read a message of all sessions in folder. Only row groups overlapping timelim are read.
+
+    folder:     folder written by write_parquet
+    msg:        message name (e.g. 'PVAT', 'Laser', 'PINS1')
+    timelim:    [start, stop] of time t. Default: all data.
+    timeformat: 'gps': ns since GPS epoch, 'utc': datetime64 in UTC
+    columns:    columns to read. Default: all.
+
+    return  dict column: array, sorted by t
+    """
+    pa,pq=_pyarrow()
+    import pyarrow.dataset as ds
+    dataset=ds.dataset(os.path.join(folder,msg),format='parquet')
+    filt=None
+    if timelim is not None:
+        if timeformat=='utc':
+            timelim=utc2gps(timelim)
+        elif timeformat!='gps':
+            raise ValueError('timeformat not valid: '+str(timeformat))
+        t0,t1=np.asarray(timelim,dtype=np.int64)
+        filt=(ds.field('t')>=int(t0))&(ds.field('t')<=int(t1))
+    if columns is not None and 't' not in columns:
+        columns=list(columns)+['t']
+    table=dataset.to_table(columns=columns,filter=filt)
+    out={c:table.column(c).to_numpy() for c in table.column_names}
+    order=np.argsort(out['t'],kind='stable')
+    if np.any(np.diff(order)!=1):
+        out={c:v[order] for c,v in out.items()}
+    return out
+
+
+# LAS 1.2 point data record format 1
+LAS_point_dtype=np.dtype([('X','<i4'),('Y','<i4'),('Z','<i4'),('intensity','<u2'),('flags','u1'),
+                          ('classification','u1'),('scan_angle','i1'),('user_data','u1'),
+                          ('point_source','<u2'),('gps_time','<f8')])
+
+_LAS_header_=struct.Struct('<4sHHIHH8sBB32s32sHHHIIBHI5I3d3d6d')
+
+
+def _las_header(n,n_vlr,vlr_bytes,scale,offset,bounds):
+    day=time.gmtime()
+    return _LAS_header_.pack(b'LASF',0,1,0,0,0,b'\0'*8,1,2,b'GNSS_arduino',b'export.write_las',
+                             day.tm_yday,day.tm_year,_LAS_header_.size,_LAS_header_.size+vlr_bytes,
+                             n_vlr,1,LAS_point_dtype.itemsize,n,n,0,0,0,0,
+                             *scale,*offset,*bounds)
+
+
+def _las_crs(epsg):
+    """
+    GeoKeyDirectoryTag variable length record of a projected CRS (EPSG code, metre)
+    """
+    keys=[1,1,0,4, 1024,0,1,1, 1025,0,1,1, 3072,0,1,epsg, 3076,0,1,9001]
+    data=struct.pack('<{:d}H'.format(len(keys)),*keys)
+    return struct.pack('<H16sHH32s',0,b'LASF_Projection',34735,len(data),b'GeoKeyDirectoryTag')+data
+
+
+def write_las(data,file,MSG=None,chunk=2**20,scale=0.001,classification=1,point_source=0,
+              intensity_scale=100,zone=None,north=None):
+    """
+    Write the georeferenced laser shots of data to a LAS 1.2 file (point format 1).
+
+    data:               UBX2data or INSLASERdata with h_corr (run corr_h_laser)
+    file:               output file (.las)
+    MSG:                navigation message for the position (see georef.nav_message)
+    chunk:              number of laser samples georeferenced and written at once
+    scale:              resolution of the coordinates (m)
+    classification:     ASPRS class of the points (1: unclassified, 2: ground)
+    point_source:       point source ID, e.g. number of the flight line
+    intensity_scale:    intensity=signQ*intensity_scale
+    zone, north:        UTM zone and hemisphere. Default: from the navigation data.
+
+    Coordinates: UTM (WGS84, EPSG 326zz/327zz), z: ellipsoidal height of the surface.
+    GPS time: adjusted standard GPS time (GPS seconds - 1e9).
+
+    return  number of points written
+    """
+    MSG,nav=georef.nav_message(data,MSG)
+    if zone is None:
+        zone=georef.utm_zone(nav.lon)
+    if north is None:
+        north=bool(np.nanmedian(nav.lat)>=0)
+    vlr=_las_crs(georef.epsg_utm(zone,north))
+    x0,y0=georef.ll2utm(nav.lat[0],nav.lon[0],zone,north)[:2]
+    offset=(float(np.round(x0,-3)),float(np.round(y0,-3)),0.)
+
+    n=0
+    lo=np.full(3,np.inf)
+    hi=np.full(3,-np.inf)
+    with open(file,'wb') as f:
+        f.write(_las_header(0,1,len(vlr),(scale,)*3,offset,(0.,)*6))
+        f.write(vlr)
+        for a in range(0,len(data.Laser.t),chunk):
+            p=georef.laser_points(data,MSG,a,a+chunk,zone,north)
+            rec=np.zeros(len(p['t']),dtype=LAS_point_dtype)
+            for k,c in enumerate('xyz'):
+                v=p[c]
+                rec[c.upper()]=np.round((v-offset[k])/scale)
+                if len(v)>0:
+                    lo[k]=min(lo[k],v.min())
+                    hi[k]=max(hi[k],v.max())
+            rec['intensity']=np.clip(np.nan_to_num(p['signQ']*intensity_scale),0,65535)
+            rec['flags']=0b00001001     # return 1 of 1
+            rec['classification']=classification
+            rec['scan_angle']=np.clip(np.round(p['roll']),-90,90)
+            rec['point_source']=point_source
+            rec['gps_time']=p['t']*1e-9-1e9
+            rec.tofile(f)
+            n+=len(rec)
+        if n==0:
+            lo[:]=hi[:]=0
+        f.seek(0)
+        f.write(_las_header(n,1,len(vlr),(scale,)*3,offset,(hi[0],lo[0],hi[1],lo[1],hi[2],lo[2])))
+    return n
+
+
+def read_las(file):
+    """
+    Read a LAS file written by write_las.
+
+    return  dict of arrays: x, y, z (m), intensity, classification, scan_angle, point_source, gps_time;
+            and the header values
+    """
+    with open(file,'rb') as f:
+        h=_LAS_header_.unpack(f.read(_LAS_header_.size))
+        f.seek(h[14])
+        rec=np.fromfile(f,dtype=LAS_point_dtype,count=h[18])
+    scale,offset=h[24:27],h[27:30]
+    out={c:offset[k]+rec[C]*scale[k] for k,(c,C) in enumerate(zip('xyz','XYZ'))}
+    for c in ['intensity','classification','scan_angle','point_source','gps_time']:
+        out[c]=rec[c]
+    out['header']=h
+    return out
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Georeferencing of laser shots: position of the navigation solution at the time of
+each laser sample, projected to UTM (WGS84), and the surface elevation
+height - h_corr.
+
+The UTM projection uses the Krueger series of the transverse Mercator projection
+(accurate to well below 1 mm within the zone), so no projection library is needed.
+"""
+
+import numpy as np
+
+# WGS84
+_a_=6378137.
+_f_=1/298.257223563
+
+# navigation message: (scale of height to m, scale of roll/pitch to degree)
+_nav_={'PVAT':(1e-3,1.),'PVT':(1e-3,1.),'PINS1':(1.,180/np.pi)}
+
+
+def utm_zone(lon):
+    """
+    return  UTM zone of longitude lon (degree, median if array)
+    """
+    lon=float(np.nanmedian(lon))
+    return int((lon+180)//6)%60+1
+
+
+def epsg_utm(zone,north=True):
+    """
+    return  EPSG code of UTM zone (WGS84)
+    """
+    return (32600 if north else 32700)+zone
+
+
+def ll2utm(lat,lon,zone=None,north=None):
+    """
+    Project latitude and longitude (degree) to UTM.
+
+    zone:   UTM zone. Default: zone of the median longitude.
+    north:  northern hemisphere. Default: median latitude >=0.
+
+    return  easting (m), northing (m), zone, north
+    """
+    lat=np.asarray(lat,dtype=np.float64)
+    lon=np.asarray(lon,dtype=np.float64)
+    if zone is None:
+        zone=utm_zone(lon)
+    if north is None:
+        north=bool(np.nanmedian(lat)>=0)
+    k0=0.9996
+    n=_f_/(2-_f_)
+    A=_a_/(1+n)*(1+n**2/4+n**4/64)
+    alpha=(n/2-2*n**2/3+5*n**3/16, 13*n**2/48-3*n**3/5, 61*n**3/240)
+    e=2*np.sqrt(n)/(1+n)
+
+    phi=np.radians(lat)
+    dlam=np.radians(lon-(zone*6-183))
+    s=np.sin(phi)
+    t=np.sinh(np.arctanh(s)-e*np.arctanh(e*s))
+    xi=np.arctan2(t,np.cos(dlam))
+    eta=np.arctanh(np.sin(dlam)/np.sqrt(1+t**2))
+    E=eta.copy()
+    N=xi.copy()
+    for j,a in enumerate(alpha,1):
+        E+=a*np.cos(2*j*xi)*np.sinh(2*j*eta)
+        N+=a*np.sin(2*j*xi)*np.cosh(2*j*eta)
+    E=500000+k0*A*E
+    N=k0*A*N+(0 if north else 10000000)
+    return E,N,zone,north
+
+
+def nav_message(data,MSG=None):
+    """
+    Navigation message of data used for georeferencing. Default: PVAT (UBX2data) or PINS1 (INSLASERdata).
+
+    return  name, message data
+    """
+    if MSG is None:
+        MSG=next(m for m in _nav_ if getattr(getattr(data,m,None),'len',0)>0 and hasattr(getattr(data,m),'t'))
+    return MSG,getattr(data,MSG)
+
+
+def laser_points(data,MSG=None,start=0,stop=None,zone=None,north=None):
+    """
+    Georeferenced laser shots start:stop of data (UBX2data or INSLASERdata). Run corr_h_laser first.
+    Shots outside of the navigation data or without valid h_corr are dropped.
+
+    MSG:        navigation message for the position (see nav_message)
+    zone,north: UTM zone and hemisphere. Default: from the navigation data.
+
+    return  dict of arrays: index (of the shot), t (ns), lat, lon, height (m, antenna),
+            x, y (UTM, m), z (surface elevation, m), h_corr, signQ, roll, pitch (degree);
+            and zone, north
+    """
+    MSG,nav=nav_message(data,MSG)
+    h_scale,a_scale=_nav_[MSG]
+    L=data.Laser
+    if zone is None:
+        zone=utm_zone(nav.lon)
+    if north is None:
+        north=bool(np.nanmedian(nav.lat)>=0)
+
+    sl=slice(start,stop)
+    h_corr=getattr(L,'h_corr',L.h)[sl]
+    t=L.t[sl]
+    ok=np.isfinite(h_corr)&(t>=nav.t[0])&(t<=nav.t[-1])
+    if hasattr(L,'valid'):
+        ok&=L.valid[sl]
+    idx=np.flatnonzero(ok)+(start or 0)
+    t=t[ok]
+
+    # interpolate relative to the first navigation epoch to keep ns precision in float64
+    tn=(nav.t-nav.t[0]).astype(np.float64)
+    tl=(t-nav.t[0]).astype(np.float64)
+    lat=np.interp(tl,tn,nav.lat)
+    lon=np.interp(tl,tn,nav.lon)
+    height=np.interp(tl,tn,nav.height)*h_scale
+    x,y,zone,north=ll2utm(lat,lon,zone,north)
+    signQ=getattr(L,'signQ',np.full(len(L.h),np.nan))[sl][ok]
+    roll=getattr(L,'roll',np.zeros(len(L.h)))[sl][ok]*a_scale
+    pitch=getattr(L,'pitch',np.zeros(len(L.h)))[sl][ok]*a_scale
+    return {'index':idx,'t':t,'lat':lat,'lon':lon,'height':height,'x':x,'y':y,
+            'z':height-h_corr[ok],'h_corr':h_corr[ok],'signQ':signQ,'roll':roll,'pitch':pitch,
+            'zone':zone,'north':north}
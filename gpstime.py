@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+GPS time handling shared by UBX2data and INSLASERdata.
+
+Messages carry time of week only (iTOW in ms for UBX, TOW in s for the IMX5 NMEA
+messages). Combined with the GPS week they give an absolute, monotonic time in
+int64 nanoseconds since the GPS epoch (1980-01-06), stored as attribute t of the
+message data. Sessions crossing the Saturday/Sunday week boundary stay monotonic.
+
+GPS time has no leap seconds; gps2utc/utc2gps convert with the leap second table.
+"""
+
+import numpy as np
+
+WEEK_NS=604800*10**9
+GPS_EPOCH=np.datetime64('1980-01-06T00:00:00','ns')
+
+# UTC date from which GPS-UTC is the given number of seconds
+_leap_dates_=np.array(['1981-07-01','1982-07-01','1983-07-01','1985-07-01','1988-01-01',
+                       '1990-01-01','1991-01-01','1992-07-01','1993-07-01','1994-07-01',
+                       '1996-01-01','1997-07-01','1999-01-01','2006-01-01','2009-01-01',
+                       '2012-07-01','2015-07-01','2017-01-01'],dtype='datetime64[ns]')
+_leap_offset_=np.arange(1,len(_leap_dates_)+1,dtype=np.int64)
+# same dates in GPS ns
+_leap_gps_=(_leap_dates_-GPS_EPOCH).astype(np.int64)+_leap_offset_*10**9
+
+
+def gps_ns(week,tow,unit='s'):
+    """
+    Absolute GPS time from week and time of week.
+
+    week:   GPS week (scalar or array)
+    tow:    time of week (array)
+    unit:   unit of tow, 's' or 'ms'
+
+    return  int64 ns since GPS epoch
+    """
+    scale=10**9 if unit=='s' else 10**6
+    tow=np.asarray(tow)
+    if tow.dtype.kind=='f':
+        tow_ns=np.round(tow.astype(np.float64)*scale).astype(np.int64)
+    else:
+        tow_ns=tow.astype(np.int64)*scale
+    return np.asarray(week,dtype=np.int64)*WEEK_NS+tow_ns
+
+
+def unwrap_tow(tow,week0=0,unit='s'):
+    """
+    Absolute GPS time from time of week without week numbers, for data in file order.
+    A backward jump of more than half a week is taken as a week rollover.
+
+    week0:  GPS week of the first sample
+
+    return  int64 ns since GPS epoch
+    """
+    t=gps_ns(week0,tow,unit)
+    if len(t)>1:
+        t+=np.cumsum(np.diff(t,prepend=t[0])<-WEEK_NS//2)*WEEK_NS
+    return t
+
+
+def align_tow(tow,t_ref,tow_ref,unit='s'):
+    """
+    Absolute time for time of week data without week numbers (e.g. laser, ATT),
+    using a reference message from the same file with known absolute time.
+
+    tow:            time of week (file order)
+    t_ref:          absolute time of reference (int64 ns), first sample is used
+    tow_ref:        time of week of the reference, same unit as tow
+
+    return  int64 ns since GPS epoch
+    """
+    if len(tow)==0:
+        return np.zeros(0,dtype=np.int64)
+    if len(t_ref)==0:
+        return unwrap_tow(tow,0,unit)
+    week0=int(t_ref[0]//WEEK_NS)
+    t=unwrap_tow(tow,week0,unit)
+    # first sample in the week after (or before) the reference
+    d=t[0]-gps_ns(week0,tow_ref[:1],unit)[0]
+    if d<-WEEK_NS//2:
+        t+=WEEK_NS
+    elif d>WEEK_NS//2:
+        t-=WEEK_NS
+    return t
+
+
+def leap_seconds(t):
+    """
+    GPS-UTC offset (s) at GPS time t (int64 ns).
+    """
+    return np.searchsorted(_leap_gps_,np.asarray(t,dtype=np.int64),side='right').astype(np.int64)
+
+
+def gps2utc(t):
+    """
+    GPS time (int64 ns since GPS epoch) to UTC datetime64[ns].
+    """
+    t=np.asarray(t,dtype=np.int64)
+    return GPS_EPOCH+(t-leap_seconds(t)*10**9).astype('timedelta64[ns]')
+
+
+def gps2datetime(t):
+    """
+    GPS time (int64 ns since GPS epoch) to datetime64[ns] in the GPS time scale (no leap seconds).
+    """
+    return GPS_EPOCH+np.asarray(t,dtype=np.int64).astype('timedelta64[ns]')
+
+
+def utc2gps(utc):
+    """
+    UTC datetime64 to GPS time (int64 ns since GPS epoch).
+    """
+    utc=np.asarray(utc,dtype='datetime64[ns]')
+    n=np.searchsorted(_leap_dates_,utc,side='right').astype(np.int64)
+    return (utc-GPS_EPOCH).astype(np.int64)+n*10**9
+
+
+def utc_fields2gps(year,month,day,hour,minute,second,nano=0):
+    """
+    UTC date and time fields (as in NAV-PVT/NAV-PVAT) to GPS time (int64 ns).
+    """
+    year=np.asarray(year,dtype=np.int64)
+    d=((year-1970).astype('datetime64[Y]')+(np.asarray(month,dtype=np.int64)-1).astype('timedelta64[M]')
+       ).astype('datetime64[D]')+(np.asarray(day,dtype=np.int64)-1).astype('timedelta64[D]')
+    s=(np.asarray(hour,dtype=np.int64)*3600+np.asarray(minute,dtype=np.int64)*60
+       +np.asarray(second,dtype=np.int64))*10**9+np.asarray(nano,dtype=np.int64)
+    return utc2gps(d.astype('datetime64[ns]')+s.astype('timedelta64[ns]'))
+
+
+def week_from_utc_fields(iTOW,year,month,day,hour,minute,second,nano=0):
+    """
+    GPS week of each message from its UTC date fields and iTOW (ms).
+    Rounding makes it robust to the receiver rounding of the date fields.
+    """
+    t=utc_fields2gps(year,month,day,hour,minute,second,nano)
+    return np.round((t-np.asarray(iTOW,dtype=np.int64)*10**6)/WEEK_NS).astype(np.int64)
+
+
+def time_limits(t,tow,timelim,timeformat,unit='s'):
+    """
+    Convert time limits to absolute GPS time (int64 ns) for a message with absolute time t
+    and time of week tow.
+
+    timeformat: 'ms' or 'TOW': time of week (ms or s as given by unit),
+                's': seconds from start of data,
+                'gps': ns since GPS epoch,
+                'utc': datetime64 in UTC
+    """
+    if timeformat in ['ms','TOW']:
+        return align_tow(np.asarray(timelim),t,tow,unit)
+    elif timeformat=='s':
+        return t[0]+np.round(np.asarray(timelim,dtype=float)*10**9).astype(np.int64)
+    elif timeformat=='gps':
+        return np.asarray(timelim,dtype=np.int64)
+    elif timeformat=='utc':
+        return utc2gps(timelim)
+    raise ValueError('timeformat not valid: '+str(timeformat))
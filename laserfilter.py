@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Filtering of the laser altimeter data (LDS70A): dropouts, signal quality,
+temperature compensation and despiking.
+
+Spikes are samples deviating from a robust local quadratic fit by more than nsigma
+times the MAD of the residuals. The MAD is taken over blocks of scale_window samples,
+much longer than the fit window: the scale of a short window is close to zero on a
+smooth but curved surface (the center sample often is the rolling median) and would
+reject valid samples. Gross outliers are removed before the fit by the deviation from
+the rolling median, scaled with the MAD of the sample to sample differences.
+
+The rolling windows are strided views of the data, processed in chunks so that
+the memory stays bounded for millions of samples.
+"""
+
+import numpy as np
+import warnings
+
+
+def rolling_nanmedian(x,window,chunk=2**18):
+    """
+    Centered rolling median of x ignoring NaN. window: odd number of samples.
+    Samples without valid value in the window are NaN.
+    """
+    x=np.asarray(x,dtype=np.float64)
+    h=window//2
+    xp=np.concatenate((np.full(h,np.nan),x,np.full(h,np.nan)))
+    out=np.empty(len(x))
+    s=xp.strides[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore',RuntimeWarning)    # all-NaN windows
+        for a in range(0,len(x),chunk):
+            b=min(a+chunk,len(x))
+            W=np.lib.stride_tricks.as_strided(xp[a:],shape=(b-a,window),strides=(s,s),writeable=False)
+            out[a:b]=np.nanmedian(W,axis=1)
+    return out
+
+
+def rolling_quadfit(x,w,window,chunk=2**18):
+    """
+    Centered rolling least squares fit of a quadratic with weights w (0: ignore sample),
+    evaluated at the center sample. window: odd number of samples.
+    Windows with less than 3 samples give the weighted mean, without samples NaN.
+    """
+    w=np.asarray(w,dtype=np.float64)
+    h=window//2
+    pad=np.zeros(h)
+    wp=np.concatenate((pad,w,pad))
+    xp=np.concatenate((pad,np.where(w>0,x,0),pad))*wp
+    u=np.arange(-h,h+1,dtype=np.float64)
+    U=np.column_stack([u**k for k in range(5)])
+    out=np.empty(len(w))
+    s=wp.strides[0]
+    for a in range(0,len(w),chunk):
+        b=min(a+chunk,len(w))
+        W=np.lib.stride_tricks.as_strided(wp[a:],shape=(b-a,window),strides=(s,s),writeable=False)
+        X=np.lib.stride_tricks.as_strided(xp[a:],shape=(b-a,window),strides=(s,s),writeable=False)
+        S0,S1,S2,S3,S4=(W@U).T
+        T0,T1,T2=(X@U[:,:3]).T
+        # constant term of the normal equations by Cramer's rule
+        m=S2*S4-S3**2
+        det=S0*m-S1*(S1*S4-S2*S3)+S2*(S1*S3-S2**2)
+        num=T0*m-S1*(T1*S4-S3*T2)+S2*(T1*S3-S2*T2)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            out[a:b]=np.where(np.abs(det)>1e-9*np.maximum(S0*m,1),num/det,np.where(S0>0,T0/S0,np.nan))
+    return out
+
+
+def block_mad(dev,block):
+    """
+    Robust scale 1.4826*median(|dev|) over consecutive blocks of about block samples, ignoring NaN.
+
+    return  scale for every sample
+    """
+    dev=np.abs(np.asarray(dev,dtype=np.float64))
+    edges=np.linspace(0,len(dev),max(int(round(len(dev)/block)),1)+1).astype(np.int64)
+    out=np.empty(len(dev))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore',RuntimeWarning)    # all-NaN blocks
+        for a,b in zip(edges[:-1],edges[1:]):
+            out[a:b]=1.4826*np.nanmedian(dev[a:b])
+    return out
+
+
+def filter_laser(h,signQ=None,T=None,q_min=None,q_max=None,h_min=0,h_max=np.inf,
+                 window=11,nsigma=5,min_mad=0.01,scale_window=600,niter=2,T_coef=0,T_ref=20):
+    """
+    Validity mask and filtered height of laser data.
+
+    h:              laser range (m). NaN and -999 are dropouts.
+    signQ, T:       signal quality and temperature (deg C) of each sample
+    q_min, q_max:   valid range of signQ. None: no limit.
+    h_min, h_max:   valid range of h (m)
+    window:         length of the rolling median and quadratic fit (samples, odd)
+    nsigma:         samples deviating more than nsigma*MAD from the fit are spikes
+    min_mad:        lower limit of the MAD (m), avoids rejecting noise of a flat surface
+    scale_window:   block length of the MAD (samples, see block_mad)
+    niter:          iterations of the fit without the spikes found before
+    T_coef:         temperature coefficient of the range (m/deg C). h-T_coef*(T-T_ref) is used.
+    T_ref:          reference temperature (deg C)
+
+    return  filtered height (NaN if not valid), validity mask
+    """
+    h=np.asarray(h,dtype=np.float64)
+    valid=np.isfinite(h)&(h!=-999)&(h>h_min)&(h<h_max)
+    if signQ is not None:
+        q=np.asarray(signQ,dtype=np.float64)
+        if q_min is not None:
+            valid&=q>=q_min
+        if q_max is not None:
+            valid&=q<=q_max
+
+    x=np.where(valid,h,np.nan)
+    if T is not None and T_coef!=0:
+        T=np.asarray(T,dtype=np.float64)
+        x-=T_coef*np.where(np.isfinite(T)&(T!=-999),T-T_ref,0)
+
+    if window>1:
+        window=window+1-window%2
+        # gross outliers: deviation from the rolling median
+        dev=np.abs(x-rolling_nanmedian(x,window))
+        sd=block_mad(np.diff(x,prepend=np.nan),scale_window)/np.sqrt(2)
+        with np.errstate(invalid='ignore'):
+            use0=use=valid&~(dev>nsigma*np.fmax(sd,min_mad))
+        # spikes: residuals of the local quadratic fit without the outliers
+        for it in range(niter):
+            dev=np.abs(x-rolling_quadfit(x,use,window))
+            mad=block_mad(np.where(use,dev,np.nan),scale_window)
+            with np.errstate(invalid='ignore'):
+                use=valid&np.where(np.isfinite(dev),dev<=nsigma*np.fmax(mad,min_mad),use0)
+        valid=use
+    x[~valid]=np.nan
+    return x,valid
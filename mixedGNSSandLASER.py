@@ -64,9 +64,10 @@ check_data(rate5)
 data=UBX2data(filepath+r'\a000101_0457.ubx')
 check_data(data)
 
-for i in range(0, len(data.Laser.iTOW)-1):
-    if (data.Laser.iTOW[i+1]-data.Laser.iTOW[i]) > 300:
-        print(i,', ',data.Laser.iTOW[i+1]-data.Laser.iTOW[i])
+print(data.Laser.gaps.summary())
+k=data.Laser.gaps.length()>0.3
+for i,dt in zip(data.Laser.gaps.gap_idx[k],data.Laser.gaps.length()[k]):
+    print(i,', ',dt*1000)
 
 """
 data Download worked fine. Laser data is missing
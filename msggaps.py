@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Gap and rate index of message data.
+
+MSG_gaps is computed once from the absolute time t of a message (int64 ns, see
+gpstime.py) when data are loaded and stored as attribute gaps of the message data,
+e.g. data.Laser.gaps. It holds the expected period, the gaps and the number of
+duplicate and out of order time stamps, so the data of many files can be checked
+without going through the samples again.
+"""
+
+import numpy as np
+
+
+class MSG_gaps:
+
+    def __init__(self,t,period=0,factor=1.5,min_gap=0):
+        """
+        t:          time (int64 ns)
+        period:     expected period (s). Default: median of the positive time steps.
+        factor:     a time step longer than factor*period is a gap
+        min_gap:    minimum length of a gap (s)
+        """
+        t=np.asarray(t,dtype=np.int64)
+        self.n=len(t)
+        dt=np.diff(t)
+        if period==0:
+            pos=dt[dt>0]
+            period=float(np.median(pos))*1e-9 if len(pos)>0 else 0.
+        self.period=period
+        self.rate=1/period if period>0 else 0.
+        self.duplicates=int(np.count_nonzero(dt==0))
+        self.out_of_order=int(np.count_nonzero(dt<0))
+        if period>0:
+            self.gap_idx=np.flatnonzero(dt>max(factor*period,min_gap)*1e9)
+        else:
+            self.gap_idx=np.zeros(0,dtype=np.int64)
+        # gap between sample gap_idx and gap_idx+1
+        self.gap_start=t[self.gap_idx]
+        self.gap_stop=t[self.gap_idx+1]
+        if self.n>0:
+            self.t_start,self.t_stop=t[0],t[-1]
+        else:
+            self.t_start=self.t_stop=np.int64(0)
+        self.duration=max(int(self.t_stop-self.t_start),0)*1e-9
+        self.missing=int(np.round((self.gap_stop-self.gap_start)*1e-9/period).sum())-len(self.gap_idx) if period>0 else 0
+
+    def __len__(self):
+        return len(self.gap_idx)
+
+    def length(self):
+        """
+        return  length of the gaps (s)
+        """
+        return (self.gap_stop-self.gap_start)*1e-9
+
+    def gaps(self,min_length=0):
+        """
+        return  start and stop (int64 ns) of gaps of at least min_length (s)
+        """
+        k=self.length()>=min_length
+        return self.gap_start[k],self.gap_stop[k]
+
+    def in_gap(self,t):
+        """
+        return  True for times t (int64 ns) inside a gap
+        """
+        t=np.asarray(t,dtype=np.int64)
+        if len(self.gap_idx)==0:
+            return np.zeros(t.shape,dtype=bool)
+        i=np.searchsorted(self.gap_start,t,side='right')-1
+        return (i>=0)&(t<self.gap_stop[np.maximum(i,0)])
+
+    def completeness(self):
+        """
+        return  fraction of the expected samples that are present
+        """
+        if self.period<=0 or self.n==0:
+            return 0.
+        return min(self.n/(self.duration/self.period+1),1.)
+
+    def as_dict(self):
+        """
+        return  scalar statistics (e.g. for a table over many files)
+        """
+        return {'n':self.n,'period':self.period,'rate':self.rate,'duration':self.duration,
+                'gaps':len(self),'missing':self.missing,'max_gap':float(self.length().max()) if len(self)>0 else 0.,
+                'duplicates':self.duplicates,'out_of_order':self.out_of_order,'completeness':self.completeness()}
+
+    def summary(self):
+        """
+        return  text with rate, gaps, duplicates and out of order time stamps
+        """
+        if self.n==0:
+            return 'no data'
+        d=self.as_dict()
+        return ('{n:d} samples, {duration:.1f} s, period {period:.4f} s ({rate:.2f} Hz), completeness {completeness:.3f}\n'
+                '{gaps:d} gaps (max {max_gap:.3f} s, {missing:d} samples missing), '
+                '{duplicates:d} duplicates, {out_of_order:d} out of order').format(**d)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Column dtypes of the extracted message data.
+
+Fields are stored with the width they have in the UBX message (U1, U2, I4, ...).
+Scaled fields (pyubx2 applies the scaling, e.g. lat/lon 1e-7 deg) are stored as
+float64 if the resolution needs it (e.g. angles of 1e-5 deg up to 360 deg),
+otherwise float32. Bits of bitfields are
+unpacked by pyubx2 into separate attributes and stored as uint8.
+iTOW is stored as int32 (not uint32) so that time differences can be negative.
+
+Fields not listed fall back to the type of the first parsed value.
+Use promote() to convert columns to int64/float64 for computations.
+"""
+
+import numpy as np
+
+# flags unpacked by pyubx2 from X1/X2/X4 fields
+_flags_PVT_=['validDate','validTime','fullyResolved','validMag','gnssFixOk','diffSoln','psmState',
+             'headVehValid','carrSoln','confirmedAvai','confirmedDate','confirmedTime',
+             'invalidLlh','lastCorrectionAge']
+_flags_PVAT_=['validDate','validTime','fullyResolved','validMag','gnssFixOK','diffSoln',
+              'vehRollValid','vehPitchValid','vehHeadingValid','carrSoln']
+_flags_INS_=['version','xAngRateValid','yAngRateValid','zAngRateValid','xAccelValid','yAccelValid','zAccelValid']
+
+_time_={'iTOW':'i4','year':'u2','month':'u1','day':'u1','hour':'u1','min':'u1','second':'u1','sec':'u1',
+        'tAcc':'u4','nano':'i4'}
+
+UBX_schema={
+    'PVT':dict(_time_,**{f:'u1' for f in _flags_PVT_},
+               fixType='u1',numSV='u1',lon='f8',lat='f8',height='i4',hMSL='i4',hAcc='u4',vAcc='u4',
+               velN='i4',velE='i4',velD='i4',gSpeed='i4',headMot='f8',sAcc='u4',headAcc='f8',
+               pDOP='f4',headVeh='f8',magDec='f4',magAcc='f4'),
+    'PVAT':dict(_time_,**{f:'u1' for f in _flags_PVAT_},
+                version='u1',fixType='u1',numSV='u1',lon='f8',lat='f8',height='i4',hMSL='i4',
+                hAcc='u4',vAcc='u4',velN='i4',velE='i4',velD='i4',gSpeed='i4',sAcc='u4',
+                vehRoll='f8',vehPitch='f8',vehHeading='f8',motHeading='f8',
+                accRoll='f4',accPitch='f4',accHeading='f4',magDec='f4',magAcc='f4',
+                errEllipseOrient='f4',errEllipseMajor='u4',errEllipseMinor='u4'),
+    'ATT':{'iTOW':'i4','version':'u1','roll':'f8','pitch':'f8','heading':'f8',
+           'accRoll':'f8','accPitch':'f8','accHeading':'f8'},
+    'INS':dict({f:'u1' for f in _flags_INS_},
+               iTOW='i4',xAngRate='f4',yAngRate='f4',zAngRate='f4',xAccel='f4',yAccel='f4',zAccel='f4'),
+    }
+
+
+def column_dtype(schema,attr,value):
+    """
+    dtype of column attr: from schema, else from the type of value.
+    """
+    try:
+        return np.dtype(schema[attr])
+    except KeyError:
+        return np.dtype(type(value))
+
+
+def fill_value(dtype):
+    """
+    Value stored for fields that could not be parsed: -999 if the dtype can hold it,
+    else the minimum (signed) or maximum (unsigned) integer.
+    """
+    dtype=np.dtype(dtype)
+    if dtype.kind=='u':
+        return np.iinfo(dtype).max
+    if dtype.kind=='i' and np.iinfo(dtype).min>-999:
+        return np.iinfo(dtype).min
+    return -999
+
+
+def promote(msg,attrs=None):
+    """
+    Convert integer and float columns of msg (MSG_type) to int64 and float64, in place.
+    attrs: list of columns to convert. Default: all numeric arrays.
+    """
+    if attrs is None:
+        attrs=list(msg.__dict__.keys())
+    for a in attrs:
+        x=getattr(msg,a,None)
+        if not isinstance(x,np.ndarray):
+            continue
+        if x.dtype.kind in 'iub':
+            setattr(msg,a,x.astype(np.int64))
+        elif x.dtype.kind=='f':
+            setattr(msg,a,x.astype(np.float64))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Bookkeeping of messages that are not extracted (unknown, other or corrupt messages).
+
+Instead of keeping every message object, MSG_stats counts messages and bytes per
+identity and keeps a bounded random sample (reservoir sampling) of examples.
+All messages are only kept if requested (keep=True).
+"""
+
+import random
+
+
+class MSG_stats:
+
+    def __init__(self,keep=False,nsample=10,seed=0):
+        """
+        keep:       keep all messages in self.items
+        nsample:    number of examples kept per identity
+        seed:       seed of the random sampling
+        """
+        self.keep=keep
+        self.nsample=nsample
+        self.count={}
+        self.bytes={}
+        self.samples={}
+        self.items=[]
+        self.n=0
+        self._rand=random.Random(seed)
+
+    def add(self,key,item,nbytes=0):
+        """
+        key:    identity of the message (e.g. 'RXM-RAWX' or NMEA key)
+        item:   message (parsed object, line or index) to sample
+        nbytes: size of the message in bytes
+        """
+        self.n+=1
+        c=self.count.get(key,0)+1
+        self.count[key]=c
+        self.bytes[key]=self.bytes.get(key,0)+nbytes
+        s=self.samples.setdefault(key,[])
+        if len(s)<self.nsample:
+            s.append(item)
+        else:
+            r=self._rand.randrange(c)
+            if r<self.nsample:
+                s[r]=item
+        if self.keep:
+            self.items.append(item)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        """
+        Iterate over all kept messages, or over the samples if not all are kept.
+        """
+        if self.keep:
+            return iter(self.items)
+        return (x for s in self.samples.values() for x in s)
+
+    def summary(self):
+        """
+        return  text with count and bytes per identity, most frequent first
+        """
+        if self.n==0:
+            return 'none'
+        lines=['{:d} messages, {:d} bytes'.format(self.n,sum(self.bytes.values()))]
+        for k in sorted(self.count,key=self.count.get,reverse=True):
+            lines.append('  {:s}: {:d} messages, {:d} bytes'.format(str(k),self.count[k],self.bytes[k]))
+        return '\n'.join(lines)
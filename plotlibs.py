@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Plotting and mapping libraries, imported on first use.
+
+Parsing and correcting data in UBX2data, UBXdata and INSLASERdata only needs numpy
+(and pyubx2). matplotlib, cartopy, cmcrameri, geopy and PIL take seconds to import,
+so the plot functions of these modules load them with plotlibs.load(globals()).
+"""
+
+
+def load(namespace):
+    """
+    Import the plotting libraries into namespace (globals() of the calling module).
+    Does nothing if they are already loaded.
+    """
+    if namespace.get('pl') is not None:
+        return
+    import matplotlib.pyplot as pl
+    from cmcrameri import cm
+    from geopy import distance
+    import cartopy.crs as ccrs
+    import cartopy.io.img_tiles as cimgt
+    from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+    from PIL import Image
+    namespace.update(cm=cm, distance=distance, ccrs=ccrs, cimgt=cimgt,
+                     LongitudeFormatter=LongitudeFormatter, LatitudeFormatter=LatitudeFormatter,
+                     Image=Image)
+    namespace['pl'] = pl
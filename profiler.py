@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage profiling of the loaders (UBX2data, INSLASERdata).
+
+A Profiler records wall time, bytes, message counts and memory of each loading
+stage (UBX2data: clean, decode, extract, laser, time, filter, align, gaps, correct;
+INSLASERdata: parse, arrays, time, gaps, filter, correct). The memory of a stage
+(peak_MB, mem_MB) is traced with tracemalloc if memory is set. The total record
+adds the maximum resident memory of the process so far (process_max_rss_MB), which
+covers everything the process did before, not only this load. The
+loaders store the records as load_report. Records can be passed to a callback
+and appended as JSON lines to a file, e.g. for processing dashboards.
+
+    p=Profiler(jsonl='load_report.jsonl',memory=True)
+    data=UBX2data(file,profiler=p)
+    data.load_report
+"""
+
+import sys
+import json
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource=None
+
+
+def _max_rss_MB():
+    """
+    Maximum resident memory of the process since its start (MB), None if not available.
+    """
+    if resource is None:
+        return None
+    r=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r/2**20 if sys.platform=='darwin' else r/2**10
+
+
+class Profiler:
+
+    def __init__(self,jsonl='',callback=None,memory=False,verbose=False):
+        """
+        jsonl:      file to append the records to as JSON lines
+        callback:   function called with each record (dict)
+        memory:     trace the memory of each stage with tracemalloc (slows down loading)
+        verbose:    print each record
+        """
+        self.jsonl=jsonl
+        self.callback=callback
+        self.memory=memory
+        self.verbose=verbose
+        self.info={}
+        self.records=[]
+        self._stage=None
+
+    def begin(self,**info):
+        """
+        Start profiling a load. info (e.g. file, name) is added to every record.
+        """
+        self.info=info
+        self.records=[]
+        self._t0=time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_trace=True
+        else:
+            self._own_trace=False
+        if self.memory:
+            self._mem_begin=self._peak=tracemalloc.get_traced_memory()[0]
+
+    def start(self,stage):
+        """
+        Start stage. A running stage is stopped.
+        """
+        if self._stage is not None:
+            self.stop()
+        self._stage={'stage':stage,'bytes':0,'msgs':0}
+        if self.memory and tracemalloc.is_tracing():
+            if hasattr(tracemalloc,'reset_peak'):
+                tracemalloc.reset_peak()
+            self._mem0=tracemalloc.get_traced_memory()[0]
+        self._t=time.perf_counter()
+
+    def stop(self,nbytes=None,msgs=None):
+        """
+        Stop the running stage.
+
+        nbytes:     bytes processed
+        msgs:       messages processed
+        """
+        if self._stage is None:
+            return
+        r=self._stage
+        r['time']=time.perf_counter()-self._t
+        if nbytes is not None:
+            r['bytes']=int(nbytes)
+        if msgs is not None:
+            r['msgs']=int(msgs)
+        if self.memory and tracemalloc.is_tracing():
+            cur,peak=tracemalloc.get_traced_memory()
+            r['peak_MB']=(peak-self._mem0)/2**20
+            r['mem_MB']=(cur-self._mem0)/2**20
+            self._peak=max(self._peak,peak)
+        self._stage=None
+        self._emit(r)
+
+    def end(self):
+        """
+        Stop profiling the load, emit the total.
+
+        return  list of records (load report)
+        """
+        self.stop()
+        total={'stage':'total','time':time.perf_counter()-self._t0,
+               'bytes':max([r['bytes'] for r in self.records]+[0]),
+               'msgs':sum(r['msgs'] for r in self.records if r['stage'] in ['decode','parse','laser']),
+               'process_max_rss_MB':_max_rss_MB()}
+        if self.memory and tracemalloc.is_tracing():
+            total['peak_MB']=(max(self._peak,tracemalloc.get_traced_memory()[1])-self._mem_begin)/2**20
+            if self._own_trace:
+                tracemalloc.stop()
+        self._emit(total)
+        return self.report()
+
+    def _emit(self,r):
+        r.update(self.info)
+        self.records.append(r)
+        if self.verbose:
+            print(format_record(r))
+        if self.callback is not None:
+            self.callback(r)
+        if self.jsonl:
+            with open(self.jsonl,'a') as f:
+                f.write(json.dumps(r,default=str)+'\n')
+
+    def report(self):
+        """
+        return  list of records (dict), one per stage and the total
+        """
+        return [dict(r) for r in self.records]
+
+
+def format_record(r):
+    """
+    One line text of a record with throughput
+    """
+    t=r.get('time',0)
+    s='{:10s} {:8.3f} s'.format(r['stage'],t)
+    if r.get('bytes',0)>0 and t>0:
+        s+=' {:8.2f} MB/s'.format(r['bytes']/2**20/t)
+    if r.get('msgs',0)>0 and t>0:
+        s+=' {:10.0f} msgs/s'.format(r['msgs']/t)
+    if r.get('peak_MB') is not None:
+        s+=' peak {:.1f} MB'.format(r['peak_MB'])
+    return s
+
+
+def print_report(report):
+    for r in report:
+        print(format_record(r))
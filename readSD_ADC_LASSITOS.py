@@ -1,72 +1,370 @@
 import os
-import csv
 import sys
+import json
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 
 
-def main(path='./',file='',justheader=0):  # Read the first sector of the first disk as example.
-    """Demo usage of function."""
+SECTOR_SIZE=512     # bytes per SD sector
+FRAME_SIZE=16       # bytes per ADC frame: counter + 3 samples
+FRAMES_PER_SECTOR=SECTOR_SIZE//FRAME_SIZE
+CHUNK_SECTORS=4096  # sectors read from disk at once (2 MB)
+PART_FRAMES=CHUNK_SECTORS*FRAMES_PER_SECTOR*16  # frames decoded by one worker task (32 MB)
+
+# Layout of one ADC frame as written by the microcontroller. Samples are kept as
+# raw big endian words so that they format to the same hex string as bytes.hex().
+ADC_frame_dtype=np.dtype([('counter','<u4'),('ch1','>u4'),('ch2','>u4'),('ch3','>u4')])
+# Decoded frame as stored in .npy output: samples as signed (two's complement) integers.
+ADC_data_dtype=np.dtype([('counter','<u4'),('ch1','<i4'),('ch2','<i4'),('ch3','<i4')])
+_csv_row_='%d,%08x,%08x,%08x\r\n'
+
+
+def main(path='./',file='',justheader=0,output='csv',disk='',start=0,length=0,workers=1):  # Read the first sector of the first disk as example.
+    """Demo usage of function. output='csv' (hex text) or 'npy' (binary, see save_frames_npy).
+    disk -- disk or disk image file to read. Default is the SD card drive of the OS.
+    start, length -- range of frames to decode, relative to the start of the recording (length=0: until end).
+    workers -- number of processes used for decoding (default: 1, 0 uses all cores).
+    """
     args = sys.argv[1:]
     if len(args) == 2 and args[0] == '-file':
         file=args[1]
-    if os.name == "nt":
-        # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
-        read_sector(r"\\.\physicaldrive1",0,path=path,file=file,justheader=justheader)
-        print('done')
-    else:
-        # Linux based OS normally uses '/dev/diskX' for disk drive identification.
-        print(read_sector("/dev/disk0"),path=path)
+    if disk=='':
+        if os.name == "nt":
+            # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
+            disk=r"\\.\physicaldrive1"
+        else:
+            # Linux based OS normally uses '/dev/diskX' for disk drive identification.
+            disk="/dev/disk0"
+    read_sector(disk,0,path=path,file=file,justheader=int(justheader),output=output,
+                start=int(start),length=int(length),workers=int(workers))
+    print('done')
 
 
-def read_sector(disk, sector_no=0,path='./',file='',justheader=0):
-    """Read a single sector of the specified disk.
+def read_sector(disk, sector_no=0,path='./',file='',justheader=0,output='csv',start=0,length=0,
+                sAddress=None,SD_Size=None,workers=1):
+    """Read the header sector of the specified disk and save the ADC data of the recording.
     Keyword arguments:
-    disk -- the physical ID of the disk to read.
-    sector_no -- the sector number to read (default: 0).
+    disk -- the physical ID of the disk to read, or the path of a disk image.
+    sector_no -- the sector number of the header (default: 0).
+    output -- 'csv' for hex text output, 'npy' for decoded binary output (default: 'csv').
+    start -- first frame to save, relative to the start of the recording (default: 0).
+    length -- number of frames to save. 0 saves until the end of the recording (default: 0).
+    sAddress, SD_Size -- override start sector and number of sectors given in the header.
+    workers -- number of processes used for decoding, see save_frames_parallel (default: 1).
+    
+    return header (dict) if justheader, else the last block of frames read.
     """
     # Static typed variable
     read = None
     # File operations with `with` syntax. To reduce file handeling efforts.
     with open(disk, 'rb') as fp:
-        fp.seek(sector_no * 512)
-        read = fp.read(12)
-        fName = read.decode()[:-2]
-        read = fp.read(4)
-        sAddress = int.from_bytes(read,"little")
-        read = fp.read(4)
-        ADC_Size = int.from_bytes(read,"little")
-        read = fp.read(4)
-        SD_Size = int.from_bytes(read,"little")
-
-        print('start address = ' + str(sAddress))
-        print('ADC size = ' + str(ADC_Size))
-        print('SD frames = ' + str(SD_Size))
-        print('File Name = ' + str(fName))
+        header = read_header(fp, sector_no)
+
+        print('start address = ' + str(header['sAddress']))
+        print('ADC size = ' + str(header['ADC_Size']))
+        print('SD frames = ' + str(header['SD_Size']))
+        print('File Name = ' + str(header['fName']))
+        if sAddress is not None:
+            header['sAddress'] = int(sAddress)
+            print('manual start address = ' + str(sAddress))
+        if SD_Size is not None:
+            header['SD_Size'] = int(SD_Size)
+            header['nFrames'] = int(SD_Size)*FRAMES_PER_SECTOR
+            print('manual SD frames = ' + str(SD_Size))
+        fName = header['fName']
         if file=='':
             file=path+'ADC'+str(fName[:6])+'_'+str(fName[6:])+'.csv'
         else:
             file=path+file
+        if output=='npy':
+            file=os.path.splitext(file)[0]+'.npy'
         print('File path = ' + file)
-        fp.seek(sAddress * 512)
-        #read = fp.read(16)
         if justheader:
+            return header
+        
+        if workers != 1:
+            save_frames_parallel(disk, file, header, start=start, length=length,
+                                 output=output, workers=workers)
             return None
         
+        if output=='npy':
+            save_frames_npy(file, fp, header, start=start, length=length)
+            return None
         
         with open(file, 'w', encoding='UTF8', newline='') as f:
-            f.write('#File Name = ' + str(fName)+'\n') 
-            f.write('#ADC size = ' + str(ADC_Size)+'\n')           
-            f.write('#SD frames = ' + str(SD_Size)+'\n')           
-            f.write('## \n')
+            write_csv_header(f, header, start, length)
             
-            writer = csv.writer(f)
-            for i in range(sAddress, SD_Size+sAddress):
-                read = fp.read(512)
-                for j in range(0,32):
-                    writer.writerow([int.from_bytes(read[j*16:j*16+4], 'little'), read[j*16+4:j*16+8].hex(), read[j*16+8:j*16+12].hex(), read[j*16+12:j*16+16].hex()])
+            for frames in iter_frame_range(fp, header, start, length):
+                write_frames_csv(f, frames)
+                read = frames
      
     return read
 
 
+def write_csv_header(f, header, start=0, length=0):
+    """Write the header lines of the csv output."""
+    f.write('#File Name = ' + str(header['fName'])+'\n') 
+    f.write('#ADC size = ' + str(header['ADC_Size'])+'\n')           
+    f.write('#SD frames = ' + str(header['SD_Size'])+'\n')           
+    if start or length:
+        f.write('#Start frame = ' + str(start)+'\n')           
+        f.write('#Frames = ' + str(length)+'\n')           
+    f.write('## \n')
+
+
+def read_header(fp, sector_no=0, legacy=False):
+    """Parse the header sector of an ADC recording.
+    Keyword arguments:
+    fp -- open binary file object of the disk (or disk image).
+    sector_no -- sector of the header (default: 0).
+    legacy -- header with 10 character file name, as read by readSD_ADCs.py (default: False).
+    
+    return dict with fName, sAddress, ADC_Size, SD_Size and nFrames (frames in recording)
+    """
+    fp.seek(sector_no * SECTOR_SIZE)
+    sector = fp.read(SECTOR_SIZE)   # whole sector, raw devices only allow aligned reads
+    if len(sector) < SECTOR_SIZE:
+        raise EOFError('Header sector {:d} not found on disk.'.format(sector_no))
+    n = 10 if legacy else 12
+    fName = sector[:n].decode(errors='replace')
+    if not legacy:
+        fName = fName[:-2]
+    sAddress, ADC_Size, SD_Size = np.frombuffer(sector, dtype='<u4', count=3, offset=n).tolist()
+    return {'fName':fName, 'sAddress':sAddress, 'ADC_Size':ADC_Size, 'SD_Size':SD_Size,
+            'nFrames':SD_Size*FRAMES_PER_SECTOR}
+
+
+def iter_frame_range(fp, header, start=0, length=0, chunk=CHUNK_SECTORS):
+    """Iterate over the frames [start, start+length) of a recording.
+    Only the sectors holding the requested frames are read.
+    Keyword arguments:
+    fp -- open binary file object of the disk (or disk image).
+    header -- header dict from read_header.
+    start -- first frame, relative to the start of the recording (default: 0).
+    length -- number of frames. 0 reads until the end of the recording (default: 0).
+    """
+    start, length = frame_range(header, start, length)
+    if length == 0:
+        return
+    first = start // FRAMES_PER_SECTOR
+    skip = start % FRAMES_PER_SECTOR
+    nsectors = -(-(skip + length) // FRAMES_PER_SECTOR)
+    left = length
+    for frames in read_frames(fp, header['sAddress'] + first, nsectors, chunk=chunk):
+        frames = frames[skip:skip + left]
+        skip = 0
+        left -= len(frames)
+        yield frames
+        if left <= 0:
+            break
+
+
+def frame_range(header, start=0, length=0):
+    """Clip a frame range to the recording. length=0 means until the end.
+    
+    return  start, length
+    """
+    nFrames = header['SD_Size'] * FRAMES_PER_SECTOR
+    start = min(max(int(start), 0), nFrames)
+    length = int(length)
+    if length <= 0 or start + length > nFrames:
+        length = nFrames - start
+    return start, length
+
+
+def read_frames(fp, sAddress, SD_Size, chunk=CHUNK_SECTORS):
+    """Iterate over the ADC frames of a recording in blocks of sectors.
+    Keyword arguments:
+    fp -- open binary file object of the disk (or disk image).
+    sAddress -- first sector of the recording.
+    SD_Size -- number of sectors of the recording.
+    chunk -- number of sectors read at once (default: CHUNK_SECTORS).
+    
+    Yields structured arrays of dtype ADC_frame_dtype (32 frames per sector).
+    """
+    fp.seek(sAddress * SECTOR_SIZE)
+    left = SD_Size
+    while left > 0:
+        n = min(chunk, left)
+        buf = fp.read(n * SECTOR_SIZE)
+        nframes = len(buf) // FRAME_SIZE
+        if nframes == 0:
+            print('End of disk reached. Sectors missing: ' + str(left))
+            break
+        yield np.frombuffer(buf, dtype=ADC_frame_dtype, count=nframes)
+        if len(buf) < n * SECTOR_SIZE:
+            print('End of disk reached. Sectors missing: ' + str(left - len(buf) // SECTOR_SIZE))
+            break
+        left -= n
+
+
+def write_frames_csv(f, frames):
+    """Write a block of ADC frames as csv rows (counter, hex, hex, hex).
+    The whole block is formatted with a single string operation.
+    """
+    if len(frames) == 0:
+        return
+    values = np.empty((len(frames), 4), dtype=np.uint32)
+    for i, name in enumerate(ADC_frame_dtype.names):
+        values[:, i] = frames[name]
+    f.write((_csv_row_ * len(frames)) % tuple(values.ravel().tolist()))
+
+
+def decode_frames(frames):
+    """Convert raw ADC frames (ADC_frame_dtype) to ADC_data_dtype.
+    The 4-byte samples are interpreted as big endian two's complement integers.
+    """
+    data = np.empty(len(frames), dtype=ADC_data_dtype)
+    data['counter'] = frames['counter']
+    for name in ADC_data_dtype.names[1:]:
+        data[name] = frames[name].view('>i4')
+    return data
+
+
+def save_frames_npy(file, fp, header, start=0, length=0):
+    """Decode a recording into a .npy file plus a .json file with the header.
+    Keyword arguments:
+    file -- path of the .npy file. The header is written to the same path with .json extension.
+    fp -- open binary file object of the disk.
+    header -- header dict from read_header (fName, sAddress, ADC_Size, SD_Size).
+    start, length -- range of frames to save (see iter_frame_range).
+    
+    The .npy file holds one structured array of dtype ADC_data_dtype and can be
+    memory mapped with load_ADC(). Returns the number of frames written.
+    """
+    start, length = frame_range(header, start, length)
+    out = np.lib.format.open_memmap(file, mode='w+', dtype=ADC_data_dtype, shape=(length,))
+    i = 0
+    for frames in iter_frame_range(fp, header, start, length):
+        out[i:i+len(frames)] = decode_frames(frames)
+        i += len(frames)
+    out.flush()
+    del out
+    
+    header = dict(header, startFrame=start, nFrames=i, dtype=ADC_data_dtype.descr)
+    with open(os.path.splitext(file)[0]+'.json', 'w') as f:
+        json.dump(header, f, indent=1)
+    if i < length:
+        print('Only {:d} of {:d} frames read. Remaining frames are zero.'.format(i, length))
+    return i
+
+
+def map_frames(disk, header):
+    """Memory map the frames of a recording in a disk image (or Linux block device).
+    The map is clipped to the end of the image if the recording is truncated.
+    
+    return  array of dtype ADC_frame_dtype, or None if the disk can't be memory mapped
+    """
+    offset = header['sAddress'] * SECTOR_SIZE
+    try:
+        with open(disk, 'rb') as fp:
+            fp.seek(0, os.SEEK_END)
+            size = fp.tell()
+        n = min(header['SD_Size'] * FRAMES_PER_SECTOR, max(size - offset, 0) // FRAME_SIZE)
+        if n == 0:
+            return np.zeros(0, dtype=ADC_frame_dtype)
+        return np.memmap(disk, dtype=ADC_frame_dtype, mode='r', offset=offset, shape=(n,))
+    except (OSError, ValueError):
+        return None
+
+
+def _decode_part(disk, header, file, output, start, length, offset):
+    """Worker of save_frames_parallel: decode frames [start, start+length).
+    npy output is written into the shared output file at position offset,
+    csv output to the shard file.
+    """
+    frames = map_frames(disk, header)
+    if frames is not None:
+        frames = frames[start:start+length]
+        blocks = (frames[i:i+CHUNK_SECTORS*FRAMES_PER_SECTOR]
+                  for i in range(0, len(frames), CHUNK_SECTORS*FRAMES_PER_SECTOR))
+    else:
+        fp = open(disk, 'rb')
+        blocks = iter_frame_range(fp, header, start, length)
+    
+    n = 0
+    if output == 'npy':
+        out = np.load(file, mmap_mode='r+')
+        for b in blocks:
+            out[offset+n:offset+n+len(b)] = decode_frames(b)
+            n += len(b)
+        out.flush()
+        del out
+    else:
+        with open(file, 'w', encoding='UTF8', newline='') as f:
+            for b in blocks:
+                write_frames_csv(f, b)
+                n += len(b)
+    if frames is None:
+        fp.close()
+    return n
+
+
+def save_frames_parallel(disk, file, header, start=0, length=0, output='npy', workers=0,
+                         part=PART_FRAMES, merge=True):
+    """Decode a range of frames with a pool of processes.
+    Keyword arguments:
+    disk -- the physical ID of the disk to read, or the path of a disk image.
+    file -- output file (.npy or .csv).
+    header -- header dict from read_header.
+    start, length -- range of frames to save (see iter_frame_range).
+    output -- 'npy' or 'csv' (default: 'npy').
+    workers -- number of processes (default: 0, all cores).
+    part -- number of frames decoded by one task (default: PART_FRAMES).
+    merge -- for csv output, join the shards into file. If False the shards
+             <file>_000.csv, <file>_001.csv, ... are kept (default: True).
+    
+    Disk images are memory mapped by every worker, so only the decoding is
+    distributed. Returns the number of frames written.
+    """
+    start, length = frame_range(header, start, length)
+    if workers <= 0:
+        workers = os.cpu_count()
+    bounds = [(a, min(part, start+length-a)) for a in range(start, start+length, part)]
+    
+    if output == 'npy':
+        out = np.lib.format.open_memmap(file, mode='w+', dtype=ADC_data_dtype, shape=(length,))
+        del out
+        targets = [file] * len(bounds)
+    else:
+        base = os.path.splitext(file)[0]
+        targets = [base + '_{:03d}.csv'.format(k) for k in range(len(bounds))]
+    
+    print('Decoding {:d} frames in {:d} parts with {:d} processes'.format(length, len(bounds), workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        counts = list(pool.map(_decode_part, [disk]*len(bounds), [header]*len(bounds), targets,
+                               [output]*len(bounds), [b[0] for b in bounds], [b[1] for b in bounds],
+                               [b[0]-start for b in bounds]))
+    n = sum(counts)
+    
+    if output == 'npy':
+        header = dict(header, startFrame=start, nFrames=n, dtype=ADC_data_dtype.descr)
+        with open(os.path.splitext(file)[0]+'.json', 'w') as f:
+            json.dump(header, f, indent=1)
+    elif merge:
+        with open(file, 'w', encoding='UTF8', newline='') as f:
+            write_csv_header(f, header, start, length)
+            for t in targets:
+                with open(t, 'r', encoding='UTF8', newline='') as fs:
+                    shutil.copyfileobj(fs, f, 2**24)
+                os.remove(t)
+    if n < length:
+        print('Only {:d} of {:d} frames read.'.format(n, length))
+    return n
+
+
+def load_ADC(file, mmap_mode='r'):
+    """Load ADC data written by save_frames_npy.
+    
+    return  frames (memory mapped structured array), header (dict)
+    """
+    frames = np.load(file, mmap_mode=mmap_mode)
+    with open(os.path.splitext(file)[0]+'.json', 'r') as f:
+        header = json.load(f)
+    return frames[:header.get('nFrames', len(frames))], header
+
+
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         # Print the arguments passed in from the command line
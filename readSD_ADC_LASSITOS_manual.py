@@ -1,77 +1,39 @@
 import os
-import csv
 import sys
+import readSD_ADC_LASSITOS
 
 
-def main(path='./',file='',start=2, length=3):  # Read the first sector of the first disk as example.
-    """file name of file where data are going to be saved. start=start sector, stop=stop sector"""
+def main(path='./',file='',start=2, length=3,output='csv',disk=''):  # Read the first sector of the first disk as example.
+    """file name of file where data are going to be saved. start=start sector, stop=stop sector, output='csv' or 'npy'
+    disk -- disk or disk image file to read. Default is the SD card drive of the OS.
+    
+    Kept for compatibility: readSD_ADC_LASSITOS.py reads any range of frames with start=..., length=...
+    """
     args = sys.argv[1:]
     if len(args) == 2 and args[0] == '-file':
         file=args[1]
-    if os.name == "nt":
-        # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
-        read_sector(r"\\.\physicaldrive1",0,path=path,file=file,start=start,length=length)
-        print('done')
-    else:
-        # Linux based OS normally uses '/dev/diskX' for disk drive identification.
-        print('use windows')
+    if disk=='':
+        if os.name == "nt":
+            # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
+            disk=r"\\.\physicaldrive1"
+        else:
+            # Linux based OS normally uses '/dev/diskX' for disk drive identification.
+            disk="/dev/disk0"
+    read_sector(disk,0,path=path,file=file,start=start,length=length,output=output)
+    print('done')
 
 
-def read_sector(disk, sector_no=0,path='./',file='',start=2,length=1):
-    """Read a single sector of the specified disk.
+def read_sector(disk, sector_no=0,path='./',file='',start=2,length=1,output='csv'):
+    """Read the header of the specified disk and save data from manually given sectors.
     Keyword arguments:
-    disk -- the physical ID of the disk to read.
-    sector_no -- the sector number to read (default: 0).
+    disk -- the physical ID of the disk to read, or the path of a disk image.
+    sector_no -- the sector number of the header (default: 0).
+    start -- first sector to read, overriding the start address of the header.
+    length -- number of sectors to read, overriding the SD size of the header.
+    output -- 'csv' for hex text output, 'npy' for decoded binary output (default: 'csv').
     """
-    # Static typed variable
-    read = None
-    # File operations with `with` syntax. To reduce file handeling efforts.
-    with open(disk, 'rb') as fp:
-        fp.seek(sector_no * 512)
-        read = fp.read(12)
-        fName = read.decode()[:-2]
-        read = fp.read(4)
-        sAddress = int.from_bytes(read,"little")
-        read = fp.read(4)
-        ADC_Size = int.from_bytes(read,"little")
-        read = fp.read(4)
-        SD_Size = int.from_bytes(read,"little")
-
-        print('header start address = ' + str(sAddress))
-        print('ADC size = ' + str(ADC_Size))
-        print('header SD frames = ' + str(SD_Size))
-        print('File Name = ' + str(fName))
-        print('manualstart address = ' + str(start))
-        print('manualSD frames = ' + str(length))
-        SD_Size=int(length)
-        sAddress=int(start)
-        
-        
-        if file=='':
-            file=path+'ADC'+str(fName[:6])+'_'+str(fName[6:])+'.csv'
-        else:
-            file=path+file
-        print('File path = ' + file)
-        
-        
-        
-        fp.seek(sAddress * 512)
-        #read = fp.read(16)
-        
-        
-        with open(file, 'w', encoding='UTF8', newline='') as f:
-            f.write('#File Name = ' + str(fName)+'\n') 
-            f.write('#ADC size = ' + str(ADC_Size)+'\n')           
-            f.write('#SD frames = ' + str(SD_Size)+'\n')           
-            f.write('## \n')
-            
-            writer = csv.writer(f)
-            for i in range(sAddress, SD_Size+sAddress):
-                read = fp.read(512)
-                for j in range(0,32):
-                    writer.writerow([int.from_bytes(read[j*16:j*16+4], 'little'), read[j*16+4:j*16+8].hex(), read[j*16+8:j*16+12].hex(), read[j*16+12:j*16+16].hex()])
-     
-    return read
+    return readSD_ADC_LASSITOS.read_sector(disk, sector_no, path=path, file=file, output=output,
+                                           sAddress=int(start), SD_Size=int(length))
 
 
 if __name__ == "__main__":
@@ -89,4 +51,4 @@ if __name__ == "__main__":
         else:
             main()
     else:
-        main()
\ No newline at end of file
+        main()
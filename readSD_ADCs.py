@@ -1,55 +1,55 @@
 import os
-import csv
 import sys
+from readSD_ADC_LASSITOS import read_header, iter_frame_range, write_frames_csv, save_frames_npy
 
 
-def main(file='./test1.csv'):  # Read the first sector of the first disk as example.
-    """Demo usage of function."""
-    file='./test1.csv'
+def main(file='',output='csv',disk='',start=0,length=0):  # Read the first sector of the first disk as example.
+    """Demo usage of function. output='csv' (hex text) or 'npy' (binary).
+    file -- output file. Default is ./test1.csv or ./test1.npy, following output.
+    disk -- disk or disk image file to read. Default is the SD card drive of the OS.
+    start, length -- range of frames to decode, relative to the start of the recording (length=0: until end).
+    """
+    if file=='':
+        file='./test1.npy' if output=='npy' else './test1.csv'
     args = sys.argv[1:]
     if len(args) == 2 and args[0] == '-file':
         file=args[1]
-    if os.name == "nt":
-        # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
-        read_sector(r"\\.\physicaldrive1",0,file=file)
-        print('done')
-    else:
-        # Linux based OS normally uses '/dev/diskX' for disk drive identification.
-        print(read_sector("/dev/disk0"),file=file)
-
-
-def read_sector(disk, sector_no=0,file='./test1.csv'):
-    """Read a single sector of the specified disk.
+    if disk=='':
+        if os.name == "nt":
+            # Windows based OS normally uses '\\.\physicaldriveX' for disk drive identification.
+            disk=r"\\.\physicaldrive1"
+        else:
+            # Linux based OS normally uses '/dev/diskX' for disk drive identification.
+            disk="/dev/disk0"
+    read_sector(disk,0,file=file,output=output,start=int(start),length=int(length))
+    print('done')
+
+
+def read_sector(disk, sector_no=0,file='./test1.csv',output='csv',start=0,length=0):
+    """Read the header sector of the specified disk and save the ADC data of the recording.
     Keyword arguments:
-    disk -- the physical ID of the disk to read.
-    sector_no -- the sector number to read (default: 0).
+    disk -- the physical ID of the disk to read, or the path of a disk image.
+    sector_no -- the sector number of the header (default: 0).
+    output -- 'csv' for hex text output, 'npy' for decoded binary output (default: 'csv').
+    start, length -- range of frames to save (length=0: until end of recording).
     """
     # Static typed variable
     read = None
     # File operations with `with` syntax. To reduce file handeling efforts.
     with open(disk, 'rb') as fp:
-        fp.seek(sector_no * 512)
-        read = fp.read(10)
-        fName = read.decode()
-        read = fp.read(4)
-        sAddress = int.from_bytes(read,"little")
-        read = fp.read(4)
-        ADC_Size = int.from_bytes(read,"little")
-        read = fp.read(4)
-        SD_Size = int.from_bytes(read,"little")
-
-        print('start address = ' + str(sAddress))
-        print('SD frames = ' + str(SD_Size))
+        header = read_header(fp, sector_no, legacy=True)
+
+        print('start address = ' + str(header['sAddress']))
+        print('SD frames = ' + str(header['SD_Size']))
         
-        fp.seek(sAddress * 512)
-        #read = fp.read(16)
+        if output=='npy':
+            save_frames_npy(file, fp, header, start=start, length=length)
+            return None
 
         with open(file, 'w', encoding='UTF8', newline='') as f:
-            writer = csv.writer(f)
-            for i in range(sAddress, SD_Size+sAddress):
-                read = fp.read(512)
-                for j in range(0,32):
-                    writer.writerow([int.from_bytes(read[j*16:j*16+4], 'little'), read[j*16+4:j*16+8].hex(), read[j*16+8:j*16+12].hex(), read[j*16+12:j*16+16].hex()])
+            for frames in iter_frame_range(fp, header, start, length):
+                write_frames_csv(f, frames)
+                read = frames
                     
             
        
@@ -57,4 +57,5 @@ def read_sector(disk, sector_no=0,file='./test1.csv'):
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    kwargs = dict(arg.split('=') for arg in sys.argv[1:] if '=' in arg)
+    main(**kwargs)
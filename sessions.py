@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Merging of message data from several sessions (files) into one time-ordered set.
+Used by UBX2data.concat and INSLASERdata.concat.
+"""
+
+import numpy as np
+
+
+def columns(m):
+    """
+    Names of the data columns of a message object: the names in m.keys (plus t) if
+    the message keeps a list of its columns (INSLASERdata), else all arrays with one
+    value per record. Private attributes (names starting with '_') are not columns.
+
+    return  list of names
+    """
+    n=len(getattr(m,'t',[]))
+    keys=getattr(m,'keys',None)
+    if isinstance(keys,list):
+        names=keys+['t'] if 't' not in keys else list(keys)
+        return [a for a in names if isinstance(getattr(m,a,None),np.ndarray)
+                and getattr(m,a).ndim>0 and len(getattr(m,a))==n]
+    return [a for a,v in m.__dict__.items() if a[:1]!='_' and isinstance(v,np.ndarray)
+            and v.ndim>0 and len(v)==n]
+
+
+def subset_msg(m,lim,out):
+    """
+    Copy records lim[0]:lim[1] of message object m into out. Columns (see columns)
+    are sliced, lists (keys) are copied and other attributes are taken as they are.
+
+    return  out
+    """
+    cols=columns(m)
+    for a,v in m.__dict__.items():
+        if a in cols:
+            setattr(out,a,np.array(v[lim[0]:lim[1]]))
+        elif isinstance(v,list):
+            setattr(out,a,list(v))
+        else:
+            setattr(out,a,v)
+    out.len=max(int(lim[1])-int(lim[0]),0)
+    return out
+
+
+def merge_msg(msgs,out,rows=False):
+    """
+    Concatenate the columns of message objects (MSG_type) from several sessions.
+
+    msgs:   message objects with absolute time t (see gpstime.py), one per session
+    out:    empty message object to fill
+    rows:   if True, out.rows holds for each merged record its row number in the
+            input sessions counted in the order given (row i of msgs[j] is
+            sum(len(msgs[:j].t))+i). Used to re-index references between messages.
+
+    Sessions are taken in order of their first time stamp. Records of a session
+    that are not later than the last record already taken (overlapping files)
+    are dropped as duplicates. The result is sorted by t (stable sort, so records
+    with equal time keep their order). Only columns present in all sessions are
+    merged (see columns). Attributes that are not columns (settings) are taken from
+    the first session, lists (keys) are copied.
+
+    return  out
+    """
+    n=[len(m.t) if isinstance(getattr(m,'t',None),np.ndarray) else 0 for m in msgs]
+    start=np.cumsum([0]+n)
+    msgs=[(m,s) for m,s,k in zip(msgs,start,n) if k>0]
+    if len(msgs)==0:
+        out.len=0
+        if rows:
+            out.rows=np.zeros(0,dtype=np.int64)
+        return out
+    msgs=sorted(msgs,key=lambda m:m[0].t[0])
+    start=[s for m,s in msgs]
+    msgs=[m for m,s in msgs]
+
+    cols=[a for a in columns(msgs[0]) if all(a in columns(m) for m in msgs[1:])]
+
+    keep=[]
+    t_end=None
+    for m in msgs:
+        k=np.ones(len(m.t),dtype=bool) if t_end is None else m.t>t_end
+        keep.append(k)
+        if k.any():
+            t_end=m.t[k].max() if t_end is None else max(t_end,m.t[k].max())
+
+    t=np.concatenate([m.t[k] for m,k in zip(msgs,keep)])
+    order=np.argsort(t,kind='stable')
+    del t
+    for a in cols:
+        setattr(out,a,np.concatenate([getattr(m,a)[k] for m,k in zip(msgs,keep)])[order])
+    for a,v in msgs[0].__dict__.items():
+        if a in cols or hasattr(out,a):
+            continue
+        if isinstance(v,np.ndarray) and v.ndim>0 and len(v)==len(msgs[0].t):
+            continue    # private or not in all sessions
+        if a=='keys' and isinstance(v,list):
+            v=[k for k in v if k in cols]
+        setattr(out,a,list(v) if isinstance(v,list) else v)
+    if rows:
+        out.rows=np.concatenate([s+np.flatnonzero(k) for s,k in zip(start,keep)])[order]
+    out.len=len(order)
+    return out
+
+
+def merge_stats(stats,out):
+    """
+    Merge MSG_stats (other/corrupt messages) of several sessions into out.
+    """
+    for s in stats:
+        out.n+=s.n
+        for k,c in s.count.items():
+            out.count[k]=out.count.get(k,0)+c
+            out.bytes[k]=out.bytes.get(k,0)+s.bytes.get(k,0)
+            smp=out.samples.setdefault(k,[])
+            smp.extend(s.samples.get(k,[])[:max(out.nsample-len(smp),0)])
+        if out.keep:
+            out.items.extend(s.items)
+    return out
@@ -46,5 +46,5 @@ data=INSLASERdata(filepath+r'\INS9800106_0256.dat',name='trst',correct_Laser=Fal
 check_data(data)
 
 
-dTOW_laser=np.diff(data.Laser.TOW)
-dTOW_PINS=np.diff(data.PINS1.TOW)
+print(data.Laser.gaps.summary())
+print(data.PINS1.gaps.summary())
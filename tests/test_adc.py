@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+ADC frame readers (readSD_ADC_LASSITOS.py, readSD_ADCs.py) on disk images.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+import readSD_ADC_LASSITOS as adc
+import readSD_ADCs
+
+
+def disk_image(file,nsectors=5,sAddress=3,legacy=False,seed=0):
+    """
+    Disk image with a header in sector 0 and nsectors of frames from sector sAddress.
+
+    return  frames written (ADC_frame_dtype)
+    """
+    rng=np.random.default_rng(seed)
+    frames=np.zeros(nsectors*adc.FRAMES_PER_SECTOR,dtype=adc.ADC_frame_dtype)
+    frames['counter']=np.arange(len(frames))
+    for c in ['ch1','ch2','ch3']:
+        frames[c]=rng.integers(0,2**32,len(frames),dtype=np.uint32)
+    name=b'2407011200' if legacy else b'240701120000'
+    header=name+np.array([sAddress,3*len(frames),nsectors],dtype='<u4').tobytes()
+    with open(file,'wb') as f:
+        f.write(header.ljust(sAddress*adc.SECTOR_SIZE,b'\0'))
+        f.write(frames.tobytes())
+    return frames
+
+
+def signed(u):
+    return u.astype(np.uint32).view(np.int32)
+
+
+def test_main_output_file(tmp_path):
+    disk=str(tmp_path/'legacy.img')
+    frames=disk_image(disk,legacy=True)
+    for output in ['npy','csv']:
+        file=str(tmp_path/('out.'+output))
+        readSD_ADCs.main(file=file,output=output,disk=disk)
+        assert os.path.isfile(file)
+    data,header=adc.load_ADC(str(tmp_path/'out.npy'))
+    assert header['fName']=='2407011200'
+    assert np.array_equal(data['counter'],frames['counter'])
+    assert np.array_equal(data['ch2'],signed(frames['ch2']))
+
+
+def test_csv_frames(tmp_path):
+    disk=str(tmp_path/'disk.img')
+    frames=disk_image(disk)
+    adc.read_sector(disk,path=str(tmp_path)+os.sep,file='out.csv')
+    with open(str(tmp_path/'out.csv')) as f:
+        rows=[l.strip().split(',') for l in f if l[0]!='#']
+    assert len(rows)==len(frames)
+    assert [int(r[0]) for r in rows]==frames['counter'].tolist()
+    assert [int(r[3],16) for r in rows]==frames['ch3'].tolist()
+
+
+def test_decode_frames():
+    frames=np.zeros(3,dtype=adc.ADC_frame_dtype)
+    frames['ch1']=[0,1,2**32-1]
+    frames['ch2']=[2**31,2**31-1,5]
+    data=adc.decode_frames(frames)
+    assert data['ch1'].tolist()==[0,1,-1]
+    assert data['ch2'].tolist()==[-2**31,2**31-1,5]
+
+
+def test_frame_range(tmp_path):
+    disk=str(tmp_path/'disk.img')
+    frames=disk_image(disk)
+    with open(disk,'rb') as fp:
+        header=adc.read_header(fp)
+        assert header['fName']=='2407011200'
+        assert header['nFrames']==len(frames)
+        got=np.concatenate(list(adc.iter_frame_range(fp,header,start=40,length=70,chunk=1)))
+        assert np.array_equal(got,frames[40:110])
+        got=np.concatenate(list(adc.iter_frame_range(fp,header,start=150)))
+        assert np.array_equal(got,frames[150:])
+    assert np.array_equal(adc.map_frames(disk,header),frames)
+
+
+def test_truncated_image(tmp_path):
+    disk=str(tmp_path/'disk.img')
+    frames=disk_image(disk)
+    with open(disk,'r+b') as f:
+        f.truncate(os.path.getsize(disk)-adc.SECTOR_SIZE-8)
+    with open(disk,'rb') as fp:
+        header=adc.read_header(fp)
+        got=np.concatenate(list(adc.iter_frame_range(fp,header)))
+    assert np.array_equal(got,frames[:len(got)])
+    assert len(got)==len(frames)-adc.FRAMES_PER_SECTOR-1
+    assert len(adc.map_frames(disk,header))==len(got)
+
+
+def test_parallel_matches_serial(tmp_path):
+    disk=str(tmp_path/'disk.img')
+    disk_image(disk,nsectors=9)
+    with open(disk,'rb') as fp:
+        header=adc.read_header(fp)
+        adc.save_frames_npy(str(tmp_path/'serial.npy'),fp,header,start=5,length=200)
+    n=adc.save_frames_parallel(disk,str(tmp_path/'parallel.npy'),header,start=5,length=200,
+                               workers=2,part=64)
+    assert n==200
+    serial=adc.load_ADC(str(tmp_path/'serial.npy'))[0]
+    parallel=adc.load_ADC(str(tmp_path/'parallel.npy'))[0]
+    assert np.array_equal(serial,parallel)
+
+    adc.save_frames_parallel(disk,str(tmp_path/'parallel.csv'),header,start=5,length=200,
+                             output='csv',workers=2,part=64)
+    with open(str(tmp_path/'parallel.csv')) as f:
+        rows=[l for l in f if l[0]!='#']
+    assert [int(r.split(',')[0]) for r in rows]==serial['counter'].tolist()
+    assert not [f for f in os.listdir(str(tmp_path)) if f.startswith('parallel_')]
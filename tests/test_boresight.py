@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Boresight calibration (boresight.calibrate) over flat ground: the mounting angles
+are recovered, inseparable parameters are reported as not converged.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+import UBX2data
+import boresight
+
+
+def flat_session(pitch0=1.5,roll0=-0.8,distCenter=0.35,climb=20.,duration=300,seed=0):
+    """
+    UBX2data with PVAT (10 Hz) and laser (20 Hz) over flat ground at 0 m, the laser
+    calibration pitch0, roll0, distCenter and climb (m amplitude) of the flight height
+    """
+    rng=np.random.default_rng(seed)
+    d=UBX2data.UBX2data('flat.ubx',load=False)
+    tt=np.arange(0,duration,0.1)
+    n=UBX2data.MSG_type()
+    n.t=(tt*1e9).astype(np.int64)+10**18
+    n.lat=78+tt*40/111000
+    n.lon=15+0.01*np.sin(2*np.pi*tt/120)
+    n.height=(50+climb*np.sin(2*np.pi*tt/60))*1000
+    n.vehPitch=4*np.sin(2*np.pi*tt/7)+1
+    n.vehRoll=6*np.sin(2*np.pi*tt/11)
+    n.len=len(tt)
+    d.PVAT=n
+    L=UBX2data.MSG_type()
+    tl=np.arange(0,duration-0.1,0.05)
+    L.t=(tl*1e9).astype(np.int64)+10**18
+    P=np.radians(np.interp(tl,tt,n.vehPitch)-pitch0)
+    R=np.radians(np.interp(tl,tt,n.vehRoll)-roll0)
+    L.h=(np.interp(tl,tt,n.height)/1000+distCenter*np.sin(P))/(np.cos(P)*np.cos(R))
+    L.h+=rng.normal(0,0.01,len(tl))
+    L.h[::97]+=5
+    L.h_corr=L.h.copy()
+    L.pitch0,L.roll0,L.distCenter,L.c_pitch,L.c_roll=0.,0.,distCenter,1,1
+    L.len=len(tl)
+    d.Laser=L
+    return d
+
+
+def test_flat_angles():
+    res=boresight.calibrate(flat_session(),verbose=False)
+    assert res['converged']
+    assert set(res['std'])=={'pitch0','roll0'}
+    assert abs(res['params']['pitch0']-1.5)<0.02
+    assert abs(res['params']['roll0']+0.8)<0.02
+    assert res['params']['distCenter']==0.35
+    assert res['rms']<0.02
+
+
+def test_flat_distCenter_degenerate():
+    res=boresight.calibrate(flat_session(climb=0.),fit=('pitch0','roll0','distCenter'),verbose=False)
+    assert not res['converged']
+
+
+def test_flat_distCenter_climb():
+    res=boresight.calibrate(flat_session(),fit=('pitch0','roll0','distCenter'),verbose=False)
+    assert res['converged']
+    assert abs(res['params']['distCenter']-0.35)<0.05
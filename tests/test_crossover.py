@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Crossover analysis (crossover.py): all crossings of two grids of flight lines are
+found and the elevation differences give the bias between the sessions.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+import UBX2data
+import crossover
+import georef
+
+E0,N0=500000.,8600000.
+
+
+def ground(x,y):
+    return 0.5*np.sin(x/300)+0.3*np.cos(y/200)
+
+
+def utm2ll(x,y):
+    """
+    Inverse of georef.ll2utm (zone 33 north) by iteration
+    """
+    lat=np.full(len(x),77.5)
+    lon=np.full(len(x),15.)
+    for it in range(6):
+        E,N,_,_=georef.ll2utm(lat,lon,33,True)
+        lat+=(y-N)/111000
+        lon+=(x-E)/(111000*np.cos(np.radians(lat)))
+    return lat,lon
+
+
+def session(offsets,vertical,t0=0.,bias=0.,rate=10,laser_rate=20,speed=40):
+    """
+    UBX2data with lines of 3 km at offsets (m), along north if vertical, flown back and forth.
+    The laser height h_corr is biased by bias (m).
+    """
+    xs,ys,ts=[],[],[]
+    t=t0
+    for k,off in enumerate(offsets):
+        s=np.arange(0,3000,speed/rate)
+        s=s if k%2==0 else 3000-s
+        x,y=(np.full_like(s,off),s) if vertical else (s,np.full_like(s,off))
+        xs.append(x)
+        ys.append(y)
+        ts.append(t+np.arange(len(s))/rate)
+        t=ts[-1][-1]+20
+    x,y,tt=np.concatenate(xs),np.concatenate(ys),np.concatenate(ts)
+    d=UBX2data.UBX2data('lines.ubx',load=False)
+    n=UBX2data.MSG_type()
+    n.t=(tt*1e9).astype(np.int64)+10**18
+    n.lat,n.lon=utm2ll(x+E0,y+N0)
+    n.height=np.full(len(tt),50.)*1000
+    n.len=len(tt)
+    d.PVAT=n
+    L=UBX2data.MSG_type()
+    tl=np.arange(tt[0],tt[-1],1/laser_rate)
+    L.t=(tl*1e9).astype(np.int64)+10**18
+    L.h=50-ground(np.interp(tl,tt,x),np.interp(tl,tt,y))
+    L.h_corr=L.h+bias
+    L.len=len(tl)
+    d.Laser=L
+    return d
+
+
+def test_crossings():
+    A=session([500,1000,1500,2000],False)
+    B=session([300,900,1500,2100,2700],True,t0=5000,bias=0.3)
+    c=crossover.crossovers([A,B])
+    assert len(c['x'])==20
+    assert np.all((c['session1']==0)&(c['session2']==1))
+    assert np.all(np.abs(c['angle']-90)<0.5)
+    xy=np.round(np.column_stack((c['x']-E0,c['y']-N0)))
+    grid={(x,y) for x in [300,900,1500,2100,2700] for y in [500,1000,1500,2000]}
+    assert {tuple(p) for p in xy}==grid
+    s=crossover.summary(c)
+    assert s['n']==20
+    assert abs(s['mean']-0.3)<0.01
+    assert s['std']<0.01
+
+
+def test_same_session():
+    # lines of one session crossing each other, passes at least min_dt apart
+    A=session([500,1000],False)
+    B=session([900,1500],True,t0=(A.PVAT.t[-1]-10**18)*1e-9+20)
+    for m in ['PVAT','Laser']:
+        a,b=getattr(A,m),getattr(B,m)
+        for k in a.__dict__:
+            if isinstance(getattr(a,k),np.ndarray):
+                setattr(a,k,np.concatenate((getattr(a,k),getattr(b,k))))
+        a.len=len(a.t)
+    c=crossover.crossovers(A)
+    assert len(c['x'])==4
+    assert np.all(c['session1']==c['session2'])
+    assert np.all(np.abs(c['dz'])<0.01)
+    assert crossover.summary(c,min_angle=95)['n']==0
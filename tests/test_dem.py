@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+DEM (dem.py): cell statistics, tiling, filling and the ASCII grid.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+from dem import DEM
+
+
+def random_points(n=20000,size=50.,seed=0):
+    rng=np.random.default_rng(seed)
+    x=500000+rng.uniform(0,size,n)
+    y=8600000+rng.uniform(0,size,n)
+    z=10+0.1*(x-500000)-0.05*(y-8600000)+rng.normal(0,0.1,n)
+    return x,y,z
+
+
+def test_cell_statistics():
+    x,y,z=random_points()
+    dem=DEM.from_points(x,y,z,res=5.,median=True)
+    assert dem.count.sum()==len(x)
+    row,col=dem.cell(x,y)
+    k=(row==3)&(col==4)
+    assert dem.count[3,4]==k.sum()
+    assert np.isclose(dem.mean[3,4],z[k].mean())
+    assert np.isclose(dem.std[3,4],z[k].std(ddof=1))
+    assert np.isclose(dem.median[3,4],np.median(z[k]))
+    assert dem.z is dem.median
+    xc,yc=dem.xy()
+    assert xc[4]==dem.x0+22.5 and yc[3]==dem.y0-17.5
+
+
+def test_tiles():
+    x,y,z=random_points()
+    a=DEM.from_points(x,y,z,res=2.,median=True)
+    b=DEM.from_points(x,y,z,res=2.,median=True,tile=7)
+    assert np.array_equal(a.count,b.count)
+    assert np.allclose(a.mean,b.mean,equal_nan=True)
+    assert np.allclose(a.median,b.median,equal_nan=True)
+
+
+def test_idw_fill():
+    pytest.importorskip('scipy')
+    x,y,z=random_points(n=2000)
+    hole=(np.abs(x-500025)<4)&(np.abs(y-8600025)<4)
+    dem=DEM.from_points(x[~hole],y[~hole],z[~hole],res=2.,bounds=[500000,8600000,500050,8600050])
+    empty=~np.isfinite(dem.z)
+    assert empty.any()
+    z0=dem.z.copy()
+    dem.idw(max_dist=10)
+    assert np.all(np.isfinite(dem.z))
+    assert np.array_equal(dem.z[~empty],z0[~empty])
+    xc,yc=dem.xy()
+    X,Y=np.meshgrid(xc,yc)
+    truth=10+0.1*(X-500000)-0.05*(Y-8600000)
+    assert np.max(np.abs(dem.z-truth)[empty])<0.5
+
+
+def test_write_ascii(tmp_path):
+    x,y,z=random_points(n=500)
+    dem=DEM.from_points(x,y,z,res=5.,bounds=[500000,8600000,500060,8600050])
+    file=str(tmp_path/'dem.asc')
+    dem.write_ascii(file)
+    grid=np.loadtxt(file,skiprows=6)
+    assert grid.shape==(10,12)
+    assert np.all(grid[:,-2:]==-9999)
+    assert np.allclose(grid[:,:10],dem.mean[:,:10],atol=0.001)
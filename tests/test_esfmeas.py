@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+ESF-MEAS decoding (UBX2data.decode_ESF_MEAS, ESF_MEAS): sensor values, time tags
+and subsets.
+"""
+
+import os
+import sys
+import struct
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+import UBX2data
+from gpstime import gps_ns
+
+
+def payload(timeTag,meas):
+    """
+    ESF-MEAS payload with measurements meas: list of (dataType, 24 bit field)
+    """
+    words=b''.join(struct.pack('<I',(t<<24)|(v&0xFFFFFF)) for t,v in meas)
+    return struct.pack('<IHH',timeTag,len(meas)<<11,0)+words
+
+
+def test_decode_values():
+    p=[payload(1000,[(5,-4096),(14,2048),(16,1024)]),payload(1010,[(5,8192),(11,-1500),(6,(1<<23)|7)])]
+    tag,iTOW,offset,s=UBX2data.decode_ESF_MEAS(p,np.array([500,-1]))
+    assert offset==-500
+    assert tag.tolist()==[1000,1010]
+    assert iTOW.tolist()==[500,510]
+    assert s['gyroZ'][2].tolist()==[-1.,2.]
+    assert s['gyroZ'][1].tolist()==[500,510]
+    assert s['gyroX'][2].tolist()==[0.5]
+    assert s['accX'][2].tolist()==[1.]
+    assert s['speed'][2].tolist()==[-1.5]
+    assert s['wtFL'][2].tolist()==[(1<<23)|7]
+
+
+def test_time_tag_rollover():
+    p=[payload(2**32-10,[(5,0)]),payload(5,[(5,0)]),payload(20,[(5,0)])]
+    tag,iTOW,offset,s=UBX2data.decode_ESF_MEAS(p,offset=0)
+    assert np.all(np.diff(tag)==[15,15])
+    assert tag[1]==2**32+5
+
+
+def test_truncated_payload():
+    p=[payload(1000,[(5,4096),(14,4096)])[:-4],payload(1010,[(5,4096)])]
+    tag,iTOW,offset,s=UBX2data.decode_ESF_MEAS(p,offset=0)
+    assert s['gyroZ'][2].tolist()==[1.,1.]
+    assert 'gyroX' not in s
+
+
+def test_extract_subset():
+    m=UBX2data.ESF_MEAS()
+    for k in range(20):
+        # complete UBX frame: header (6 bytes), payload, checksum (2 bytes)
+        m.add(b'\xb5b\x10\x02\x00\x00'+payload(100*k,[(5,4096*k),(16,1024)])+b'\0\0',100*k+50 if k else -1)
+    m.extract()
+    assert m.sensors==['gyroZ','accX']
+    assert np.array_equal(m.gyroZ.value,np.arange(20.))
+    m.t=gps_ns(2300,m.iTOW,'ms')
+    for s in m.sensors:
+        getattr(m,s).t=gps_ns(2300,getattr(m,s).iTOW,'ms')
+    d=m.subset(m.t[[5,15]])
+    assert d.len==10
+    assert all(isinstance(r,bytes) for r in d.raw)
+    assert np.array_equal(d.gyroZ.value,np.arange(5.,15.))
+    assert d.accX.len==10
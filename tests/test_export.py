@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Export (export.py): Parquet and LAS files read back give the data that were written.
+"""
+
+import os
+import sys
+import numpy as np
+import pytest
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+sys.path.insert(0,os.path.join(root,'benchmarks'))
+
+import INSLASERdata
+import UBX2data
+import export
+import georef
+import synthetic
+
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    file=str(tmp_path_factory.mktemp('ins')/'flight.txt')
+    synthetic.write_nmea_laser(file,duration=120)
+    return INSLASERdata.INSLASERdata(file,distCenter=0.5)
+
+
+def test_parquet_round_trip(data,tmp_path):
+    pytest.importorskip('pyarrow')
+    files=export.write_parquet(data,str(tmp_path),row_group=30)
+    assert len(files)==len([m for m in data.MSG_list if data.__dict__[m].len>0])
+    d=export.read_parquet(str(tmp_path),'Laser')
+    for k in ['t','h','h_corr','pitch_ins']:
+        assert np.array_equal(d[k],getattr(data.Laser,k))
+        assert d[k].dtype==getattr(data.Laser,k).dtype
+    t0,t1=data.PINS1.t[1000],data.PINS1.t[2000]
+    d=export.read_parquet(str(tmp_path),'PINS1',timelim=[t0,t1],columns=['roll'])
+    assert sorted(d)==['roll','t']
+    assert np.array_equal(d['roll'],data.PINS1.roll[1000:2001])
+
+
+def test_parquet_private_columns(tmp_path):
+    pytest.importorskip('pyarrow')
+    d=UBX2data.UBX2data('flight.ubx',name='flight.ubx',load=False)
+    m=UBX2data.MSG_type()
+    m.t=np.arange(10,dtype=np.int64)*10**8
+    m.iTOW=np.arange(10,dtype=np.uint32)*100
+    m._payload=np.zeros(10,dtype='S4')
+    m._checksum=np.zeros(10,dtype='S2')
+    m._length=20
+    m.len=10
+    d.PVAT=m
+    export.write_parquet(d,str(tmp_path),msgs=['PVAT'])
+    assert sorted(export.read_parquet(str(tmp_path),'PVAT'))==['iTOW','t']
+
+
+def test_las_round_trip(data,tmp_path):
+    file=str(tmp_path/'flight.las')
+    export.write_las(data,file,chunk=1000)
+    las=export.read_las(file)
+    p=georef.laser_points(data)
+    assert len(las['x'])==len(p['x'])
+    for k in 'xyz':
+        assert np.max(np.abs(las[k]-p[k]))<=0.001
+    assert np.array_equal(las['classification'],np.ones(len(p['x']),dtype=np.uint8))
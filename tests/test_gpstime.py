@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+GPS time (gpstime.py): week rollover, alignment of time of week and leap seconds.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+from gpstime import (WEEK_NS, gps_ns, unwrap_tow, align_tow, leap_seconds, gps2utc, utc2gps,
+                     utc_fields2gps, week_from_utc_fields, time_limits)
+
+
+def test_week_rollover():
+    tow=np.array([604799.5,604799.9,0.3,0.7])
+    t=gps_ns(np.array([2300,2300,2301,2301]),tow,'s')
+    assert np.all(np.diff(t)>0)
+    assert np.array_equal(unwrap_tow(tow,2300,'s'),t)
+    # tow in ms, laser data of the same file
+    assert np.array_equal(align_tow((tow*1000).astype(np.int64),t[2:],tow[2:]*1000,'ms'),t)
+
+
+def test_align_before_reference():
+    # laser data starting in the week before the first reference message
+    t_ref=gps_ns(2301,np.array([0.5]),'s')
+    t=align_tow(np.array([604799.8,0.2,0.6]),t_ref,np.array([0.5]),'s')
+    assert t[0]//WEEK_NS==2300
+    assert np.all(np.diff(t)>0)
+
+
+def test_leap_seconds():
+    assert leap_seconds(utc2gps(np.datetime64('2016-12-31T23:59:59')))==17
+    assert leap_seconds(utc2gps(np.datetime64('2017-01-01T00:00:00')))==18
+    utc=np.array(['1980-01-06T00:00:00','2016-12-31T23:59:59','2024-03-01T12:00:00.123456789'],
+                 dtype='datetime64[ns]')
+    t=utc2gps(utc)
+    assert t[0]==0
+    assert np.array_equal(gps2utc(t),utc)
+    assert t[2]-(utc[2]-np.datetime64('1980-01-06','ns')).astype(np.int64)==18*10**9
+
+
+def test_utc_fields():
+    t=utc_fields2gps(2024,3,1,12,0,0,500)
+    assert t==utc2gps(np.datetime64('2024-03-01T12:00:00.000000500'))
+    iTOW=(t%WEEK_NS)//10**6
+    assert week_from_utc_fields(iTOW,2024,3,1,12,0,0,500)==t//WEEK_NS
+
+
+def test_time_limits():
+    t=gps_ns(2300,np.arange(604790,604810)%604800,'s')+WEEK_NS*(np.arange(20)>=10)
+    tow=(t%WEEK_NS)//10**9
+    assert np.array_equal(time_limits(t,tow,[2,12],'s'),t[[2,12]])
+    assert np.array_equal(time_limits(t,tow,[604795,3],'TOW'),t[[5,13]])
+    assert np.array_equal(time_limits(t,tow,gps2utc(t[[4,6]]),'utc'),t[[4,6]])
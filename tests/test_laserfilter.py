@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Despiking of laserfilter.filter_laser: clean data with a varying surface passes,
+spikes are removed.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+sys.path.insert(0,os.path.join(root,'benchmarks'))
+
+from laserfilter import filter_laser
+import synthetic
+
+
+def test_sine_passes():
+    t=np.arange(6000)/10
+    h=30+0.5*np.sin(2*np.pi*t/2.1)+np.random.default_rng(0).normal(0,0.01,len(t))
+    assert filter_laser(h)[1].mean()>=0.99
+
+
+def test_synthetic_flight_passes():
+    t=np.arange(6000)/10
+    h,signQ,T=synthetic.laser_signal(t,np.random.default_rng(1))
+    assert filter_laser(h,signQ,T)[1].mean()>=0.99
+
+
+def test_spikes_removed():
+    t=np.arange(6000)/10
+    truth=synthetic.trajectory(t)['range']
+    h,signQ,T=synthetic.laser_signal(t,np.random.default_rng(2),spikes=0.02)
+    spike=np.abs(h-truth)>0.1
+    h_filt,valid=filter_laser(h,signQ,T)
+    assert not valid[spike].any()
+    assert valid[~spike].mean()>=0.99
+    assert np.all(np.isnan(h_filt[~valid]))
+
+
+def test_dropouts():
+    h=np.full(100,50.)
+    h[10:20]=np.nan
+    h[30]=-999
+    valid=filter_laser(h)[1]
+    assert not valid[10:20].any() and not valid[30]
+    assert valid[40:].all()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Column dtypes (msgschema.py): scaled UBX fields keep their resolution.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+
+from msgschema import UBX_schema, column_dtype
+
+
+def test_angle_resolution():
+    # 1e-5 deg up to 360 deg
+    v=359.99999
+    for msg,fields in [('PVT',['headMot','headAcc','headVeh']),
+                       ('PVAT',['vehRoll','vehPitch','vehHeading','motHeading']),
+                       ('ATT',['roll','pitch','heading'])]:
+        for f in fields:
+            assert abs(np.array(v,dtype=column_dtype(UBX_schema[msg],f,v))-v)<1e-6,msg+'.'+f
+
+
+def test_lat_lon_resolution():
+    # 1e-7 deg
+    v=-179.9999999
+    for msg in ['PVT','PVAT']:
+        for f in ['lat','lon']:
+            assert abs(np.array(v,dtype=column_dtype(UBX_schema[msg],f,v))-v)<1e-8
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Subsets and concatenation of sessions (sessions.py, UBX2data.concat, INSLASERdata.concat):
+merged subsets give back the original data, laser corrections still run.
+"""
+
+import os
+import sys
+import numpy as np
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+sys.path.insert(0,os.path.join(root,'benchmarks'))
+
+import UBX2data
+import INSLASERdata
+from gpstime import gps_ns
+from sessions import merge_msg, columns
+import synthetic
+
+
+def ubx_data(duration=60,rate=10):
+    d=UBX2data.UBX2data('flight.ubx',name='flight',load=False)
+    d.file_original='flight.ubx'
+    iTOW=np.arange(0,duration*1000,1000//rate,dtype=np.int64)+100000000
+    for msg in d.MSG_list:
+        if msg=='MEAS':
+            continue
+        m=UBX2data.MSG_type(UBX2data.UBX_schema.get(msg,{}))
+        m.iTOW=iTOW[:0] if msg not in ['PVAT','PVT'] else iTOW.copy()
+        m.t=gps_ns(np.full(len(m.iTOW),2300),m.iTOW,'ms')
+        m.height=np.arange(len(m.t))*1.
+        m._payload=np.zeros(len(m.t))
+        m.len=len(m.t)
+        setattr(d,msg,m)
+    d.Laser=UBX2data.MSG_type()
+    d.Laser.t=d.PVAT.t[::2].copy()
+    d.Laser.h=np.arange(len(d.Laser.t))*1.
+    d.Laser.len=len(d.Laser.t)
+    return d
+
+
+def test_merge_msg_columns():
+    d=ubx_data()
+    assert '_payload' not in columns(d.PVAT)
+    m=merge_msg([d.PVAT],UBX2data.MSG_type())
+    assert not hasattr(m,'_payload')
+    assert np.array_equal(m.iTOW,d.PVAT.iTOW)
+
+
+def test_ubx_concat_subsets():
+    d=ubx_data()
+    a=d.subset([0,40],timeformat='s')
+    b=d.subset([20,60],timeformat='s')
+    c=UBX2data.concat([b,a])
+    assert c.files==['flight.ubx','flight.ubx']
+    assert np.array_equal(c.PVAT.t,d.PVAT.t)
+    assert np.array_equal(c.PVAT.height,d.PVAT.height)
+    assert np.array_equal(c.Laser.h,d.Laser.h)
+
+
+def test_ins_concat_subsets(tmp_path):
+    file=str(tmp_path/'flight.txt')
+    synthetic.write_nmea_laser(file,duration=60,strobe='laser')
+    d=INSLASERdata.INSLASERdata(file,pitch0=0.01,roll0=-0.02,distCenter=0.5)
+    a=d.subset([0,40])
+    b=d.subset([20,60])
+    assert (a.pitch0,a.roll0,a.distCenter)==(0.01,-0.02,0.5)
+    assert isinstance(a.Laser.keys,list) and a.Laser.keys==d.Laser.keys
+    assert np.all((b.PSTRB.laserIdx>=0)&(b.PSTRB.laserIdx<=b.Laser.len))
+
+    c=INSLASERdata.concat([b,a])
+    assert np.array_equal(c.Laser.t,d.Laser.t)
+    k=c.PSTRB.laserIdx>0
+    assert k.mean()>0.9
+    assert np.array_equal(c.PSTRB.laserIdx[k],d.PSTRB.laserIdx[k])
+
+    for s in [a,c]:
+        s.corr_h_laser()
+        n=s.Laser.len
+        h_corr=d.Laser.h_corr[d.Laser.t.searchsorted(s.Laser.t[0]):][:n]
+        assert np.allclose(s.Laser.h_corr,h_corr)
+        s.attitude_laser()
+        assert isinstance(s.Laser.keys,list)
+
+
+def test_ins_h_laser_concat_subsets(tmp_path):
+    file=str(tmp_path/'flight.txt')
+    synthetic.write_nmea_laser(file,duration=60)
+    d=INSLASERdata.INSLASERdata(file,distCenter=0.5)
+    c=INSLASERdata.concat([d.subset([30,60]),d.subset([0,30])])
+    del c.Laser.pitch_ins
+    pitch0=np.array([0.,0.01])
+    h=c.h_laser(pitch0=pitch0)
+    assert h.shape==(2,d.Laser.len)
+    assert np.allclose(h,d.h_laser(pitch0=pitch0))
+    assert 'pitch_ins' in c.Laser.keys
+    c.set_calibration(pitch0=0.01)
+    assert np.allclose(c.Laser.h_corr,h[1])
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Estimation of the laser to INS clock offset and drift.
+
+The laser range varies with the flight height above ground, which the INS/GNSS
+solution predicts. Both signals are resampled to a common time grid and cross
+correlated (FFT) in sliding windows. The lag of each window is fitted with a
+linear model lag(t) = offset + drift*(t - t0), which is then removed from the
+laser time stamps.
+
+Times are absolute GPS times (int64 ns, see gpstime.py).
+"""
+
+import numpy as np
+
+
+def _nextpow2(n):
+    return 1<<int(np.ceil(np.log2(max(n,1))))
+
+
+def xcorr_windows(a,b,maxlag):
+    """
+    Normalized cross correlation of the rows of a (windows x n) with the rows of b
+    (windows x n+2*maxlag, same windows extended by maxlag on both sides) via FFT.
+    Every lag uses all n samples of a (no bias towards lag 0).
+
+    maxlag: maximum lag in samples
+
+    return  lags (samples, sub-sample by parabolic interpolation), peak correlation per row.
+            A positive lag means a is delayed with respect to b.
+    """
+    n=a.shape[1]
+    nfft=_nextpow2(b.shape[1]+n)
+    c=np.fft.irfft(np.conj(np.fft.rfft(a,nfft,axis=1))*np.fft.rfft(b,nfft,axis=1),nfft,axis=1)
+    # c[:,m]: correlation with b shifted by m, lag maxlag-m
+    c=c[:,2*maxlag::-1]
+    c/=np.sqrt((a**2).sum(axis=1)*(b[:,maxlag:maxlag+n]**2).sum(axis=1))[:,None]+1e-30
+
+    k=np.argmax(c,axis=1)
+    rows=np.arange(len(c))
+    peak=c[rows,k]
+    # parabolic interpolation of the peak
+    km=np.clip(k-1,0,c.shape[1]-1)
+    kp=np.clip(k+1,0,c.shape[1]-1)
+    den=c[rows,km]-2*peak+c[rows,kp]
+    d=np.where((k>0)&(k<c.shape[1]-1)&(den<0),0.5*(c[rows,km]-c[rows,kp])/np.where(den<0,den,-1),0)
+    return k-maxlag+d,peak
+
+
+def fit_drift(tc,lag,weight=None,nsigma=3,niter=3):
+    """
+    Robust weighted fit of lag = offset + drift*(tc - t0), t0 = mean of tc.
+    Outliers beyond nsigma times the scaled MAD are removed iteratively.
+    With less than 3 windows only the offset is fitted.
+
+    return  offset, drift, t0, mask of windows used
+    """
+    if weight is None:
+        weight=np.ones(len(lag))
+    use=np.ones(len(lag),dtype=bool)
+    t0=tc.mean()
+    offset,drift=np.median(lag),0.
+    for i in range(niter):
+        if use.sum()>=3:
+            A=np.vstack((np.ones(use.sum()),tc[use]-t0)).T*weight[use,None]
+            offset,drift=np.linalg.lstsq(A,lag[use]*weight[use],rcond=None)[0]
+        else:
+            offset,drift=np.median(lag[use]),0.
+        res=lag-offset-drift*(tc-t0)
+        mad=1.4826*np.median(np.abs(res[use]))
+        new=np.abs(res)<=max(nsigma*mad,1e-9)
+        if new.sum()==0 or np.array_equal(new,use):
+            break
+        use=new
+    return offset,drift,t0,use
+
+
+def estimate_offset(t_laser,h_laser,t_ins,z_ins,window=60,step=30,maxlag=2,rate=0,
+                    min_corr=0.5,min_valid=0.8,min_windows=3,min_fraction=0.25,min_peak=0.7,
+                    max_spread=0.5,verbose=True):
+    """
+    Estimate laser clock offset and drift by correlating laser range with the INS height.
+
+    t_laser, h_laser:   laser time (int64 ns) and range (m). Values <=0 (e.g. -999) are invalid.
+    t_ins, z_ins:       INS time (int64 ns) and height (m)
+    window, step:       length and step of the correlation windows (s)
+    maxlag:             maximum offset searched (s)
+    rate:               resampling rate (Hz). Default: median laser rate
+    min_corr:           minimum peak correlation of a window
+    min_valid:          minimum fraction of valid laser samples in a window
+    
+    Quality gate of the estimate (accepted):
+    min_windows:        minimum number of windows used in the fit
+    min_fraction:       minimum fraction of all windows used in the fit
+    min_peak:           minimum median peak correlation of the windows used
+    max_spread:         maximum spread (1.4826*MAD) of the window lags around the fit (samples)
+
+    return  dict with offset (s, at time t0), drift (s/s), t0 (int64 ns), accepted (quality gate
+            passed), spread (s), and per window tc (int64 ns), lag (s), corr, used.
+            None if no window correlates.
+    Laser time stamps are late by offset+drift*(t-t0): t_true = t_laser - lag(t_laser).
+    """
+    t_laser=np.asarray(t_laser,dtype=np.int64)
+    t_ins=np.asarray(t_ins,dtype=np.int64)
+    if len(t_laser)<10 or len(t_ins)<10:
+        return None
+    tb=t_laser[0]
+    tl=(t_laser-tb)*1e-9
+    ti=(t_ins-tb)*1e-9
+    if rate==0:
+        dt=np.median(np.diff(tl))
+        rate=1/dt if dt>0 else 0
+    if rate<=0:
+        return None
+
+    valid=np.asarray(h_laser)>0
+    if valid.sum()<10:
+        return None
+    start=max(tl[0],ti[0])
+    stop=min(tl[-1],ti[-1])
+    g=np.arange(start,stop,1/rate)
+    N=int(window*rate)
+    S=max(int(step*rate),1)
+    L=int(np.ceil(maxlag*rate))
+    if len(g)<N or N<4*L:
+        return None
+
+    hl=np.interp(g,tl[valid],np.asarray(h_laser,dtype=float)[valid])
+    zi=np.interp(g,ti,np.asarray(z_ins,dtype=float))
+    # fraction of valid laser samples on the grid
+    vf=np.interp(g,tl,valid.astype(float))
+
+    idx=np.arange(L,len(g)-N-L+1,S)[:,None]+np.arange(N)[None,:]
+    if len(idx)==0:
+        return None
+    A=hl[idx]
+    B=zi[np.concatenate((idx[:,:1]-np.arange(L,0,-1)[None,:],idx,idx[:,-1:]+np.arange(1,L+1)[None,:]),axis=1)]
+    ok=vf[idx].mean(axis=1)>=min_valid
+    # high pass: differences, then remove mean of each window
+    A=np.diff(A,axis=1)
+    B=np.diff(B,axis=1)
+    A-=A.mean(axis=1,keepdims=True)
+    B-=B.mean(axis=1,keepdims=True)
+
+    lag,corr=xcorr_windows(A,B,L)
+    lag=lag/rate
+    tc=g[idx[:,N//2]]
+    good=ok&(corr>=min_corr)
+    if good.sum()==0:
+        if verbose:
+            print('Laser time alignment: no window with correlation >= {:.2f}'.format(min_corr))
+        return None
+
+    offset,drift,t0,use=fit_drift(tc[good],lag[good],corr[good])
+    used=np.zeros(len(tc),dtype=bool)
+    used[np.flatnonzero(good)[use]]=True
+    spread=1.4826*np.median(np.abs(lag[used]-offset-drift*(tc[used]-t0)))
+    peak=np.median(corr[used])
+    accepted=(used.sum()>=max(min_windows,min_fraction*len(tc)))&(peak>=min_peak)&(spread<=max_spread/rate)
+    if verbose:
+        print('Laser time alignment: offset {:.3f} s, drift {:.1f} ppm, {:d}/{:d} windows, '
+              'correlation {:.2f}, spread {:.3f} s{:s}'.format(offset,drift*1e6,used.sum(),len(tc),peak,spread,
+                                                               '' if accepted else ', not accepted'))
+    return {'offset':offset,'drift':drift,'t0':tb+np.int64(round(t0*1e9)),'accepted':bool(accepted),
+            'spread':spread,'tc':tb+np.round(tc*1e9).astype(np.int64),'lag':lag,'corr':corr,'used':used}
+
+
+def apply_offset(t,offset,drift,t0):
+    """
+    Remove the laser clock error lag(t) = offset + drift*(t - t0) from time stamps t.
+
+    t, t0:  int64 ns. offset in s, drift in s/s.
+
+    return  corrected time (int64 ns)
+    """
+    t=np.asarray(t,dtype=np.int64)
+    lag=offset+drift*(t-t0)*1e-9
+    return t-np.round(lag*1e9).astype(np.int64)
+
+
+def fit_strobe_time(n_strobe,t_strobe,n_samples,segment=60,smooth=1e-3,nsigma=5,niter=3):
+    """
+    Time stamps of all laser samples from strobe events (PSTRB) matched to sample numbers.
+
+    The time of sample n is modelled as piecewise linear in n, with knots every
+    segment seconds. Knot times are fitted by least squares (normal equations built
+    with bincount), regularized by the second difference so that knots without
+    strobes are linearly interpolated/extrapolated. Strobes with residuals beyond
+    nsigma times the scaled MAD are rejected iteratively.
+
+    n_strobe:   laser sample number of each strobe
+    t_strobe:   strobe time (int64 ns)
+    n_samples:  number of laser samples
+
+    return  time of each laser sample (int64 ns), rms residual (s), mask of strobes used.
+            None if less than 2 strobes.
+    """
+    n_strobe=np.asarray(n_strobe,dtype=np.int64)
+    t_strobe=np.asarray(t_strobe,dtype=np.int64)
+    if len(n_strobe)<2 or n_strobe[-1]==n_strobe[0]:
+        return None
+    tb=t_strobe[0]
+    ts=(t_strobe-tb)*1e-9
+    rate=(n_strobe[-1]-n_strobe[0])/(ts[-1]-ts[0]) if ts[-1]!=ts[0] else 0
+    if rate<=0:
+        return None
+    K=max(int(segment*rate),1)
+    nk=(n_samples-1)//K+2
+
+    nc=np.clip(n_strobe,0,max(n_samples-1,0))
+    j=nc//K
+    w=(nc-j*K)/K
+    use=(n_strobe>=0)&(n_strobe<n_samples)
+    if use.sum()<2:
+        return None
+
+    D=np.diff(np.eye(nk),2,axis=0)
+    R=D.T@D
+    for i in range(niter):
+        jj,ww,tt=j[use],w[use],ts[use]
+        A=(np.bincount(jj,(1-ww)**2,nk)+np.bincount(jj+1,ww**2,nk))
+        off=np.bincount(jj,(1-ww)*ww,nk)[:-1]
+        N=np.diag(A)+np.diag(off,1)+np.diag(off,-1)
+        b=np.bincount(jj,(1-ww)*tt,nk)+np.bincount(jj+1,ww*tt,nk)
+        lam=smooth*max(A.mean(),1e-12)
+        x=np.linalg.solve(N+lam*R,b)
+        res=ts-(x[j]*(1-w)+x[np.minimum(j+1,nk-1)]*w)
+        mad=1.4826*np.median(np.abs(res[use]))
+        new=(np.abs(res)<=max(nsigma*mad,1e-6))&(n_strobe>=0)&(n_strobe<n_samples)
+        if new.sum()<2 or np.array_equal(new,use):
+            break
+        use=new
+
+    n=np.arange(n_samples)
+    jn=n//K
+    wn=(n-jn*K)/K
+    t=x[jn]*(1-wn)+x[jn+1]*wn
+    rms=np.sqrt(np.mean(res[use]**2))
+    return tb+np.round(t*1e9).astype(np.int64),rms,use